@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Fake Osaurus server for calibrating scripts/benchmark_models.py: OpenAI SSE
+and Ollama NDJSON chat with configurable TTFT, decode rate, chunking, errors
+and stalls. Run it as `benchmark_models.py mock-server`; self-bench and the
+tests also start it in-process with serve_mock().
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import random
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from benchmark_models import _SYNTHETIC_WORDS, message_text, parse_hostport
+
+
+MOCK_DEFAULT_PORT = 1337  # Osaurus's default port
+MOCK_TTFT_KINDS = ("fixed", "uniform", "normal", "lognormal", "exp")
+
+
+def parse_ttft_dist(spec: str) -> Callable[[random.Random], float]:
+    """Sampler (ms) for mock-server --ttft.
+
+    "100" or "fixed:100", "uniform:50,150" (low, high), "normal:100,20"
+    (mean, stddev), "lognormal:100,0.5" (median, sigma) or "exp:100" (mean).
+    """
+    kind, sep, rest = spec.strip().partition(":")
+    if not sep:
+        kind, rest = "fixed", kind
+    try:
+        params = [float(x) for x in rest.split(",")]
+    except ValueError:
+        raise ValueError(f"bad TTFT distribution {spec!r}") from None
+    arity = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exp": 1}
+    if kind not in arity:
+        raise ValueError(f"unknown TTFT distribution {kind!r} (expected one of {', '.join(MOCK_TTFT_KINDS)})")
+    if len(params) != arity[kind] or any(p < 0 for p in params):
+        raise ValueError(f"TTFT distribution {kind} takes {arity[kind]} non-negative number(s), got {spec!r}")
+    a, b = params[0], params[-1]
+    if kind == "fixed":
+        return lambda rng: a
+    if kind == "uniform":
+        return lambda rng: rng.uniform(a, b)
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(a, b))
+    if kind == "lognormal":
+        return lambda rng: a * math.exp(rng.gauss(0.0, b))
+    return lambda rng: rng.expovariate(1.0 / a) if a > 0 else 0.0
+
+
+@dataclass
+class MockConfig:
+    models: List[str]
+    # Decode speed per stream; 0 streams as fast as the socket allows
+    tokens_per_sec: float = 50.0
+    ttft: str = "fixed:100"
+    # Extra prefill time per prompt token (4 chars ~ 1 token); 0 disables
+    prefill_tokens_per_sec: float = 0.0
+    chunk_tokens: int = 1
+    # Tokens per response; None honours the request's max_tokens
+    output_tokens: Optional[int] = None
+    error_rate: float = 0.0
+    stall_rate: float = 0.0  # chance of a stall before each chunk
+    stall_ms: float = 1000.0
+    close_after_stream: bool = False  # Osaurus closes the connection after a stream
+    # Send each chunk's perf_counter() send time as its text (for self-bench;
+    # perf_counter is system-wide on Linux and macOS)
+    stamp_chunks: bool = False
+    seed: Optional[int] = None
+
+
+class MockServer:
+    """OpenAI/Ollama-compatible stand-in for Osaurus's Router, for calibration.
+
+    Routes and path normalization follow the app: /health, /, /models,
+    /tags, /chat/completions (SSE or JSON) and /chat (NDJSON), each also
+    under /v1, /api and /v1/api. Output is seeded synthetic words, one per
+    token, paced from the start of the response so pacing doesn't drift.
+    """
+
+    def __init__(self, cfg: MockConfig) -> None:
+        self.cfg = cfg
+        self.rng = random.Random(cfg.seed)
+        self.sample_ttft = parse_ttft_dist(cfg.ttft)
+        self.requests = 0
+
+    @staticmethod
+    def normalize(path: str) -> str:
+        path = path.split("?", 1)[0]
+        for prefix in ("/v1/api", "/api", "/v1"):
+            if path == prefix:
+                return "/"
+            if path.startswith(prefix + "/"):
+                return path[len(prefix) :]
+        return path
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path = request_line.decode("latin-1").split()[:2]
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length") or 0))
+                self.requests += 1
+                keep_open = await self.route(method, self.normalize(path), body, writer)
+                if not keep_open or headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(
+        self, writer: asyncio.StreamWriter, status: str, content_type: str, body: bytes
+    ) -> bool:
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1")
+            + body
+        )
+        await writer.drain()
+        return True
+
+    async def route(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter) -> bool:
+        json_type = "application/json; charset=utf-8"
+        if method == "HEAD":
+            return await self.respond(writer, "204 No Content", "text/plain; charset=utf-8", b"")
+        if method == "GET" and path == "/health":
+            obj = {"status": "healthy", "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat()}
+            return await self.respond(writer, "200 OK", json_type, json.dumps(obj).encode("utf-8"))
+        if method == "GET" and path == "/":
+            return await self.respond(writer, "200 OK", "text/plain; charset=utf-8", "Osaurus Server is running! 🦕".encode("utf-8"))
+        if method == "GET" and path == "/models":
+            data = [{"id": m, "object": "model", "created": int(time.time()), "owned_by": "osaurus"} for m in self.cfg.models]
+            return await self.respond(writer, "200 OK", json_type, json.dumps({"object": "list", "data": data}).encode("utf-8"))
+        if method == "GET" and path == "/tags":
+            now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+            models = [{"name": m, "model": m, "modified_at": now, "size": 0, "digest": ""} for m in self.cfg.models]
+            return await self.respond(writer, "200 OK", json_type, json.dumps({"models": models}).encode("utf-8"))
+        if method == "POST" and path in ("/chat/completions", "/chat"):
+            try:
+                request = json.loads(body)
+                if not isinstance(request, dict):
+                    raise ValueError
+            except ValueError:
+                return await self.respond(writer, "400 Bad Request", json_type, self.error_body("Invalid request format"))
+            if self.cfg.error_rate and self.rng.random() < self.cfg.error_rate:
+                return await self.respond(writer, "500 Internal Server Error", json_type, self.error_body("Injected mock error"))
+            if path == "/chat":
+                return await self.chat_ndjson(request, writer)
+            return await self.chat_completions(request, writer)
+        return await self.respond(writer, "404 Not Found", "text/plain; charset=utf-8", b"Not Found")
+
+    @staticmethod
+    def error_body(message: str) -> bytes:
+        error = {"message": message, "type": "invalid_request_error", "param": None, "code": None}
+        return json.dumps({"error": error}).encode("utf-8")
+
+    def plan(self, request: Dict[str, Any]) -> Tuple[int, int, float]:
+        """(prompt tokens, output tokens, TTFT seconds) for one request."""
+        prompt_tokens = max(1, len(message_text(request.get("messages") or [])) // 4)
+        output_tokens = self.cfg.output_tokens
+        if output_tokens is None:
+            output_tokens = int(request.get("max_tokens") or (request.get("options") or {}).get("num_predict") or 128)
+        ttft = self.sample_ttft(self.rng) / 1000.0
+        if self.cfg.prefill_tokens_per_sec > 0:
+            ttft += prompt_tokens / self.cfg.prefill_tokens_per_sec
+        return prompt_tokens, max(1, output_tokens), ttft
+
+    async def paced_chunks(self, output_tokens: int, ttft: float) -> AsyncIterator[str]:
+        """Yield response text chunk by chunk on the configured schedule."""
+        cfg = self.cfg
+        interval = cfg.chunk_tokens / cfg.tokens_per_sec if cfg.tokens_per_sec > 0 else 0.0
+        start = time.perf_counter() + ttft
+        stalled = 0.0
+        for n, first in enumerate(range(0, output_tokens, cfg.chunk_tokens)):
+            if cfg.stall_rate and self.rng.random() < cfg.stall_rate:
+                stalled += cfg.stall_ms / 1000.0
+            delay = start + stalled + n * interval - time.perf_counter()
+            await asyncio.sleep(max(0.0, delay))
+            if cfg.stamp_chunks:
+                yield f" @{time.perf_counter():.7f}"
+                continue
+            count = min(cfg.chunk_tokens, output_tokens - first)
+            yield "".join(" " + self.rng.choice(_SYNTHETIC_WORDS) for _ in range(count))
+
+    @staticmethod
+    def http_chunk(data: bytes) -> bytes:
+        return b"%x\r\n%s\r\n" % (len(data), data)
+
+    def stream_head(self, content_type: str) -> bytes:
+        connection = "close" if self.cfg.close_after_stream else "keep-alive"
+        return (
+            f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\nCache-Control: no-cache, no-transform\r\n"
+            f"Connection: {connection}\r\nTransfer-Encoding: chunked\r\n\r\n"
+        ).encode("latin-1")
+
+    async def chat_completions(self, request: Dict[str, Any], writer: asyncio.StreamWriter) -> bool:
+        model = request.get("model") or self.cfg.models[0]
+        prompt_tokens, output_tokens, ttft = self.plan(request)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": output_tokens, "total_tokens": prompt_tokens + output_tokens}
+        response_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if not request.get("stream"):
+            text = "".join([c async for c in self.paced_chunks(output_tokens, ttft)])
+            obj = {
+                "id": response_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+            return await self.respond(writer, "200 OK", "application/json; charset=utf-8", json.dumps(obj).encode("utf-8"))
+
+        def event(choices: List[Dict[str, Any]], **extra: Any) -> bytes:
+            obj = {"id": response_id, "object": "chat.completion.chunk", "created": created, "model": model, "choices": choices, **extra}
+            return self.http_chunk(b"data: " + json.dumps(obj, separators=(",", ":")).encode("utf-8") + b"\n\n")
+
+        writer.write(self.stream_head("text/event-stream"))
+        await writer.drain()
+        writer.write(event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]))
+        async for text in self.paced_chunks(output_tokens, ttft):
+            writer.write(event([{"index": 0, "delta": {"content": text}, "finish_reason": None}]))
+            await writer.drain()
+        writer.write(event([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            writer.write(event([], usage=usage))
+        writer.write(self.http_chunk(b"data: [DONE]\n\n") + b"0\r\n\r\n")
+        await writer.drain()
+        return not self.cfg.close_after_stream
+
+    async def chat_ndjson(self, request: Dict[str, Any], writer: asyncio.StreamWriter) -> bool:
+        # Ollama-style /api/chat; the closing record carries Ollama's counters
+        model = request.get("model") or self.cfg.models[0]
+        prompt_tokens, output_tokens, ttft = self.plan(request)
+        t0 = time.perf_counter()
+
+        def record(content: str, done: bool, **extra: Any) -> Dict[str, Any]:
+            now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+            return {"model": model, "created_at": now, "message": {"role": "assistant", "content": content}, "done": done, **extra}
+
+        def counters(first_at: float) -> Dict[str, Any]:
+            end = time.perf_counter()
+            return {
+                "done_reason": "stop",
+                "total_duration": int((end - t0) * 1e9),
+                "load_duration": 0,
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int((first_at - t0) * 1e9),
+                "eval_count": output_tokens,
+                "eval_duration": int((end - first_at) * 1e9),
+            }
+
+        if request.get("stream") is False:
+            first_at = t0 + ttft
+            text = "".join([c async for c in self.paced_chunks(output_tokens, ttft)])
+            obj = record(text, True, **counters(first_at))
+            return await self.respond(writer, "200 OK", "application/json; charset=utf-8", json.dumps(obj).encode("utf-8"))
+
+        writer.write(self.stream_head("application/x-ndjson"))
+        await writer.drain()
+        first_at = None
+        async for text in self.paced_chunks(output_tokens, ttft):
+            first_at = first_at or time.perf_counter()
+            writer.write(self.http_chunk(json.dumps(record(text, False)).encode("utf-8") + b"\n"))
+            await writer.drain()
+        done = record("", True, **counters(first_at or time.perf_counter()))
+        writer.write(self.http_chunk(json.dumps(done).encode("utf-8") + b"\n") + b"0\r\n\r\n")
+        await writer.drain()
+        return not self.cfg.close_after_stream
+
+
+async def serve_mock(host: str, port: int, cfg: MockConfig, ready: Optional[Callable[[int], None]] = None) -> None:
+    """Run a MockServer until cancelled; `ready` gets the bound port (for port 0)."""
+    mock = MockServer(cfg)
+    server = await asyncio.start_server(mock.handle, host, port)
+    bound = server.sockets[0].getsockname()[1]
+    if ready is not None:
+        ready(bound)
+    async with server:
+        await server.serve_forever()
+
+
+def mock_server_main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmark_models.py mock-server",
+        description="Serve a fake Osaurus (OpenAI /v1/chat/completions and Ollama /api/chat) with configurable "
+        "timing, to calibrate the harness or run it without a model loaded",
+    )
+    parser.add_argument(
+        "--listen",
+        type=parse_hostport,
+        default=("127.0.0.1", MOCK_DEFAULT_PORT),
+        help=f"host:port to listen on (default 127.0.0.1:{MOCK_DEFAULT_PORT}; port 0 picks a free one)",
+    )
+    parser.add_argument("--model", action="append", default=None, help="Model id to list (repeatable; default: mock)")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0, help="Decode rate per stream; 0 = unpaced (default: 50)")
+    parser.add_argument(
+        "--ttft",
+        default="fixed:100",
+        help="TTFT distribution in ms: 100, fixed:100, uniform:50,150, normal:100,20, lognormal:100,0.5 (median, "
+        "sigma) or exp:100 (default: fixed:100)",
+    )
+    parser.add_argument("--prefill-rate", type=float, default=0.0, help="Add prompt_tokens / this to TTFT; 0 = off")
+    parser.add_argument("--chunk-tokens", type=int, default=1, help="Tokens per streamed chunk (default: 1)")
+    parser.add_argument("--output-tokens", type=int, default=None, help="Tokens per response (default: request max_tokens)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of chat requests answered with HTTP 500")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Chance of a stall before each chunk")
+    parser.add_argument("--stall-ms", type=float, default=1000.0, help="Length of each stall (default: 1000)")
+    parser.add_argument("--close-after-stream", action="store_true", help="Close the connection after each stream, as Osaurus does")
+    parser.add_argument("--stamp-chunks", action="store_true", help="Send each chunk's send time as its text (used by self-bench)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for TTFT, stalls, errors and output text")
+    args = parser.parse_args(argv)
+
+    if args.chunk_tokens < 1 or args.tokens_per_sec < 0 or not 0 <= args.error_rate <= 1 or not 0 <= args.stall_rate <= 1:
+        print("--chunk-tokens must be >= 1, --tokens-per-sec >= 0 and rates within [0, 1]", file=sys.stderr)
+        return 2
+    cfg = MockConfig(
+        models=args.model or ["mock"],
+        tokens_per_sec=args.tokens_per_sec,
+        ttft=args.ttft,
+        prefill_tokens_per_sec=args.prefill_rate,
+        chunk_tokens=args.chunk_tokens,
+        output_tokens=args.output_tokens,
+        error_rate=args.error_rate,
+        stall_rate=args.stall_rate,
+        stall_ms=args.stall_ms,
+        close_after_stream=args.close_after_stream,
+        stamp_chunks=args.stamp_chunks,
+        seed=args.seed,
+    )
+    try:
+        parse_ttft_dist(cfg.ttft)
+    except ValueError as exc:
+        print(str(exc), file=sys.stderr)
+        return 2
+
+    host, port = args.listen
+
+    def ready(bound: int) -> None:
+        print(f"[mock] serving {', '.join(cfg.models)} on http://{host}:{bound}", file=sys.stderr, flush=True)
+
+    try:
+        asyncio.run(serve_mock(host, port, cfg, ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of scripts/benchmark_models.py's client-side stream parsing
+(no network): the old text-line parser vs StreamParser with each JSON
+decoder, and the per-event cost of every protocol adapter. Run it as
+`benchmark_models.py parser-bench`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Tuple
+
+import httpx  # type: ignore
+
+from benchmark_models import (
+    PROTOCOL_ADAPTERS,
+    StreamParser,
+    _SYNTHETIC_WORDS,
+    _stdlib_loads,
+    iter_stream_events,
+    orjson,
+    parse_stream_event,
+    utf8_len,
+)
+
+
+def synthetic_sse_body(events: int, seed: int = 0) -> List[bytes]:
+    """An OpenAI-style chat stream, one list item per event, for parser-bench."""
+    rng = random.Random(seed)
+    head = b'{"id":"chatcmpl-bench","object":"chat.completion.chunk","created":1738193123,"model":"bench",'
+    body = [b"data: " + head + b'"choices":[{"index":0,"delta":{"role":"assistant"},"finish_reason":null}]}\n\n']
+    for n in range(events):
+        word = " " + rng.choice(_SYNTHETIC_WORDS)
+        delta = json.dumps({"content": word}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        body.append(b"data: " + head + b'"choices":[{"index":0,"delta":' + delta + b',"finish_reason":null}]}\n\n')
+        if n % 100 == 99:
+            body.append(b": keep-alive\n\n")
+    usage = {"prompt_tokens": 32, "completion_tokens": events, "total_tokens": 32 + events}
+    body.append(b"data: " + head + b'"choices":[],"usage":' + json.dumps(usage).encode("utf-8") + b"}\n\n")
+    body.append(b"data: [DONE]\n\n")
+    return body
+
+
+def _bench_reads(body: List[bytes], read_size: int) -> List[bytes]:
+    if not read_size:
+        return body
+    blob = b"".join(body)
+    return [blob[i : i + read_size] for i in range(0, len(blob), read_size)]
+
+
+async def _bench_lines_json(resp: httpx.Response) -> Tuple[int, int]:
+    # The text-line path run_single_chat used before StreamParser. It counts
+    # ": keep-alive" comments as content, so its totals are not compared.
+    chars = nbytes = 0
+    async for line in resp.aiter_lines():
+        if not line:
+            continue
+        data = line[6:].strip() if line.startswith("data: ") else line.strip()
+        if data == "[DONE]":
+            break
+        try:
+            obj = json.loads(data)
+        except json.JSONDecodeError:
+            chunk_text = data
+        else:
+            choices = obj.get("choices") or []
+            chunk_text = ((choices[0].get("delta") or {}).get("content", "") or "") if choices else ""
+        if chunk_text:
+            time.perf_counter()
+            chars += len(chunk_text)
+            nbytes += len(chunk_text.encode("utf-8", errors="ignore"))
+    return chars, nbytes
+
+
+async def _bench_stream_parser(resp: httpx.Response, loads: Callable[[bytes], Any], lazy: bool) -> Tuple[int, int]:
+    chars = nbytes = 0
+    async for _now, events in iter_stream_events(resp, StreamParser()):
+        for data in events:
+            if data == b"[DONE]":
+                return chars, nbytes
+            chunk_text, _usage = parse_stream_event(data, loads, lazy)
+            if chunk_text:
+                chars += len(chunk_text)
+                nbytes += utf8_len(chunk_text)
+    return chars, nbytes
+
+
+def parser_bench_main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmark_models.py parser-bench",
+        description="Microbenchmark the client-side stream parsing path (no network): the old text-line "
+        "parser vs StreamParser, with the stdlib and (if installed) orjson JSON decoders",
+    )
+    parser.add_argument("--events", type=int, default=20000, help="Content events per stream (default: 20000)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per variant; the best is reported (default: 5)")
+    parser.add_argument(
+        "--read-size",
+        type=int,
+        default=0,
+        help="Split the body into reads of this many bytes (default: 0, one read per event as when streaming)",
+    )
+    args = parser.parse_args(argv)
+
+    reads = _bench_reads(synthetic_sse_body(args.events), args.read_size)
+
+    async def body() -> AsyncIterator[bytes]:
+        for chunk in reads:
+            yield chunk
+
+    variants: List[Tuple[str, Callable[[httpx.Response], Awaitable[Tuple[int, int]]]]] = [
+        ("lines + json", _bench_lines_json),
+        ("bytes + json", lambda r: _bench_stream_parser(r, _stdlib_loads, False)),
+    ]
+    if orjson is not None:
+        variants.append(("bytes + orjson", lambda r: _bench_stream_parser(r, orjson.loads, False)))
+    variants.append(("bytes + lazy", lambda r: _bench_stream_parser(r, _stdlib_loads, True)))
+
+    async def timed(fn: Callable[[httpx.Response], Awaitable[Tuple[int, int]]]) -> Tuple[float, Tuple[int, int]]:
+        resp = httpx.Response(200, headers={"content-type": "text/event-stream"}, content=body())
+        c0 = time.process_time()
+        counts = await fn(resp)
+        return time.process_time() - c0, counts
+
+    print(f"{args.events} events in {len(reads)} read(s), best of {args.repeat}:")
+    baseline = None
+    expected = None
+    for name, fn in variants:
+        best = float("inf")
+        for _ in range(max(1, args.repeat)):
+            cpu, counts = asyncio.run(timed(fn))
+            best = min(best, cpu)
+        # The old line parser counts keep-alive comments as content, so only the new parsers must agree
+        if fn is not _bench_lines_json:
+            if expected is None:
+                expected = counts
+            elif counts != expected:
+                print(f"  {name}: content mismatch {counts} != {expected}", file=sys.stderr)
+                return 1
+        baseline = baseline or best
+        print(
+            f"  {name:<16}{best * 1e6 / args.events:7.2f} us/event  "
+            f"{args.events / best:10.0f} events/s  speedup={baseline / best:.2f}x"
+        )
+
+    # Per-event decode cost of each registered protocol adapter (no splitting)
+    rng = random.Random(0)
+    words = [" " + rng.choice(_SYNTHETIC_WORDS) for _ in range(args.events)]
+    print(f"protocol adapters, {args.events} events, best of {args.repeat}:")
+    for adapter in PROTOCOL_ADAPTERS.values():
+        events = [adapter.sample_event(word) for word in words]
+        parse_event = adapter.parse_event
+        best = float("inf")
+        for _ in range(max(1, args.repeat)):
+            c0 = time.process_time()
+            chars = 0
+            for data in events:
+                chars += len(parse_event(data)[0])
+            best = min(best, time.process_time() - c0)
+        if chars != sum(map(len, words)):
+            print(f"  {adapter.name}: content mismatch {chars}", file=sys.stderr)
+            return 1
+        print(f"  {adapter.name:<16}{best * 1e6 / args.events:7.2f} us/event  {args.events / best:10.0f} events/s")
+    return 0
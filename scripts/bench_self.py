@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Benchmark scripts/benchmark_models.py itself against local mock servers:
+request and chunk ceilings, client CPU per request/chunk, memory per
+in-flight stream, timestamp lag and aggregation cost, compared to a stored
+baseline. Run it as `benchmark_models.py self-bench`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import math
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import replace
+from typing import Any, Dict, Iterator, List, Tuple
+
+import httpx  # type: ignore
+
+from benchmark_models import (
+    RequestConfig,
+    ServerSpec,
+    SingleResult,
+    aggregate,
+    make_client,
+    orjson,
+    percentile,
+    run_benchmark,
+    run_single_chat,
+)
+
+BENCHMARK_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_models.py")
+
+
+# Self-bench metrics compared against a baseline: which direction is better,
+# and the absolute change that must also be exceeded to count as a regression
+# (sub-millisecond lags swing by tens of percent between identical runs).
+SELF_BENCH_METRICS = {
+    "requests_per_sec": ("higher", 0.0),
+    "cpu_ms_per_request": ("lower", 0.0),
+    "chunks_per_sec": ("higher", 0.0),
+    "cpu_us_per_chunk": ("lower", 0.0),
+    "kib_per_stream": ("lower", 0.0),
+    "timestamp_lag_ms_p50": ("lower", 1.0),
+    "timestamp_lag_ms_p99": ("lower", 2.0),
+    "aggregate_us_per_result": ("lower", 0.0),
+}
+
+
+@contextlib.contextmanager
+def mock_process(*flags: str) -> Iterator[str]:
+    """Run `mock-server` in a child process (so its CPU isn't ours); yields its base URL."""
+    cmd = [sys.executable, BENCHMARK_SCRIPT, "mock-server", "--listen", "127.0.0.1:0", *flags]
+    proc = subprocess.Popen(cmd, stderr=subprocess.PIPE, text=True)
+    try:
+        line = proc.stderr.readline()
+        match = re.search(r"http://\S+", line)
+        if not match:
+            raise RuntimeError(f"mock-server failed to start: {line.strip() or f'exit code {proc.wait()}'}")
+        yield match.group(0)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def _timed_run(url: str, requests: int, concurrency: int, cfg: RequestConfig) -> Tuple[List[SingleResult], float, float]:
+    """(results, wall seconds, client CPU seconds) of a closed-loop run."""
+    server = ServerSpec(name="mock", base_url=url, model="mock")
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    results = asyncio.run(run_benchmark([server], ["Say something."], requests, concurrency, cfg))
+    return results, time.perf_counter() - wall0, time.process_time() - cpu0
+
+
+async def _stream_memory(url: str, streams: int, cfg: RequestConfig) -> Tuple[int, int]:
+    """(baseline, peak) traced bytes while `streams` slow streams are open at once."""
+    server = ServerSpec(name="mock", base_url=url, model="mock")
+    async with make_client(cfg) as client:
+        await run_single_chat(client, server, 0, 0, "warm up", replace(cfg, max_tokens=1))
+        tracemalloc.start()
+        try:
+            base = tracemalloc.get_traced_memory()[0]
+            await asyncio.gather(*(run_single_chat(client, server, i, 1, "Say something.", cfg) for i in range(streams)))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return base, peak
+
+
+async def _timestamp_lags(url: str, streams: int, cfg: RequestConfig) -> List[float]:
+    """Mock send time -> harness chunk timestamp, in ms, for every chunk."""
+    server = ServerSpec(name="mock", base_url=url, model="mock")
+    lags: List[float] = []
+
+    async with make_client(cfg) as client:
+
+        async def one(i: int) -> None:
+            t0, reply = time.perf_counter(), []
+            res = await run_single_chat(client, server, i, 1, "Say something.", cfg, scheduled_at=t0, reply=reply)
+            for text, offset_ms in zip(reply, res.chunk_times_ms or []):
+                lags.append((t0 + offset_ms / 1000.0 - float(text.strip().lstrip("@"))) * 1000.0)
+
+        await asyncio.gather(*(one(i) for i in range(streams)))
+    return lags
+
+
+def run_self_bench(quick: bool = False, concurrency: int = 32, repeat: int = 3) -> Dict[str, Any]:
+    """Measure the harness against local mock servers; see self_bench_main().
+
+    Every phase runs `repeat` times and each metric keeps its best value, as
+    scheduler noise only ever makes a run look worse.
+    """
+    runs = [_self_bench_once(quick, concurrency) for _ in range(max(1, repeat))]
+    metrics: Dict[str, float] = {}
+    for name in runs[0]:
+        values = [run[name] for run in runs if not math.isnan(run[name])]
+        better = SELF_BENCH_METRICS.get(name, ("lower", 0.0))[0]
+        metrics[name] = (max if better == "higher" else min)(values) if values else float("nan")
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "quick": quick,
+        "concurrency": concurrency,
+        "repeat": len(runs),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "httpx": httpx.__version__,
+            "orjson": getattr(orjson, "__version__", None),
+        },
+        "metrics": metrics,
+    }
+
+
+def _self_bench_once(quick: bool, concurrency: int) -> Dict[str, float]:
+    scale = 0.2 if quick else 1.0
+    base_cfg = RequestConfig(temperature=0.0, timeout_seconds=120.0)
+    metrics: Dict[str, float] = {}
+
+    # Request ceiling: instant, short responses
+    requests = max(50, int(2000 * scale))
+    with mock_process("--tokens-per-sec", "0", "--ttft", "0") as url:
+        _timed_run(url, concurrency, concurrency, replace(base_cfg, max_tokens=8))  # warm up
+        results, wall, cpu = _timed_run(url, requests, concurrency, replace(base_cfg, max_tokens=8))
+    ok = sum(1 for r in results if r.success)
+    metrics["requests_per_sec"] = ok / wall
+    metrics["cpu_ms_per_request"] = cpu * 1000.0 / max(1, ok)
+
+    # aggregate() cost, on the request results scaled up to a realistic run
+    pool = results * max(1, int(20000 * scale) // max(1, len(results)))
+    c0 = time.process_time()
+    aggregate(pool)
+    metrics["aggregate_us_per_result"] = (time.process_time() - c0) * 1e6 / max(1, len(pool))
+
+    # Chunk ceiling: long unpaced streams, one token per chunk
+    streams, tokens = 8, max(200, int(4000 * scale))
+    with mock_process("--tokens-per-sec", "0", "--ttft", "0") as url:
+        results, wall, cpu = _timed_run(url, streams, streams, replace(base_cfg, max_tokens=tokens))
+    chunks = sum(r.content_chunks or 0 for r in results)
+    metrics["chunks_per_sec"] = chunks / wall
+    metrics["cpu_us_per_chunk"] = cpu * 1e6 / max(1, chunks)
+
+    # Memory per in-flight stream: many slow streams open together
+    streams = max(32, int(256 * scale))
+    with mock_process("--tokens-per-sec", "10", "--ttft", "200") as url:
+        base, peak = asyncio.run(_stream_memory(url, streams, replace(base_cfg, max_tokens=10)))
+    metrics["kib_per_stream"] = (peak - base) / 1024.0 / streams
+
+    # Timestamp lag: paced, stamped chunks at the requested concurrency
+    with mock_process("--tokens-per-sec", "50", "--ttft", "20", "--stamp-chunks") as url:
+        lags = asyncio.run(
+            _timestamp_lags(url, concurrency, replace(base_cfg, max_tokens=max(20, int(100 * scale)), record_chunk_times=True))
+        )
+    metrics["timestamp_lag_ms_p50"] = percentile(lags, 0.5) if lags else float("nan")
+    metrics["timestamp_lag_ms_p99"] = percentile(lags, 0.99) if lags else float("nan")
+    metrics["timestamp_lag_ms_max"] = max(lags) if lags else float("nan")
+    return metrics
+
+
+def compare_self_bench(current: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[Dict[str, Any]]:
+    """Per-metric change vs baseline; `regressed` when worse by more than `tolerance`
+    (relative) and by more than the metric's absolute slack."""
+    rows = []
+    for name, (better, slack) in SELF_BENCH_METRICS.items():
+        now, before = current.get(name), baseline.get(name)
+        if now is None or before is None or not before or math.isnan(now) or math.isnan(before):
+            continue
+        change = (now - before) / before
+        worse = before - now if better == "higher" else now - before
+        regressed = worse > tolerance * abs(before) and worse > slack
+        rows.append({"metric": name, "baseline": before, "current": now, "change": change, "regressed": regressed})
+    return rows
+
+
+def self_bench_main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmark_models.py self-bench",
+        description="Benchmark the harness itself against local mock servers: request and chunk ceilings, "
+        "client CPU per request/chunk, memory per in-flight stream, timestamp lag and aggregate() cost",
+    )
+    parser.add_argument("--output-prefix", default="./llm-bench", help="Writes <prefix>.self-bench.json")
+    parser.add_argument("--baseline", default=None, help="A previous .self-bench.json to compare against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Relative slowdown vs the baseline that counts as a regression (default: 0.25)",
+    )
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrency for the request and lag runs")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per phase; each metric keeps its best (default: 3)")
+    parser.add_argument("--quick", action="store_true", help="Smaller runs (~5x faster, noisier)")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+            baseline["metrics"]
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            print(f"Failed to read --baseline: {exc}", file=sys.stderr)
+            return 2
+        if baseline.get("quick") != args.quick or baseline.get("concurrency") != args.concurrency:
+            print("Note: the baseline was run with different --quick/--concurrency; expect noise", file=sys.stderr)
+
+    print(f"Running harness self-benchmark{' (quick)' if args.quick else ''}...", file=sys.stderr)
+    report = run_self_bench(args.quick, max(1, args.concurrency), args.repeat)
+    for name, value in report["metrics"].items():
+        print(f"  {name:<26}{value:12.3f}")
+
+    regressions = []
+    if baseline is not None:
+        report["baseline"] = {"path": args.baseline, "tolerance": args.tolerance}
+        report["comparison"] = compare_self_bench(report["metrics"], baseline["metrics"], args.tolerance)
+        print(f"\nvs {args.baseline} (tolerance {args.tolerance:.0%}):")
+        for row in report["comparison"]:
+            flag = "  REGRESSED" if row["regressed"] else ""
+            print(f"  {row['metric']:<26}{row['baseline']:12.3f} -> {row['current']:12.3f}  ({row['change']:+.1%}){flag}")
+        regressions = [row["metric"] for row in report["comparison"] if row["regressed"]]
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output_prefix)) or ".", exist_ok=True)
+    path = f"{args.output_prefix}.self-bench.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nSaved {path}")
+    if regressions:
+        print(f"Regressed beyond tolerance: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
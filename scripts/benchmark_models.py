@@ -1,18 +1,21 @@
 #!/usr/bin/env python3
 """
-Benchmark local LLM servers (e.g., Ollama, LM Studio) via OpenAI-compatible
-Chat Completions API. Measures TTFT (time-to-first-token), total latency, and
-throughput (chars/sec, bytes/sec) under configurable concurrency.
+Benchmark local LLM servers (e.g., Osaurus, Ollama, LM Studio) via their
+OpenAI-compatible or native chat APIs. Measures TTFT (time-to-first-token),
+total latency, decode smoothness and throughput under closed-loop, open-loop,
+time-based or replayed load, from one process, several (--workers) or several
+machines (agent/coordinate).
 
-Examples:
+Example:
   python3 scripts/benchmark_models.py \
     --server "ollama|http://localhost:11434|llama3.1" \
     --server "lmstudio|http://localhost:1234|Meta-Llama-3.1-8B-Instruct" \
     --prompt "Explain the significance of the Turing Test in AI." \
-    --prompt "Write a Python function for Fibonacci with memoization." \
-    --iterations 5 --concurrency 4 --stream --max-tokens 512 \
+    --iterations 5 --concurrency 4 --max-tokens 512 \
     --output-prefix ./results/llm-bench --export json csv
 
+Modes, scenarios, the summary and more examples: docs/benchmarking.md.
+
 Requires: httpx>=0.27.0
 Install deps: pip install -r scripts/requirements-bench.txt
 """
@@ -21,13 +24,34 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+from array import array
+import collections
+import contextlib
 import csv
+import datetime
+import functools
+import gzip
+import hashlib
+import hmac
+import importlib.util
+import io
+import itertools
 import json
+import math
+import multiprocessing
+import operator
 import os
+import queue
+import random
+import re
+import secrets
+import signal
+import statistics
 import sys
 import time
-from dataclasses import dataclass, asdict
-from typing import Any, Dict, List, Optional, Tuple
+import uuid
+from dataclasses import dataclass, asdict, fields, replace
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 
 try:
     import httpx  # type: ignore
@@ -35,21 +59,40 @@ except Exception as exc:  # pragma: no cover
     print("This script requires the 'httpx' package. Install with:\n  pip install -r scripts/requirements-bench.txt", file=sys.stderr)
     raise
 
+try:  # optional: faster decoding of stream events
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:  # optional: vectorized bootstrap resampling
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover
+    np = None
+
+
+def _stdlib_loads(data: bytes) -> Any:
+    # json.loads(bytes) sniffs the encoding in Python first; decoding is cheaper
+    return json.loads(data.decode("utf-8"))
+
+
+json_loads: Callable[[bytes], Any] = orjson.loads if orjson is not None else _stdlib_loads
+# Without orjson, slicing the content out of a delta beats a stdlib decode;
+# with it, a full decode is cheaper than the byte scans (see parser-bench).
+LAZY_EVENTS = orjson is None
+
 
 @dataclass
 class ServerSpec:
     name: str
     base_url: str
     model: str
+    # Wire protocol, a key of PROTOCOL_ADAPTERS: "openai" (/v1/chat/completions),
+    # "completions" (/v1/completions), "ollama" (native /api/chat, NDJSON;
+    # also served by Osaurus) or "lmstudio" (/api/v0, with server stats)
+    protocol: str = "openai"
 
     def endpoint(self) -> str:
-        # Normalize to ensure we always hit /v1/chat/completions
-        base = self.base_url.rstrip("/")
-        if base.endswith("/v1"):
-            return f"{base}/chat/completions"
-        if base.endswith("/v1/"):
-            return f"{base}chat/completions"
-        return f"{base}/v1/chat/completions"
+        return PROTOCOL_ADAPTERS[self.protocol].endpoint(self.base_url)
 
 
 @dataclass
@@ -60,6 +103,426 @@ class RequestConfig:
     timeout_seconds: float = 60.0
     extra_json: Dict[str, Any] = None  # for vendor-specific options
     system_prompt: Optional[str] = None
+    # Keep every content chunk's arrival offset on the result (streaming only)
+    record_chunk_times: bool = False
+    # Ask streams for a final usage chunk (stream_options.include_usage)
+    include_usage: bool = True
+    # Offline token counter for servers without usage; see load_tokenizer()
+    tokenizer: Optional[str] = None
+    # HTTP client (see make_client): HTTP/2 (needs the h2 package), pool size
+    # (0 = unbounded, so requests never queue inside httpx), idle keep-alive
+    # expiry in seconds, and a fresh connection for every request
+    http2: bool = False
+    pool_size: int = 0
+    keepalive_expiry: float = 5.0
+    new_connection: bool = False
+
+
+ARRIVAL_PATTERNS = ("poisson", "uniform", "bursty")
+
+
+@dataclass
+class LoadConfig:
+    # Open-loop arrival rate in requests/sec per server; None keeps the
+    # closed-loop (semaphore-bounded) behaviour.
+    rate: Optional[float] = None
+    arrival: str = "poisson"
+    burst_size: int = 8
+    seed: Optional[int] = None
+    # Time-based load profile (see parse_profile); levels are total
+    # concurrency, or total req/s when `rate` is set.
+    profile: Optional[str] = None
+    # Trace replay: normalized records from load_trace(), replayed on their
+    # own timeline divided by `replay_speedup`. Kept inline (not as a path)
+    # so workers and remote agents receive the trace with the scenario.
+    replay: Optional[List[Dict[str, Any]]] = None
+    replay_speedup: float = 1.0
+    # Multi-turn conversations: turns per virtual user (0 = single-turn) and
+    # whether to send a session_id ("session"), not ("none"), or run each
+    # conversation both ways ("both").
+    conversation_turns: int = 0
+    session_mode: str = "both"
+    # Prefix-cache test: synthetic shared-prefix length in approx. tokens
+    # (ignored when RequestConfig.system_prompt supplies the prefix).
+    prefix_cache_test: bool = False
+    prefix_tokens: int = 2048
+    # Prompt-length sweep: target prompt lengths in approx. tokens
+    length_sweep: Optional[List[int]] = None
+    # Adaptive iterations: keep sampling each (server, prompt) cell until the
+    # CI half-width of target_metric's median is within target_ci (a fraction
+    # of the median), up to max_iterations per cell; after time_budget
+    # seconds no new requests start.
+    target_ci: Optional[float] = None
+    target_metric: str = "ttft_ms"
+    max_iterations: int = 100
+    time_budget: Optional[float] = None
+
+    @property
+    def open_loop(self) -> bool:
+        return self.rate is not None
+
+
+SESSION_MODES = ("session", "none", "both")
+PREFIX_VARIANTS = ("shared", "busted")
+
+# Common words that BPE tokenizers encode as one token each (with the leading
+# space), so synthetic_text(n) is roughly n tokens for llama/qwen/mistral-style
+# vocabularies. Only approximate; use measured prompt_tokens where reported.
+_SYNTHETIC_WORDS = (
+    "the", "of", "and", "to", "in", "is", "that", "for", "it", "as", "was", "with", "be", "by", "on",
+    "not", "he", "this", "are", "or", "his", "from", "at", "which", "but", "have", "an", "had", "they",
+    "you", "were", "their", "one", "all", "we", "can", "her", "has", "there", "been", "if", "more",
+    "when", "will", "would", "who", "so", "no", "time", "people", "year", "way", "day", "man", "thing",
+    "world", "life", "hand", "part", "place", "case", "week", "work", "system", "program", "question",
+    "number", "night", "point", "home", "water", "room", "area", "money", "story", "fact", "month",
+    "book", "eye", "job", "word", "side", "kind", "head", "house", "service", "friend", "power", "hour",
+    "game", "line", "end", "member", "law", "car", "city", "name", "team", "minute", "idea", "body",
+)
+
+
+PROFILE_PHASE_KINDS = ("ramp", "hold", "step", "step-down")
+# Default hold time for a bare `step-down` phase
+PROFILE_STEP_DOWN_SECONDS = 60.0
+# How often idle closed-loop workers re-check the profile's current level
+PROFILE_TICK_SECONDS = 0.05
+
+
+@dataclass
+class ProfilePhase:
+    name: str  # "<index>:<kind>", used to tag results
+    start_level: float
+    end_level: float
+    duration_s: float
+
+    def level_at(self, elapsed_s: float) -> float:
+        if self.duration_s <= 0:
+            return self.end_level
+        frac = min(1.0, max(0.0, elapsed_s / self.duration_s))
+        return self.start_level + (self.end_level - self.start_level) * frac
+
+
+def parse_duration(text: str) -> float:
+    """Parse '90', '30s', '5m', '1h30m', '250ms' into seconds."""
+    text = text.strip()
+    if re.fullmatch(r"\d+(\.\d+)?", text):
+        return float(text)
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", text)
+    if not parts or "".join(n + u for n, u in parts) != text:
+        raise ValueError(f"invalid duration: {text!r}")
+    scale = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    return sum(float(n) * scale[u] for n, u in parts)
+
+
+def parse_profile(spec: str) -> List[ProfilePhase]:
+    """Parse a comma-separated load profile.
+
+    ramp:A->B/DUR      move linearly from level A to B over DUR
+    hold:DUR           keep the current level for DUR
+    hold:L/DUR         jump to level L and keep it for DUR (same as step)
+    step:L/DUR         jump to level L and keep it for DUR
+    step-down[:L][/DUR] drop to L (default: the profile's first level) for
+                       DUR (default: 60s)
+    """
+    phases: List[ProfilePhase] = []
+    first_level: Optional[float] = None
+    current: Optional[float] = None
+    for idx, raw in enumerate(p.strip() for p in spec.split(",")):
+        kind = re.match(r"[a-z-]*", raw).group(0)
+        arg = raw[len(kind):]
+        arg = arg[1:] if arg.startswith(":") else arg
+        if kind not in PROFILE_PHASE_KINDS:
+            raise ValueError(f"unknown profile phase {raw!r}; expected one of {', '.join(PROFILE_PHASE_KINDS)}")
+        level_part, slash, dur_part = arg.partition("/")
+        if kind == "ramp":
+            a, arrow, b = level_part.partition("->")
+            if not arrow or not slash:
+                raise ValueError(f"ramp phase must look like ramp:A->B/DUR, got {raw!r}")
+            start, end, dur = float(a), float(b), parse_duration(dur_part)
+        elif kind == "step-down":
+            if current is None:
+                raise ValueError("step-down needs a preceding phase")
+            end = float(level_part) if level_part else first_level
+            start = end
+            dur = parse_duration(dur_part) if slash else PROFILE_STEP_DOWN_SECONDS
+        elif kind == "hold" and not slash:
+            if current is None:
+                raise ValueError("hold:DUR needs a preceding phase; use hold:L/DUR to set a level")
+            start = end = current
+            dur = parse_duration(level_part)
+        else:
+            if not slash:
+                raise ValueError(f"{kind} phase must look like {kind}:L/DUR, got {raw!r}")
+            start = end = float(level_part)
+            dur = parse_duration(dur_part)
+        if start < 0 or end < 0 or dur <= 0:
+            raise ValueError(f"profile phase {raw!r} needs non-negative levels and a positive duration")
+        if first_level is None:
+            first_level = start
+        current = end
+        phases.append(ProfilePhase(name=f"{idx}:{kind}", start_level=start, end_level=end, duration_s=dur))
+    if not phases:
+        raise ValueError("empty load profile")
+    return phases
+
+
+def profile_level_at(phases: List[ProfilePhase], elapsed_s: float) -> Optional[Tuple[ProfilePhase, float]]:
+    """Return (phase, level) at `elapsed_s` into the profile, or None when over."""
+    t = elapsed_s
+    for phase in phases:
+        if t < phase.duration_s:
+            return phase, phase.level_at(t)
+        t -= phase.duration_s
+    return None
+
+
+def _trace_timestamp(value: Any) -> float:
+    """Seconds from a numeric (s or ms epoch) or ISO-8601 trace timestamp."""
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            text = value.strip()
+            if text.endswith("Z"):
+                text = text[:-1] + "+00:00"
+            return datetime.datetime.fromisoformat(text).timestamp()
+    ts = float(value)
+    # Epoch milliseconds are ~1e12 today; epoch seconds ~1e9
+    return ts / 1000.0 if ts > 1e11 else ts
+
+
+def load_trace(path: str) -> List[Dict[str, Any]]:
+    """Load a recorded-traffic trace into normalized replay records.
+
+    Each JSONL line (plain or .gz) is one request with a `timestamp` (also
+    `ts` or `time`; epoch s/ms or ISO-8601) and the request fields either at
+    top level or under `request`/`body`: `messages` (or a bare `prompt`),
+    and optionally `max_tokens`/`max_completion_tokens`, `stream`, `tools`,
+    `temperature`. Records are sorted by time; `offset_s` is relative to the
+    first one. Missing optional fields fall back to the run's RequestConfig.
+    """
+    raw: List[Tuple[float, Dict[str, Any]]] = []
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise ValueError(f"{path}:{lineno}: invalid JSON: {exc}") from exc
+            body = obj.get("request") or obj.get("body")
+            if not isinstance(body, dict):
+                body = obj
+            ts = next((obj[k] for k in ("timestamp", "ts", "time") if obj.get(k) is not None), None)
+            if ts is None:
+                raise ValueError(f"{path}:{lineno}: missing timestamp")
+            messages = body.get("messages")
+            if messages is None and body.get("prompt") is not None:
+                messages = [{"role": "user", "content": str(body["prompt"])}]
+            if not isinstance(messages, list) or not messages:
+                raise ValueError(f"{path}:{lineno}: missing messages")
+            record: Dict[str, Any] = {"messages": messages}
+            max_tokens = body.get("max_tokens", body.get("max_completion_tokens"))
+            if max_tokens is not None:
+                record["max_tokens"] = int(max_tokens)
+            for key in ("stream", "tools", "temperature"):
+                if body.get(key) is not None:
+                    record[key] = body[key]
+            try:
+                raw.append((_trace_timestamp(ts), record))
+            except (TypeError, ValueError) as exc:
+                raise ValueError(f"{path}:{lineno}: bad timestamp {ts!r}") from exc
+    if not raw:
+        raise ValueError(f"{path}: empty trace")
+    raw.sort(key=lambda item: item[0])
+    t0 = raw[0][0]
+    return [dict(record, offset_s=ts - t0) for ts, record in raw]
+
+
+def trace_request_config(cfg: RequestConfig, record: Dict[str, Any]) -> RequestConfig:
+    """The run's RequestConfig with a replay record's own settings applied."""
+    extra = dict(cfg.extra_json or {})
+    if record.get("tools"):
+        extra["tools"] = record["tools"]
+    return replace(
+        cfg,
+        max_tokens=record.get("max_tokens", cfg.max_tokens),
+        stream=bool(record.get("stream", cfg.stream)),
+        temperature=record.get("temperature", cfg.temperature),
+        extra_json=extra or None,
+        system_prompt=None,  # recorded messages already carry any system prompt
+    )
+
+
+def synthetic_text(tokens: int, seed: int = 0) -> str:
+    """Seeded filler text of roughly `tokens` tokens (one common word each)."""
+    rng = random.Random(seed)
+    words = [rng.choice(_SYNTHETIC_WORDS) for _ in range(max(0, tokens))]
+    # Sentence breaks keep the text looking like prose to the chat template
+    for i in range(11, len(words), 12):
+        words[i] += "."
+    return " ".join(words)
+
+
+# Instruction appended to sweep prompts so the reply (decode) stays short;
+# counted as this many tokens against the bucket's target length.
+SWEEP_INSTRUCTION = "Ignore the text above and reply with the single word: ok."
+SWEEP_INSTRUCTION_TOKENS = 14
+
+
+def parse_token_count(text: str) -> int:
+    """Parse '512', '2k', '32K', '1m' (binary multiples: 2k = 2048)."""
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([kKmM]?)\s*", text)
+    if not m:
+        raise ValueError(f"invalid token count: {text!r}")
+    scale = {"": 1, "k": 1024, "m": 1024 * 1024}[m.group(2).lower()]
+    return int(float(m.group(1)) * scale)
+
+
+def sweep_prompt(tokens: int, seed: int) -> str:
+    """Seeded synthetic prompt of roughly `tokens` tokens for the length sweep."""
+    body = synthetic_text(max(1, tokens - SWEEP_INSTRUCTION_TOKENS), seed)
+    return f"{body}\n\n{SWEEP_INSTRUCTION}"
+
+
+class VocabTokenizer:
+    """Greedy longest-match token counter over a local vocabulary.
+
+    Not a faithful reimplementation of any model's BPE merges, but with the
+    model's own vocab it lands within a few percent of the real count, which
+    is enough to compare tokens/sec across servers that don't report usage.
+    Byte-level vocabs (GPT-2 style, "Ġ" for a leading space) are detected and
+    the text is mapped the same way before matching.
+    """
+
+    MAX_TOKEN_CHARS = 32
+
+    def __init__(self, vocab: Iterable[str]) -> None:
+        self.vocab: Set[str] = {t for t in vocab if t}
+        if not self.vocab:
+            raise ValueError("tokenizer vocab is empty")
+        self.byte_level = any(t.startswith("\u0120") for t in self.vocab)
+        self.sentencepiece = not self.byte_level and any(t.startswith("\u2581") for t in self.vocab)
+        self.max_len = min(self.MAX_TOKEN_CHARS, max(len(t) for t in self.vocab))
+
+    @classmethod
+    def from_file(cls, path: str) -> "VocabTokenizer":
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                data = json.load(f)
+                # tokenizer.json nests the vocab under model.vocab (a dict for
+                # BPE/WordPiece, a list of [piece, score] pairs for Unigram)
+                if isinstance(data, dict) and isinstance(data.get("model"), dict):
+                    data = data["model"].get("vocab", {})
+                if isinstance(data, dict):
+                    return cls(data.keys())
+                return cls(t[0] if isinstance(t, list) else t for t in data)
+            return cls(line.rstrip("\n").split("\t")[0] for line in f)
+
+    def count(self, text: str) -> int:
+        if self.byte_level:
+            text = text.replace(" ", "\u0120").replace("\n", "\u010a")
+        elif self.sentencepiece:
+            text = "\u2581" + text.replace(" ", "\u2581")
+        vocab, max_len = self.vocab, self.max_len
+        n, i, end = 0, 0, len(text)
+        while i < end:
+            for size in range(min(max_len, end - i), 0, -1):
+                if text[i : i + size] in vocab:
+                    i += size
+                    break
+            else:
+                # Unknown character: count its UTF-8 bytes, as byte fallback would
+                i += 1
+                n += len(text[i - 1].encode("utf-8")) - 1
+            n += 1
+        return n
+
+
+@functools.lru_cache(maxsize=None)
+def load_tokenizer(spec: str) -> Callable[[str], int]:
+    """Token counter for --tokenizer, from a local vocab file.
+
+    Only a file path is accepted: the spec travels inside RequestConfig to
+    worker processes and agents, so it must never name code to import.
+    Cached, so each worker process loads the vocab once.
+    """
+    return VocabTokenizer.from_file(spec).count
+
+
+def usage_tokens(
+    usage: Any, prompt_key: str = "prompt_tokens", completion_key: str = "completion_tokens"
+) -> Tuple[Optional[int], Optional[int]]:
+    """(prompt_tokens, completion_tokens) from a usage block (OpenAI keys by default)."""
+    if not isinstance(usage, dict):
+        return None, None
+    prompt, completion = usage.get(prompt_key), usage.get(completion_key)
+    return (
+        int(prompt) if isinstance(prompt, (int, float)) else None,
+        int(completion) if isinstance(completion, (int, float)) else None,
+    )
+
+
+def message_text(messages: List[Dict[str, Any]]) -> str:
+    """Concatenated text content of chat messages, for offline token counts."""
+    parts = []
+    for m in messages:
+        content = m.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        elif isinstance(content, list):
+            parts.extend(c.get("text", "") for c in content if isinstance(c, dict))
+    return "\n".join(parts)
+
+
+def profile_peak(spec: str) -> float:
+    return max(max(p.start_level, p.end_level) for p in parse_profile(spec))
+
+
+CAPACITY_DIMENSIONS = ("concurrency", "rate")
+CAPACITY_SEARCHES = ("binary", "step")
+# Minimum requests per load level so a level actually exercises the load:
+# this many requests per concurrency slot, or this many seconds of arrivals.
+CAPACITY_REQUESTS_PER_SLOT = 4
+CAPACITY_SECONDS_PER_RATE_LEVEL = 10.0
+# ... and never fewer measured requests than this, so p95 isn't just the max
+CAPACITY_MIN_SAMPLES = 50
+# Each level starts on a fresh client; its first requests (one per slot, or
+# this many seconds of arrivals) open the connections and are discarded.
+CAPACITY_WARMUP_SECONDS = 1.0
+# Binary search on rate stops once the pass/fail bracket is this tight.
+CAPACITY_RATE_TOLERANCE = 0.05
+
+
+@dataclass
+class CapacitySearch:
+    by: str = "concurrency"
+    search: str = "binary"
+    start: float = 1.0
+    max_level: float = 256.0
+    step: Optional[float] = None  # step search increment; defaults to `start`
+    slo_ttft_p95_ms: Optional[float] = None
+    slo_total_p95_ms: Optional[float] = None
+    min_success_rate: float = 0.99
+
+    def level_passes(self, stats: Dict[str, Any]) -> bool:
+        if not stats["success_rate"] >= self.min_success_rate:
+            return False
+        if self.slo_ttft_p95_ms is not None and not stats["ttft_ms_p95"] <= self.slo_ttft_p95_ms:
+            return False
+        if self.slo_total_p95_ms is not None and not stats["total_ms_p95"] <= self.slo_total_p95_ms:
+            return False
+        return True
+
+    def request_meets_slo(self, r: "SingleResult") -> bool:
+        if not r.success:
+            return False
+        if self.slo_ttft_p95_ms is not None and (r.ttft_ms is None or r.ttft_ms > self.slo_ttft_p95_ms):
+            return False
+        if self.slo_total_p95_ms is not None and (r.total_ms is None or r.total_ms > self.slo_total_p95_ms):
+            return False
+        return True
 
 
 @dataclass
@@ -75,16 +538,92 @@ class SingleResult:
     output_chars: int
     output_bytes: int
     error: Optional[str]
+    # Open-loop only: how late the request was actually sent vs its schedule
+    send_lag_ms: Optional[float] = None
+    # Time-based profiles only: phase name and the load level when sent
+    phase: Optional[str] = None
+    load_level: Optional[float] = None
+    # Multi-turn conversations only: 1-based turn and "session"/"none", and
+    # with session_mode "both" which pass (1 or 2) this result belongs to
+    turn: Optional[int] = None
+    session_mode: Optional[str] = None
+    conversation_pass: Optional[int] = None
+    # Scenario variant label, e.g. "shared"/"busted" for the prefix-cache test
+    variant: Optional[str] = None
+    # Adaptive (--target-ci) runs only, on the last result of each cell: why
+    # sampling stopped ("converged", "max-iterations" or "time-budget")
+    stop_reason: Optional[str] = None
+    # Synthetic prompts only: target length bucket and estimated prompt tokens
+    length_bucket: Optional[int] = None
+    prompt_tokens_est: Optional[int] = None
+    # Streaming decode timing, from content-chunk arrival times. ITL is the
+    # gap between consecutive content chunks; decode_ms = total - TTFT;
+    # TPOT = decode_ms / (chunks - 1), with chunks standing in for tokens.
+    content_chunks: Optional[int] = None
+    decode_ms: Optional[float] = None
+    tpot_ms: Optional[float] = None
+    itl_ms_mean: Optional[float] = None
+    itl_ms_p50: Optional[float] = None
+    itl_ms_p95: Optional[float] = None
+    itl_ms_p99: Optional[float] = None
+    itl_ms_max: Optional[float] = None  # longest stall between chunks
+    # With RequestConfig.record_chunk_times: each chunk's offset from t0 (ms)
+    chunk_times_ms: Optional[List[float]] = None
+    # Token counts: "usage" when reported by the server, "tokenizer" when
+    # counted offline with RequestConfig.tokenizer
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    token_source: Optional[str] = None
+    # Response body bytes as received (SSE framing and JSON included)
+    wire_bytes: Optional[int] = None
+    # Server-reported timings (Ollama native durations, LM Studio stats)
+    server_load_ms: Optional[float] = None
+    server_prefill_ms: Optional[float] = None
+    server_decode_ms: Optional[float] = None
+    # Time spent queued for a connection of a capped pool (--pool-size) before
+    # the request went out, 0 if one was free; client-side queueing, included
+    # in TTFT/total. None with an unbounded pool, where nothing waits
+    pool_wait_ms: Optional[float] = None
+    # Connection phases, from httpcore's trace events. Durations: connect_ms
+    # (TCP connect, DNS included) and tls_ms, only on a new connection, and
+    # write_ms (request headers and body). Offsets from t0, like ttft_ms:
+    # ttfb_ms (response headers received), first_byte_ms (first body bytes)
+    # and first_event_ms (first stream event, e.g. Osaurus's role-only chunk
+    # that precedes any model output); streaming only for the last two.
+    connect_ms: Optional[float] = None
+    tls_ms: Optional[float] = None
+    write_ms: Optional[float] = None
+    ttfb_ms: Optional[float] = None
+    first_byte_ms: Optional[float] = None
+    first_event_ms: Optional[float] = None
+    # Request shape: input length in characters (all message text, system
+    # prompt included) and the max_tokens sent
+    prompt_chars: Optional[int] = None
+    max_tokens: Optional[int] = None
+    # Wall-clock (time.time()) instant the request's timing starts, i.e. t0:
+    # the scheduled send time in open-loop runs. Locates the request in the
+    # measured window for system throughput.
+    started_at: Optional[float] = None
 
 
 def parse_server_arg(arg: str) -> ServerSpec:
-    try:
-        name, base_url, model = arg.split("|", 2)
-        return ServerSpec(name=name.strip(), base_url=base_url.strip(), model=model.strip())
-    except ValueError as exc:
+    parts = arg.split("|")
+    if len(parts) < 3:
+        raise argparse.ArgumentTypeError("--server must be of the form 'name|base_url|model[|proto=...]'")
+    options: Dict[str, str] = {}
+    while len(parts) > 3 and "=" in parts[-1]:
+        key, _, value = parts.pop().partition("=")
+        options[key.strip()] = value.strip()
+    unknown = set(options) - {"proto"}
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown --server option(s): {', '.join(sorted(unknown))}")
+    protocol = options.get("proto", "openai")
+    if protocol not in PROTOCOL_ADAPTERS:
         raise argparse.ArgumentTypeError(
-            "--server must be of the form 'name|base_url|model'"
-        ) from exc
+            f"unknown protocol {protocol!r} (expected one of {', '.join(PROTOCOL_ADAPTERS)})"
+        )
+    name, base_url, model = parts[0], parts[1], "|".join(parts[2:])
+    return ServerSpec(name=name.strip(), base_url=base_url.strip(), model=model.strip(), protocol=protocol)
 
 
 def percentile(values: List[float], p: float) -> float:
@@ -101,6 +640,999 @@ def percentile(values: List[float], p: float) -> float:
     return d0 + d1
 
 
+# Relative accuracy of QuantileSketch: any reported quantile is within 1% of
+# a value actually observed at that rank.
+SKETCH_RELATIVE_ACCURACY = 0.01
+# Values within this of zero (ms, tok/s) share the sketch's zero bucket
+SKETCH_MIN_VALUE = 1e-6
+DEFAULT_PERCENTILES = (50.0, 90.0, 95.0, 99.0, 99.9)
+
+
+class QuantileSketch:
+    """Mergeable streaming quantile sketch (DDSketch-style log buckets).
+
+    Each value lands in bucket ceil(log_gamma(|value|)) with gamma chosen
+    from the relative accuracy (negative values in a mirrored set of
+    buckets), so memory grows with the value range's orders of magnitude (a
+    few hundred buckets for ms latencies) rather than with the number of
+    values. Two sketches with the same accuracy merge by adding bucket
+    counts, which is what lets separate runs be combined after the fact from
+    their saved summaries.
+    """
+
+    __slots__ = ("relative_accuracy", "_log_gamma", "bins", "negatives", "zeros", "count", "total", "min", "max")
+
+    def __init__(self, relative_accuracy: float = SKETCH_RELATIVE_ACCURACY) -> None:
+        self.relative_accuracy = relative_accuracy
+        self._log_gamma = math.log((1.0 + relative_accuracy) / (1.0 - relative_accuracy))
+        self.bins: Dict[int, int] = {}
+        self.negatives: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float, weight: int = 1) -> None:
+        if value > SKETCH_MIN_VALUE:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + weight
+        elif value < -SKETCH_MIN_VALUE:
+            key = math.ceil(math.log(-value) / self._log_gamma)
+            self.negatives[key] = self.negatives.get(key, 0) + weight
+        else:
+            self.zeros += weight
+        self.count += weight
+        self.total += value * weight
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def extend(self, values: List[float]) -> None:
+        """add() for a batch of values, with the bucketing done in C."""
+        if not values:
+            return
+        positive = [v for v in values if v > SKETCH_MIN_VALUE]
+        negative = [-v for v in values if v < -SKETCH_MIN_VALUE] if len(positive) < len(values) else []
+        scale = (1.0 / self._log_gamma).__mul__
+        for bins, batch in ((self.bins, positive), (self.negatives, negative)):
+            keys = map(math.ceil, map(scale, map(math.log, batch)))
+            # Counter pays off on long batches; short ones (per-cell groups) go direct
+            if len(batch) > 32:
+                for key, n in collections.Counter(keys).items():
+                    bins[key] = bins.get(key, 0) + n
+            else:
+                for key in keys:
+                    bins[key] = bins.get(key, 0) + 1
+        self.zeros += len(values) - len(positive) - len(negative)
+        self.count += len(values)
+        self.total += math.fsum(values)
+        self.min = min(self.min, min(values))
+        self.max = max(self.max, max(values))
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("can't merge quantile sketches with different relative accuracy")
+        for bins, theirs in ((self.bins, other.bins), (self.negatives, other.negatives)):
+            for key, n in theirs.items():
+                bins[key] = bins.get(key, 0) + n
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def _sorted_keys(self) -> Tuple[List[int], List[int]]:
+        return sorted(self.negatives, reverse=True), sorted(self.bins)
+
+    def _value_at(self, rank: int, keys: Tuple[List[int], List[int]]) -> float:
+        # Value of the rank-th smallest (0-based) item, as its bucket's midpoint
+        gamma = math.exp(self._log_gamma)
+        seen = 0
+        for key in keys[0]:
+            seen += self.negatives[key]
+            if seen > rank:
+                return min(max(-2.0 * gamma**key / (gamma + 1.0), self.min), self.max)
+        seen += self.zeros
+        if seen > rank:
+            return min(max(0.0, self.min), self.max)
+        for key in keys[1]:
+            seen += self.bins[key]
+            if seen > rank:
+                return min(max(2.0 * gamma**key / (gamma + 1.0), self.min), self.max)
+        return self.max
+
+    def value_at(self, rank: int) -> float:
+        """The rank-th smallest (0-based) value added, to within the accuracy."""
+        return self._value_at(rank, self._sorted_keys()) if self.count else float("nan")
+
+    def quantile(self, q: float) -> float:
+        """Like percentile(values, q): linear interpolation between ranks."""
+        if not self.count:
+            return float("nan")
+        keys = self._sorted_keys()
+        k = (self.count - 1) * q
+        f = int(k)
+        low = self._value_at(f, keys)
+        if f == k or f + 1 >= self.count:
+            return low
+        return low + (self._value_at(f + 1, keys) - low) * (k - f)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "relative_accuracy": self.relative_accuracy,
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min,
+            "max": self.max,
+            "zeros": self.zeros,
+            "bins": {str(key): n for key, n in sorted(self.bins.items())},
+        }
+        if self.negatives:
+            data["negative_bins"] = {str(key): n for key, n in sorted(self.negatives.items())}
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(data["relative_accuracy"])
+        sketch.bins = {int(key): int(n) for key, n in data["bins"].items()}
+        sketch.negatives = {int(key): int(n) for key, n in (data.get("negative_bins") or {}).items()}
+        sketch.zeros = int(data["zeros"])
+        sketch.count = int(data["count"])
+        sketch.total = float(data["sum"])
+        sketch.min = float(data["min"])
+        sketch.max = float(data["max"])
+        return sketch
+
+
+def parse_percentiles(arg: str) -> Tuple[float, ...]:
+    """Parse '50,90,99.9' into sorted percentiles in (0, 100)."""
+    try:
+        values = sorted({float(v) for v in arg.split(",") if v.strip()})
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid percentile list: {arg!r}") from None
+    if not values or values[0] <= 0 or values[-1] >= 100:
+        raise argparse.ArgumentTypeError("percentiles must be within (0, 100)")
+    return tuple(values)
+
+
+def percentile_label(p: float) -> str:
+    return f"p{p:g}"
+
+
+SKETCH_METRICS = (
+    "ttft_ms",
+    "total_ms",
+    "itl_ms",
+    "output_tokens_per_sec",
+    "decode_tokens_per_sec",
+    "chars_per_sec",
+    "bytes_per_sec",
+)
+
+
+def request_metrics(items: List[SingleResult]) -> Dict[str, List[float]]:
+    """One value per successful request for each per-request metric.
+
+    output_tokens_per_sec, chars_per_sec and bytes_per_sec are end-to-end
+    rates: completion tokens (or output chars/bytes) over the request's total
+    time. decode_tokens_per_sec leaves prefill out: the tokens after the
+    first over decode_ms (streaming only).
+    """
+    ok = [i for i in items if i.success]
+    timed = [i for i in ok if i.total_ms]
+    return {
+        "ttft_ms": [i.ttft_ms for i in ok if i.ttft_ms is not None],
+        "total_ms": [i.total_ms for i in ok if i.total_ms is not None],
+        "output_tokens_per_sec": [
+            i.completion_tokens * 1000.0 / i.total_ms for i in timed if i.completion_tokens is not None
+        ],
+        "decode_tokens_per_sec": [
+            (i.completion_tokens - 1) * 1000.0 / i.decode_ms
+            for i in ok
+            if i.decode_ms and i.completion_tokens is not None and i.completion_tokens > 1
+        ],
+        "chars_per_sec": [i.output_chars * 1000.0 / i.total_ms for i in timed],
+        "bytes_per_sec": [i.output_bytes * 1000.0 / i.total_ms for i in timed],
+    }
+
+
+# Bootstrap confidence intervals. Resampling is vectorized with numpy when it
+# is installed; a group is bootstrapped only while resamples x samples stays
+# within the budget, beyond which the normal / order-statistic intervals are
+# as good and far cheaper.
+BOOTSTRAP_RESAMPLES = 1000
+BOOTSTRAP_BUDGET = 5_000_000 if np is not None else 250_000
+# Cap on resampled values materialized at once by the numpy path
+BOOTSTRAP_BATCH_VALUES = 4_000_000
+CONFIDENCE = 0.95
+SIGNIFICANCE_LEVEL = 0.05
+# Per-request metrics with confidence intervals and pairwise comparisons
+COMPARED_METRICS = ("ttft_ms", "total_ms", "output_tokens_per_sec")
+
+
+def _bootstrap_stats(values: List[float], stat: str, resamples: int, seed: int) -> List[float]:
+    # `stat` ("mean" or "median") of each of `resamples` resamples of `values`
+    n = len(values)
+    if np is not None:
+        rng = np.random.default_rng(seed)
+        data = np.asarray(values, dtype=float)
+        reduce = np.mean if stat == "mean" else np.median
+        batch = max(1, BOOTSTRAP_BATCH_VALUES // n)
+        out = [
+            reduce(data[rng.integers(0, n, size=(min(batch, resamples - start), n))], axis=1)
+            for start in range(0, resamples, batch)
+        ]
+        return np.concatenate(out).tolist()
+    rng = random.Random(seed)
+    reduce = statistics.fmean if stat == "mean" else statistics.median
+    return [reduce(rng.choices(values, k=n)) for _ in range(resamples)]
+
+
+def _z(confidence: float) -> float:
+    return statistics.NormalDist().inv_cdf(0.5 + confidence / 2.0)
+
+
+def confidence_interval(
+    values: List[float],
+    stat: str = "mean",
+    resamples: int = BOOTSTRAP_RESAMPLES,
+    confidence: float = CONFIDENCE,
+    seed: int = 0,
+) -> Tuple[float, float, str]:
+    """(low, high, method) interval for the mean or median of `values`.
+
+    method is "bootstrap" (percentile bootstrap) while resamples x samples
+    fits BOOTSTRAP_BUDGET; larger samples get the normal interval for the
+    mean ("normal") and the binomial order-statistic interval for the median
+    ("order"), which are accurate at that size and need no resampling.
+    """
+    n = len(values)
+    if n < 2 or resamples <= 0:
+        return float("nan"), float("nan"), "none"
+    alpha = (1.0 - confidence) / 2.0
+    if n * resamples <= BOOTSTRAP_BUDGET:
+        dist = sorted(_bootstrap_stats(values, stat, resamples, seed))
+        return percentile(dist, alpha), percentile(dist, 1.0 - alpha), "bootstrap"
+    return _large_sample_ci(values, stat, confidence)
+
+
+def _large_sample_ci(values: List[float], stat: str, confidence: float) -> Tuple[float, float, str]:
+    n = len(values)
+    z = _z(confidence)
+    if stat == "mean":
+        mean = statistics.fmean(values)
+        half = z * statistics.stdev(values) / math.sqrt(n)
+        return mean - half, mean + half, "normal"
+    ordered = sorted(values)
+    half = z * math.sqrt(n) / 2.0
+    return ordered[max(0, int(n / 2.0 - half))], ordered[min(n - 1, int(math.ceil(n / 2.0 + half)))], "order"
+
+
+def median_diff_ci(
+    a: List[float],
+    b: List[float],
+    resamples: int = BOOTSTRAP_RESAMPLES,
+    confidence: float = CONFIDENCE,
+    seed: int = 0,
+) -> Tuple[float, float]:
+    """Interval for (median(a) - median(b)) / median(b), in percent.
+
+    Bootstrapped (each sample resampled independently) within the budget;
+    beyond it, the delta method on the medians' order-statistic intervals.
+    """
+    if len(a) < 2 or len(b) < 2 or resamples <= 0:
+        return float("nan"), float("nan")
+    if max(len(a), len(b)) * resamples > BOOTSTRAP_BUDGET:
+        z = _z(confidence)
+        ma, mb = statistics.median(a), statistics.median(b)
+        if not mb:
+            return float("nan"), float("nan")
+        low_a, high_a, _ = _large_sample_ci(a, "median", confidence)
+        low_b, high_b, _ = _large_sample_ci(b, "median", confidence)
+        ratio = ma / mb
+        se = math.hypot((high_a - low_a) / (2 * z), ratio * (high_b - low_b) / (2 * z)) / abs(mb)
+        return (ratio - 1.0 - z * se) * 100.0, (ratio - 1.0 + z * se) * 100.0
+    diffs = sorted(
+        (ma - mb) / mb * 100.0
+        for ma, mb in zip(_bootstrap_stats(a, "median", resamples, seed), _bootstrap_stats(b, "median", resamples, seed + 1))
+        if mb
+    )
+    if not diffs:
+        return float("nan"), float("nan")
+    alpha = (1.0 - confidence) / 2.0
+    return percentile(diffs, alpha), percentile(diffs, 1.0 - alpha)
+
+
+def mann_whitney(a: List[float], b: List[float]) -> Tuple[float, float]:
+    """Two-sided Mann-Whitney U test: (rank-biserial effect size, p-value).
+
+    The effect size is 2U/(n1 n2) - 1 for sample `a`: +1 when every value of
+    `a` is above every value of `b`, -1 when below, 0 for full overlap. The
+    p-value uses the normal approximation with tie and continuity
+    corrections, which is reasonable from about eight samples per side.
+    """
+    n1, n2 = len(a), len(b)
+    if not n1 or not n2:
+        return float("nan"), float("nan")
+    pooled = sorted([(v, 0) for v in a] + [(v, 1) for v in b])
+    n = n1 + n2
+    rank_sum = 0.0
+    ties = 0.0
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and pooled[j + 1][0] == pooled[i][0]:
+            j += 1
+        t = j - i + 1
+        if t > 1:
+            ties += t**3 - t
+        avg_rank = (i + j) / 2.0 + 1.0
+        rank_sum += avg_rank * sum(1 for k in range(i, j + 1) if pooled[k][1] == 0)
+        i = j + 1
+    u = rank_sum - n1 * (n1 + 1) / 2.0
+    effect = 2.0 * u / (n1 * n2) - 1.0
+    mu = n1 * n2 / 2.0
+    var = n1 * n2 / 12.0 * ((n + 1) - ties / (n * (n - 1))) if n > 1 else 0.0
+    if var <= 0:
+        return effect, 1.0
+    z = (abs(u - mu) - 0.5) / math.sqrt(var)
+    return effect, min(1.0, math.erfc(max(0.0, z) / math.sqrt(2.0)))
+
+
+def confidence_intervals(
+    values: Dict[str, List[float]], resamples: int = BOOTSTRAP_RESAMPLES
+) -> Dict[str, Any]:
+    """CIs for the mean and median of each COMPARED_METRICS metric of a group."""
+    out: Dict[str, Any] = {"confidence": CONFIDENCE, "resamples": resamples}
+    methods = set()
+    for n, name in enumerate(COMPARED_METRICS):
+        samples = values.get(name) or []
+        for stat, label in (("mean", "mean"), ("median", "p50")):
+            low, high, method = confidence_interval(samples, stat, resamples, seed=n)
+            if method != "none":
+                out[f"{name}_{label}"] = [low, high]
+                methods.add(method)
+    out["method"] = "/".join(sorted(methods)) or None
+    return out
+
+
+def compare_groups(
+    values: Dict[Tuple[str, str], Dict[str, List[float]]], resamples: int = BOOTSTRAP_RESAMPLES
+) -> Dict[Tuple[str, str], Dict[str, Dict[str, Any]]]:
+    """Pairwise tests between groups, keyed by the first group of each pair.
+
+    For every metric: the medians' relative difference (first vs second, %)
+    with its bootstrap interval, the Mann-Whitney effect size and p-value,
+    and whether the difference is significant at SIGNIFICANCE_LEVEL.
+    """
+    keys = list(values)
+    out: Dict[Tuple[str, str], Dict[str, Dict[str, Any]]] = {}
+    for x, first in enumerate(keys):
+        for second in keys[x + 1 :]:
+            table: Dict[str, Any] = {}
+            for n, name in enumerate(COMPARED_METRICS):
+                a, b = values[first].get(name) or [], values[second].get(name) or []
+                if len(a) < 2 or len(b) < 2:
+                    continue
+                ma, mb = statistics.median(a), statistics.median(b)
+                low, high = median_diff_ci(a, b, resamples, seed=n)
+                effect, p = mann_whitney(a, b)
+                table[name] = {
+                    "median_diff_pct": (ma - mb) / mb * 100.0 if mb else float("nan"),
+                    "median_diff_pct_ci": [low, high],
+                    "effect_size": effect,
+                    "p_value": p,
+                    "significant": p < SIGNIFICANCE_LEVEL,
+                }
+            out.setdefault(first, {})[f"{second[0]}|{second[1]}"] = table
+    return out
+
+
+# Adaptive iterations (--target-ci) re-check a cell's interval after every
+# result, so they use the distribution-free order-statistic interval for the
+# median rather than the bootstrap. Below this many samples that interval is
+# just [min, max] with too little coverage to trust.
+TARGET_CI_MIN_SAMPLES = 6
+
+
+def parse_fraction(text: str) -> float:
+    """Parse '2%', '2' or '0.02' into 0.02: bare numbers of 1 or more are
+    percentages."""
+    text = text.strip()
+    try:
+        if text.endswith("%"):
+            return float(text[:-1]) / 100.0
+        value = float(text)
+    except ValueError:
+        raise ValueError(f"invalid fraction: {text!r}") from None
+    return value / 100.0 if value >= 1 else value
+
+
+def relative_half_width(values: List[float], confidence: float = CONFIDENCE) -> float:
+    """Half-width of the median's CI as a fraction of the median (nan if undefined)."""
+    if len(values) < 2:
+        return float("nan")
+    low, high, _ = _large_sample_ci(values, "median", confidence)
+    median = statistics.median(values)
+    return (high - low) / 2.0 / abs(median) if median else float("nan")
+
+
+def sketch_relative_half_width(sketch: QuantileSketch, confidence: float = CONFIDENCE) -> float:
+    """relative_half_width() read from a sketch: the same order-statistic
+    interval, with its ranks looked up in the sketch."""
+    n = sketch.count
+    median = sketch.quantile(0.5)
+    if n < 2 or not median:
+        return float("nan")
+    half = _z(confidence) * math.sqrt(n) / 2.0
+    low = sketch.value_at(max(0, int(n / 2.0 - half)))
+    high = sketch.value_at(min(n - 1, int(math.ceil(n / 2.0 + half))))
+    return (high - low) / 2.0 / abs(median)
+
+
+def sketch_quantiles(
+    sketches: Dict[str, QuantileSketch], percentiles: Sequence[float]
+) -> Dict[str, Dict[str, float]]:
+    """{metric: {"p50": ..., "p99.9": ...}} for the non-empty sketches."""
+    return {
+        name: {percentile_label(p): sketch.quantile(p / 100.0) for p in percentiles}
+        for name, sketch in sketches.items()
+        if sketch.count
+    }
+
+
+def chunk_timing(
+    times: "array[float]",
+    t0: float,
+    ttft_ms: Optional[float],
+    total_ms: float,
+    keep: bool,
+    completion_tokens: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Decode metrics from content-chunk perf_counter() times (see SingleResult).
+
+    TPOT divides by `completion_tokens` - 1 when the token count is known and
+    by the chunk count - 1 otherwise.
+    """
+    if not times:
+        return {}
+    gaps = [(b - a) * 1000.0 for a, b in zip(times, times[1:])]
+    decode_ms = total_ms - ttft_ms if ttft_ms is not None else None
+    steps = (completion_tokens or len(times)) - 1
+    metrics: Dict[str, Any] = {
+        "content_chunks": len(times),
+        "decode_ms": decode_ms,
+        "tpot_ms": decode_ms / steps if decode_ms is not None and steps > 0 else None,
+    }
+    if gaps:
+        metrics.update(
+            itl_ms_mean=sum(gaps) / len(gaps),
+            itl_ms_p50=percentile(gaps, 0.5),
+            itl_ms_p95=percentile(gaps, 0.95),
+            itl_ms_p99=percentile(gaps, 0.99),
+            itl_ms_max=max(gaps),
+        )
+    if keep:
+        metrics["chunk_times_ms"] = [round((t - t0) * 1000.0, 3) for t in times]
+    return metrics
+
+
+def arrival_offsets(
+    rate: float,
+    pattern: str,
+    count: int,
+    burst_size: int = 8,
+    seed: Optional[int] = None,
+) -> Iterator[float]:
+    """Yield `count` send offsets (seconds from start) averaging `rate` req/s.
+
+    poisson: exponential inter-arrival gaps.
+    uniform: fixed 1/rate spacing.
+    bursty:  groups of `burst_size` released together, with exponential gaps
+             between bursts so the long-run mean rate is still `rate`.
+    """
+    if rate <= 0:
+        raise ValueError("rate must be > 0")
+    if pattern not in ARRIVAL_PATTERNS:
+        raise ValueError(f"unknown arrival pattern: {pattern}")
+    rng = random.Random(seed)
+    t = 0.0
+    for i in range(count):
+        if pattern == "uniform":
+            t = i / rate
+        elif i:
+            t += arrival_gap(rng, pattern, rate, burst_size, i)
+        yield t
+
+
+def arrival_gap(rng: random.Random, pattern: str, rate: float, burst_size: int, index: int) -> float:
+    """Gap in seconds before the `index`-th arrival (index >= 1) at `rate`."""
+    if pattern == "uniform":
+        return 1.0 / rate
+    if pattern == "poisson":
+        return rng.expovariate(rate)
+    burst_size = max(1, burst_size)
+    return rng.expovariate(rate / burst_size) if index % burst_size == 0 else 0.0
+
+
+class StreamParser:
+    """Incremental splitter for SSE and NDJSON response bodies.
+
+    Fed raw body bytes as they arrive, it returns the payload of every event
+    completed so far, without decoding text. SSE events may span several
+    `data:` lines (joined with a newline) and end at a blank line; `:`
+    comments (keep-alives) and event/id/retry fields are skipped. A line
+    with no field name is a complete event on its own, which covers NDJSON
+    and servers that omit the `data:` prefix. The common single-line
+    `data: ...` event is split out with bytes.split() and never walked line
+    by line.
+    """
+
+    __slots__ = ("_buf", "_data", "bytes_seen")
+
+    def __init__(self) -> None:
+        self._buf = b""
+        self._data: List[bytes] = []
+        self.bytes_seen = 0
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        self.bytes_seen += len(chunk)
+        buf = self._buf + chunk if self._buf else chunk
+        if b"\r" in buf:
+            # A lone trailing \r stays buffered until its \n arrives
+            buf = buf.replace(b"\r\n", b"\n")
+        data = self._data
+        events: List[bytes] = []
+        if data and buf[:1] == b"\n":
+            # Blank line ending an event whose data lines came in earlier reads
+            events.append(self._flush())
+            buf = buf[1:]
+        blocks = buf.split(b"\n\n")
+        tail = blocks.pop()
+        for block in blocks:
+            if block[:6] == b"data: " and not data and b"\n" not in block:
+                events.append(block[6:])
+            else:
+                self._lines(block.split(b"\n"), events)
+                if data:
+                    events.append(self._flush())
+        if b"\n" in tail:
+            # Complete lines of an unfinished event, or NDJSON records
+            lines = tail.split(b"\n")
+            tail = lines.pop()
+            self._lines(lines, events)
+        self._buf = tail
+        return events
+
+    def close(self) -> List[bytes]:
+        """Flush a trailing line or event the server didn't terminate."""
+        if not (self._buf or self._data):
+            return []
+        events = self.feed(b"\n\n")
+        self.bytes_seen -= 2
+        return events
+
+    def _lines(self, lines: List[bytes], events: List[bytes]) -> None:
+        data = self._data
+        for line in lines:
+            if not line:
+                if data:
+                    events.append(self._flush())
+            elif line[:5] == b"data:":
+                data.append(line[6:] if line[5:6] == b" " else line[5:])
+            elif line[:1] == b":" or line.startswith((b"event:", b"id:", b"retry:")):
+                continue
+            else:
+                line = line.strip()
+                if line:
+                    events.append(line)
+
+    def _flush(self) -> bytes:
+        data = self._data
+        event = data[0] if len(data) == 1 else b"\n".join(data)
+        data.clear()
+        return event
+
+
+async def iter_stream_events(resp: httpx.Response, parser: StreamParser) -> AsyncIterator[Tuple[float, List[bytes]]]:
+    """Yield (arrival time, completed events) per network read of `resp`.
+
+    Reads the raw body, skipping httpx's decoders unless the response is
+    content-encoded; the final batch is whatever the parser flushes at EOF.
+    """
+    body = resp.aiter_bytes() if "content-encoding" in resp.headers else resp.aiter_raw()
+    async for raw in body:
+        yield time.perf_counter(), parser.feed(raw)
+    yield time.perf_counter(), parser.close()
+
+
+_CONTENT_FIELD = b'"content":'
+
+
+def parse_stream_event(
+    data: bytes, loads: Callable[[bytes], Any] = json_loads, lazy: bool = LAZY_EVENTS
+) -> Tuple[str, Any]:
+    """(content text, usage block) from one stream event payload.
+
+    With `lazy`, a compact chunk with a single escape-free "content" string
+    (the usual delta) has its text sliced out without decoding the JSON, and
+    chunks carrying neither content nor usage (role-only, finish and tool-call
+    deltas) are skipped outright. Everything else gets a full decode with
+    `loads`. Payloads that aren't JSON count as raw content, as some servers
+    send plain text.
+    """
+    if lazy and data[:1] == b"{" and b'"usage"' not in data:
+        i = data.find(_CONTENT_FIELD)
+        if i >= 0:
+            start = i + len(_CONTENT_FIELD)
+            if data[start : start + 1] == b" ":
+                start += 1
+            if data[start : start + 1] == b'"':
+                start += 1
+                end = data.find(b'"', start)
+                if end >= 0 and data.find(b"\\", start, end) < 0 and data.find(_CONTENT_FIELD, end) < 0:
+                    return data[start:end].decode("utf-8", errors="replace"), None
+        elif b'"content"' not in data:
+            return "", None
+    try:
+        obj = loads(data)
+    except ValueError:
+        return data.decode("utf-8", errors="replace"), None
+    if not isinstance(obj, dict):
+        return "", None
+    choices = obj.get("choices")
+    if choices:
+        # OpenAI-style delta path
+        delta = choices[0].get("delta") or {}
+        text = delta.get("content", "") or ""
+    else:
+        # Fallback if vendor uses non-standard field
+        text = obj.get("content", "") or ""
+    # Usage arrives on a final chunk with empty choices
+    return (text if isinstance(text, str) else ""), obj.get("usage")
+
+
+def _event_json(data: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        obj = json_loads(data)
+    except ValueError:
+        return None
+    return obj if isinstance(obj, dict) else None
+
+
+def _bench_chunk(choice: bytes) -> bytes:
+    return (
+        b'{"id":"chatcmpl-bench","object":"chat.completion.chunk","created":1738193123,"model":"bench",'
+        b'"choices":[' + choice + b"]}"
+    )
+
+
+class ProtocolAdapter:
+    """One runtime's chat API: request shape, stream events and final body.
+
+    run_single_chat() owns the connection, the timing and the byte-level
+    stream splitting, and defers everything protocol-specific to an adapter,
+    so adding a runtime means registering a subclass with register_protocol()
+    rather than forking the hot loop. parse_event() runs once per streamed
+    event and must stay cheap; the "final" object it may return (usage block,
+    closing record, ...) is only interpreted by the same adapter's
+    usage_tokens() and server_timings(). The base class speaks OpenAI chat.
+    """
+
+    name = "openai"
+    path = "/v1/chat/completions"
+    stream_accept = "text/event-stream"
+    # (content text, final object or None) for one stream event payload
+    parse_event = staticmethod(parse_stream_event)
+
+    def endpoint(self, base_url: str) -> str:
+        base = base_url.rstrip("/")
+        if base.endswith("/v1"):
+            base = base[: -len("/v1")]
+        return base + self.path
+
+    def build_payload(
+        self, model: str, messages: List[Dict[str, Any]], cfg: RequestConfig, session_id: Optional[str]
+    ) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {
+            "model": model,
+            "messages": messages,
+            "temperature": cfg.temperature,
+            "max_tokens": cfg.max_tokens,
+            "stream": bool(cfg.stream),
+        }
+        if session_id is not None:
+            payload["session_id"] = session_id
+        if cfg.stream and cfg.include_usage:
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    def parse_body(self, body: Any) -> Tuple[Optional[str], Any]:
+        """(content, final object) from a non-streamed body; content is None
+        when the body isn't a recognisable response."""
+        if not isinstance(body, dict):
+            return None, None
+        choices = body.get("choices") or []
+        if not choices:
+            return None, body.get("usage")
+        message = choices[0].get("message") or {}
+        return message.get("content", "") or "", body.get("usage")
+
+    def usage_tokens(self, final: Any) -> Tuple[Optional[int], Optional[int]]:
+        return usage_tokens(final)
+
+    def server_timings(self, final: Any) -> Dict[str, float]:
+        """SingleResult server_*_ms fields, when the runtime reports them."""
+        return {}
+
+    def sample_event(self, text: str) -> bytes:
+        """A typical streamed content event carrying `text`, for parser-bench."""
+        delta = json.dumps({"content": text}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return _bench_chunk(b'{"index":0,"delta":' + delta + b',"finish_reason":null}')
+
+
+class OpenAICompletionsAdapter(ProtocolAdapter):
+    """Legacy /v1/completions: the chat messages are flattened into `prompt`."""
+
+    name = "completions"
+    path = "/v1/completions"
+
+    def build_payload(
+        self, model: str, messages: List[Dict[str, Any]], cfg: RequestConfig, session_id: Optional[str]
+    ) -> Dict[str, Any]:
+        payload = super().build_payload(model, messages, cfg, session_id)
+        payload["prompt"] = message_text(payload.pop("messages"))
+        return payload
+
+    @staticmethod
+    def parse_event(data: bytes) -> Tuple[str, Any]:
+        obj = _event_json(data)
+        if obj is None:
+            return data.decode("utf-8", errors="replace"), None
+        choices = obj.get("choices")
+        text = (choices[0].get("text") or "") if choices else ""
+        return (text if isinstance(text, str) else ""), obj.get("usage")
+
+    def parse_body(self, body: Any) -> Tuple[Optional[str], Any]:
+        if not isinstance(body, dict):
+            return None, None
+        choices = body.get("choices") or []
+        if not choices:
+            return None, body.get("usage")
+        return choices[0].get("text", "") or "", body.get("usage")
+
+    def sample_event(self, text: str) -> bytes:
+        value = json.dumps(text, ensure_ascii=False).encode("utf-8")
+        return _bench_chunk(b'{"index":0,"text":' + value + b',"finish_reason":null}')
+
+
+class OllamaAdapter(ProtocolAdapter):
+    """Native /api/chat with NDJSON streaming (Ollama, and Osaurus's /api/chat).
+
+    The closing record (`"done": true`) is the final object: it carries
+    prompt_eval_count/eval_count and the load/prompt_eval/eval durations (ns).
+    """
+
+    name = "ollama"
+    path = "/api/chat"
+    stream_accept = "application/x-ndjson"
+
+    def build_payload(
+        self, model: str, messages: List[Dict[str, Any]], cfg: RequestConfig, session_id: Optional[str]
+    ) -> Dict[str, Any]:
+        payload = super().build_payload(model, messages, replace(cfg, include_usage=False), session_id)
+        # Ollama reads options; Osaurus's /api/chat reads the top-level
+        # OpenAI fields, so send both
+        payload["options"] = {"temperature": cfg.temperature, "num_predict": cfg.max_tokens}
+        return payload
+
+    @staticmethod
+    def parse_event(data: bytes) -> Tuple[str, Any]:
+        obj = _event_json(data)
+        if obj is None:
+            return data.decode("utf-8", errors="replace"), None
+        message = obj.get("message")
+        text = (message.get("content") or "") if isinstance(message, dict) else ""
+        return (text if isinstance(text, str) else ""), (obj if obj.get("done") else None)
+
+    def parse_body(self, body: Any) -> Tuple[Optional[str], Any]:
+        if isinstance(body, dict) and isinstance(body.get("message"), dict):
+            return body["message"].get("content", "") or "", body
+        # Osaurus answers a non-streamed /api/chat in the OpenAI shape
+        return super().parse_body(body)
+
+    def usage_tokens(self, final: Any) -> Tuple[Optional[int], Optional[int]]:
+        if isinstance(final, dict) and "eval_count" in final:
+            return usage_tokens(final, "prompt_eval_count", "eval_count")
+        return usage_tokens(final)
+
+    def server_timings(self, final: Any) -> Dict[str, float]:
+        if not isinstance(final, dict):
+            return {}
+        out = {}
+        for key, field_name in (
+            ("load_duration", "server_load_ms"),
+            ("prompt_eval_duration", "server_prefill_ms"),
+            ("eval_duration", "server_decode_ms"),
+        ):
+            value = final.get(key)
+            if isinstance(value, (int, float)):
+                out[field_name] = value / 1e6
+        return out
+
+    def sample_event(self, text: str) -> bytes:
+        record = {
+            "model": "bench",
+            "created_at": "2025-01-01T00:00:00Z",
+            "message": {"role": "assistant", "content": text},
+            "done": False,
+        }
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class LMStudioAdapter(ProtocolAdapter):
+    """LM Studio's REST API (/api/v0): OpenAI-shaped, plus a `stats` block with
+    time_to_first_token and generation_time in seconds. The final object is
+    the whole chunk (or body) that carries usage and/or stats."""
+
+    name = "lmstudio"
+    path = "/api/v0/chat/completions"
+
+    @staticmethod
+    def parse_event(data: bytes) -> Tuple[str, Any]:
+        if b'"stats"' not in data and b'"usage"' not in data:
+            return parse_stream_event(data)
+        obj = _event_json(data)
+        if obj is None:
+            return data.decode("utf-8", errors="replace"), None
+        choices = obj.get("choices")
+        text = ((choices[0].get("delta") or {}).get("content") or "") if choices else ""
+        return (text if isinstance(text, str) else ""), obj
+
+    def parse_body(self, body: Any) -> Tuple[Optional[str], Any]:
+        content, _usage = super().parse_body(body)
+        return content, body if isinstance(body, dict) else None
+
+    def usage_tokens(self, final: Any) -> Tuple[Optional[int], Optional[int]]:
+        return usage_tokens(final.get("usage") if isinstance(final, dict) else None)
+
+    def server_timings(self, final: Any) -> Dict[str, float]:
+        stats = final.get("stats") if isinstance(final, dict) else None
+        if not isinstance(stats, dict):
+            return {}
+        out = {}
+        for key, field_name in (("time_to_first_token", "server_prefill_ms"), ("generation_time", "server_decode_ms")):
+            value = stats.get(key)
+            if isinstance(value, (int, float)):
+                out[field_name] = value * 1000.0
+        return out
+
+
+PROTOCOL_ADAPTERS: Dict[str, ProtocolAdapter] = {}
+
+
+def register_protocol(adapter: ProtocolAdapter) -> ProtocolAdapter:
+    """Make `adapter` available as `proto=<adapter.name>` in --server specs."""
+    PROTOCOL_ADAPTERS[adapter.name] = adapter
+    return adapter
+
+
+for _adapter in (ProtocolAdapter(), OpenAICompletionsAdapter(), OllamaAdapter(), LMStudioAdapter()):
+    register_protocol(_adapter)
+
+
+def make_client(cfg: RequestConfig) -> httpx.AsyncClient:
+    """The HTTP client a run shares between its requests.
+
+    The pool is unbounded unless --pool-size caps it: httpx's default of 100
+    connections would otherwise queue requests above that concurrency inside
+    the client, where the wait looks like server latency.
+    """
+    size = cfg.pool_size or None
+    limits = httpx.Limits(
+        max_connections=size,
+        # No idle connections are kept in new-connection mode, so every
+        # request opens (and closes) its own
+        max_keepalive_connections=0 if cfg.new_connection else size,
+        keepalive_expiry=cfg.keepalive_expiry,
+    )
+    # Only a capped pool can make requests wait, so only it is watched
+    hooks = {"request": [PoolGauge(size).enter]} if size else {}
+    return httpx.AsyncClient(http2=cfg.http2, limits=limits, event_hooks=hooks)
+
+
+class PoolGauge:
+    """Counts the requests holding (or queued for) the connections of one
+    client's capped pool, so each request can tell on entry whether a
+    connection was free or it had to queue. With --http2 a busy connection
+    can still take more streams, so requests over the cap are counted as
+    queued until their first connection event, which can overstate the wait.
+    """
+
+    __slots__ = ("size", "in_use")
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.in_use = 0
+
+    async def enter(self, request: httpx.Request) -> None:
+        # httpx runs request hooks right before handing the request to the pool
+        trace = request.extensions.get("trace")
+        if isinstance(trace, ConnectionTrace):
+            trace.enter_pool(self)
+
+
+class ConnectionTrace:
+    """httpcore trace hook (the "trace" request extension): records when each
+    connection-level step of one request started and completed, keyed without
+    the connection-type prefix ("connect_tcp.started", "send_request_headers.
+    complete", ...; HTTP/1.1 and HTTP/2 share names).
+
+    httpcore traces nothing while a request waits in the pool, so for a
+    request that entered a full pool the first event (connect_tcp on a new
+    connection, send_request_headers on a reused one) marks the moment it got
+    its connection. release() must be called once the response is closed.
+    """
+
+    __slots__ = ("queued", "events", "gauge")
+
+    def __init__(self) -> None:
+        self.queued: Optional[float] = None
+        self.events: Dict[str, float] = {}
+        self.gauge: Optional[PoolGauge] = None
+
+    async def __call__(self, name: str, info: Dict[str, Any]) -> None:
+        # Keep the first occurrence: a retried connect shouldn't move it
+        self.events.setdefault(name.partition(".")[2], time.perf_counter())
+
+    def enter_pool(self, gauge: PoolGauge) -> None:
+        if gauge.in_use >= gauge.size:
+            self.queued = time.perf_counter()
+        gauge.in_use += 1
+        self.gauge = gauge
+
+    def release(self) -> None:
+        if self.gauge is not None:
+            self.gauge.in_use -= 1
+            self.gauge = None
+
+    def pool_wait_ms(self, until: Optional[float] = None) -> Optional[float]:
+        """None outside a capped pool, 0 if a connection was free on entry,
+        else pool entry to connection acquired; `until` stands in for the
+        acquisition when the request never got a connection (PoolTimeout).
+        Call before release()."""
+        if self.gauge is None:
+            return None
+        if self.queued is None:
+            return 0.0
+        acquired = min(self.events.values()) if self.events else until
+        return None if acquired is None else max(0.0, (acquired - self.queued) * 1000.0)
+
+    def phases_ms(self, t0: float) -> Dict[str, float]:
+        """SingleResult connect_ms/tls_ms/write_ms durations and the ttfb_ms
+        offset from t0, for the phases this request went through."""
+        events = self.events
+        out: Dict[str, float] = {}
+        for field_name, start, end in (
+            ("connect_ms", "connect_tcp.started", "connect_tcp.complete"),
+            ("tls_ms", "start_tls.started", "start_tls.complete"),
+            ("write_ms", "send_request_headers.started", "send_request_body.complete"),
+        ):
+            if start in events and end in events:
+                out[field_name] = (events[end] - events[start]) * 1000.0
+        headers_at = events.get("receive_response_headers.complete")
+        if headers_at is not None:
+            out["ttfb_ms"] = (headers_at - t0) * 1000.0
+        return out
+
+
+def utf8_len(text: str) -> int:
+    return len(text) if text.isascii() else len(text.encode("utf-8", errors="ignore"))
+
+
 async def run_single_chat(
     client: httpx.AsyncClient,
     server: ServerSpec,
@@ -108,26 +1640,37 @@ async def run_single_chat(
     iteration: int,
     prompt_text: str,
     cfg: RequestConfig,
+    scheduled_at: Optional[float] = None,
+    messages: Optional[List[Dict[str, Any]]] = None,
+    session_id: Optional[str] = None,
+    reply: Optional[List[str]] = None,
 ) -> SingleResult:
-    url = server.endpoint()
+    """Send one chat request and time it.
 
-    payload: Dict[str, Any] = {
-        "model": server.model,
-        "messages": ([{"role": "system", "content": cfg.system_prompt}] if cfg.system_prompt else []) + [
+    When `scheduled_at` (a time.perf_counter() value) is given, TTFT and total
+    latency are measured from that instant rather than from the actual send,
+    so client-side lateness counts against the server like a real user sees.
+    `messages` replaces the system prompt + `prompt_text` pair, e.g. for
+    replayed traffic. `session_id` is sent for Osaurus KV-cache reuse, and
+    if `reply` is given the response content is appended to it.
+    """
+    adapter = PROTOCOL_ADAPTERS[server.protocol]
+    url = adapter.endpoint(server.base_url)
+
+    if messages is None:
+        messages = ([{"role": "system", "content": cfg.system_prompt}] if cfg.system_prompt else []) + [
             {"role": "user", "content": prompt_text},
-        ],
-        "temperature": cfg.temperature,
-        "max_tokens": cfg.max_tokens,
-        "stream": bool(cfg.stream),
-    }
+        ]
 
+    prompt_chars = len(message_text(messages))
+    payload = adapter.build_payload(server.model, messages, cfg, session_id)
     if cfg.extra_json:
         payload.update(cfg.extra_json)
 
     headers = {
         "Content-Type": "application/json",
-        # Prefer SSE for streaming; JSON otherwise
-        "Accept": "text/event-stream" if cfg.stream else "application/json",
+        # Prefer the protocol's stream type (SSE, NDJSON) for streaming; JSON otherwise
+        "Accept": adapter.stream_accept if cfg.stream else "application/json",
         # Most local servers do not require auth; support env var if provided
     }
     api_key = os.environ.get("OPENAI_API_KEY")
@@ -138,79 +1681,105 @@ async def run_single_chat(
     total_ms: Optional[float] = None
     output_chars: int = 0
     output_bytes: int = 0
+    wire_bytes: Optional[int] = None
     status_code: Optional[int] = None
+    send_lag_ms: Optional[float] = None
+    first_byte_at: Optional[float] = None
+    first_event_at: Optional[float] = None
+    chunk_times = array("d")
+    timing: Dict[str, Any] = {}
+    usage: Any = None
+    # Content is only kept when something needs it afterwards
+    content_parts: Optional[List[str]] = reply if reply is not None else ([] if cfg.tokenizer else None)
+
+    trace = ConnectionTrace()
+    extensions = {"trace": trace}
 
     t0 = time.perf_counter()
+    started_at = time.time()
+    if scheduled_at is not None:
+        send_lag_ms = max(0.0, (t0 - scheduled_at) * 1000.0)
+        started_at -= t0 - scheduled_at
+        t0 = scheduled_at
 
     try:
         if cfg.stream:
-            async with client.stream("POST", url, json=payload, headers=headers, timeout=cfg.timeout_seconds) as resp:
+            async with client.stream(
+                "POST", url, json=payload, headers=headers, timeout=cfg.timeout_seconds, extensions=extensions
+            ) as resp:
                 status_code = resp.status_code
-                # Iterate Server-Sent Events style lines
-                first_token_emitted = False
-                async for line in resp.aiter_lines():
-                    if not line:
+                # Parse events straight off the raw body; each event is
+                # timestamped when the bytes that completed it arrived
+                parser = StreamParser()
+                parse_event = adapter.parse_event
+                done = False
+                async for now, events in iter_stream_events(resp, parser):
+                    if done:
+                        # Read on to EOF after [DONE]: leaving the body unread
+                        # would close the connection instead of pooling it
                         continue
-                    if line.startswith("data: "):
-                        data = line[6:].strip()
-                    else:
-                        # Some servers may not prefix with 'data: '
-                        data = line.strip()
-
-                    if data == "[DONE]":
-                        break
+                    if first_event_at is None:
+                        if first_byte_at is None and parser.bytes_seen:
+                            first_byte_at = now
+                        if events:
+                            first_event_at = now
+                    for data in events:
+                        if data == b"[DONE]":
+                            done = True
+                            total_ms = (time.perf_counter() - t0) * 1000.0
+                            break
+                        chunk_text, chunk_usage = parse_event(data)
+                        if chunk_usage:
+                            usage = chunk_usage
+                        if chunk_text:
+                            chunk_times.append(now)
+                            if ttft_ms is None:
+                                ttft_ms = (now - t0) * 1000.0
+                            if content_parts is not None:
+                                content_parts.append(chunk_text)
+                            output_chars += len(chunk_text)
+                            output_bytes += utf8_len(chunk_text)
+                wire_bytes = parser.bytes_seen
 
-                    try:
-                        obj = json.loads(data)
-                    except json.JSONDecodeError:
-                        # Treat as raw content chunk
-                        chunk_text = data
-                    else:
-                        # OpenAI-style delta path
-                        choices = obj.get("choices") or []
-                        if choices:
-                            delta = choices[0].get("delta") or {}
-                            chunk_text = delta.get("content", "") or ""
-                        else:
-                            # Fallback if vendor uses non-standard field
-                            chunk_text = obj.get("content", "") or ""
-
-                    if chunk_text:
-                        if not first_token_emitted:
-                            ttft_ms = (time.perf_counter() - t0) * 1000.0
-                            first_token_emitted = True
-                        output_chars += len(chunk_text)
-                        output_bytes += len(chunk_text.encode("utf-8", errors="ignore"))
-
-                total_ms = (time.perf_counter() - t0) * 1000.0
+                if total_ms is None:
+                    total_ms = (time.perf_counter() - t0) * 1000.0
         else:
-            resp = await client.post(url, json=payload, headers=headers, timeout=cfg.timeout_seconds)
+            resp = await client.post(
+                url, json=payload, headers=headers, timeout=cfg.timeout_seconds, extensions=extensions
+            )
             status_code = resp.status_code
+            wire_bytes = len(resp.content)
             text = resp.text
             # Non-stream: TTFT ~ total
             total_ms = (time.perf_counter() - t0) * 1000.0
             ttft_ms = total_ms
             try:
                 data = resp.json()
-                if isinstance(data, dict):
-                    choices = data.get("choices") or []
-                    if choices:
-                        msg = choices[0].get("message") or {}
-                        content = msg.get("content", "") or ""
-                        output_chars = len(content)
-                        output_bytes = len(content.encode("utf-8", errors="ignore"))
-                    else:
-                        text = json.dumps(data)
-                        output_chars = len(text)
-                        output_bytes = len(text.encode("utf-8", errors="ignore"))
+                content, usage = adapter.parse_body(data)
+                if content is not None:
+                    if content_parts is not None:
+                        content_parts.append(content)
+                    output_chars = len(content)
+                    output_bytes = utf8_len(content)
                 else:
+                    if isinstance(data, dict):
+                        text = json.dumps(data)
                     output_chars = len(text)
-                    output_bytes = len(text.encode("utf-8", errors="ignore"))
+                    output_bytes = utf8_len(text)
             except Exception:
                 output_chars = len(text)
-                output_bytes = len(text.encode("utf-8", errors="ignore"))
+                output_bytes = utf8_len(text)
 
         success = status_code is not None and 200 <= status_code < 300
+        prompt_tokens, completion_tokens = adapter.usage_tokens(usage)
+        token_source = "usage" if completion_tokens is not None else None
+        if success and completion_tokens is None and cfg.tokenizer:
+            count = load_tokenizer(cfg.tokenizer)
+            prompt_tokens = count(message_text(messages))
+            completion_tokens = count("".join(content_parts))
+            token_source = "tokenizer"
+        if cfg.stream:
+            timing = chunk_timing(chunk_times, t0, ttft_ms, total_ms, cfg.record_chunk_times, completion_tokens)
         return SingleResult(
             server=server.name,
             model=server.model,
@@ -223,9 +1792,24 @@ async def run_single_chat(
             output_chars=output_chars,
             output_bytes=output_bytes,
             error=None,
+            send_lag_ms=send_lag_ms,
+            **timing,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            token_source=token_source,
+            wire_bytes=wire_bytes,
+            **adapter.server_timings(usage),
+            pool_wait_ms=trace.pool_wait_ms(),
+            **trace.phases_ms(t0),
+            first_byte_ms=None if first_byte_at is None else (first_byte_at - t0) * 1000.0,
+            first_event_ms=None if first_event_at is None else (first_event_at - t0) * 1000.0,
+            prompt_chars=prompt_chars,
+            max_tokens=cfg.max_tokens,
+            started_at=started_at,
         )
     except Exception as exc:  # pragma: no cover
         total_ms = (time.perf_counter() - t0) * 1000.0
+        pool_wait_ms = trace.pool_wait_ms(time.perf_counter() if isinstance(exc, httpx.PoolTimeout) else None)
         return SingleResult(
             server=server.name,
             model=server.model,
@@ -238,7 +1822,104 @@ async def run_single_chat(
             output_chars=output_chars,
             output_bytes=output_bytes,
             error=str(exc),
+            send_lag_ms=send_lag_ms,
+            wire_bytes=wire_bytes,
+            pool_wait_ms=pool_wait_ms,
+            **trace.phases_ms(t0),
+            prompt_chars=prompt_chars,
+            max_tokens=cfg.max_tokens,
+            started_at=started_at,
         )
+    finally:
+        # The connection went back to the pool when the response closed
+        trace.release()
+
+
+def in_shard(index: int, shard: Tuple[int, int]) -> bool:
+    """Round-robin ownership of the `index`-th work item by shard (i, n)."""
+    shard_index, shard_count = shard
+    return index % shard_count == shard_index
+
+
+def iter_work(
+    servers: List[ServerSpec],
+    prompts: List[str],
+    iterations: int,
+    shard: Tuple[int, int] = (0, 1),
+) -> Iterator[Tuple[ServerSpec, int, int, str]]:
+    """Lazily yield this shard's (server, prompt_id, iteration, prompt) items."""
+    n = 0
+    for srv in servers:
+        for pidx, prompt in enumerate(prompts):
+            for it in range(1, iterations + 1):
+                if in_shard(n, shard):
+                    yield srv, pidx, it, prompt
+                n += 1
+
+
+_STREAM_END = object()
+
+
+async def _stream_from(producer: Awaitable[None], out: asyncio.Queue) -> AsyncIterator[SingleResult]:
+    """Yield results that `producer` puts on `out` until it finishes.
+
+    Exceptions from the producer propagate to the consumer; abandoning the
+    iteration early cancels the producer and any requests it has in flight.
+    """
+
+    async def run() -> None:
+        try:
+            await producer
+        finally:
+            await out.put(_STREAM_END)
+
+    runner = asyncio.ensure_future(run())
+    try:
+        while True:
+            item = await out.get()
+            if item is _STREAM_END:
+                break
+            yield item
+        await runner
+    finally:
+        if not runner.done():
+            runner.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await runner
+
+
+async def iter_benchmark(
+    servers: List[ServerSpec],
+    prompts: List[str],
+    iterations: int,
+    concurrency: int,
+    cfg: RequestConfig,
+    load: Optional[LoadConfig] = None,
+    shard: Tuple[int, int] = (0, 1),
+) -> AsyncIterator[SingleResult]:
+    """Run the benchmark, yielding each result as soon as it completes.
+
+    Work items are pulled lazily, so memory stays proportional to the number
+    of requests in flight rather than to servers x prompts x iterations.
+    """
+    if load is not None and load.replay:
+        stream = iter_replay(servers, cfg, load, shard)
+    elif load is not None and load.length_sweep:
+        stream = iter_length_sweep(servers, iterations, concurrency, cfg, load, shard)
+    elif load is not None and load.prefix_cache_test:
+        stream = iter_prefix_cache(servers, prompts, iterations, concurrency, cfg, load, shard)
+    elif load is not None and load.conversation_turns > 0:
+        stream = iter_conversations(servers, prompts, iterations, concurrency, cfg, load, shard)
+    elif load is not None and load.profile:
+        stream = iter_profile(servers, prompts, cfg, load, shard)
+    elif load is not None and load.target_ci:
+        stream = iter_target_ci(servers, prompts, iterations, concurrency, cfg, load, shard)
+    elif load is not None and load.open_loop:
+        stream = iter_open_loop(servers, prompts, iterations, cfg, load, shard)
+    else:
+        stream = iter_closed_loop(servers, prompts, iterations, concurrency, cfg, shard)
+    async for res in stream:
+        yield res
 
 
 async def run_benchmark(
@@ -247,102 +1928,2051 @@ async def run_benchmark(
     iterations: int,
     concurrency: int,
     cfg: RequestConfig,
+    load: Optional[LoadConfig] = None,
+    shard: Tuple[int, int] = (0, 1),
 ) -> List[SingleResult]:
-    semaphore = asyncio.Semaphore(concurrency)
+    return [res async for res in iter_benchmark(servers, prompts, iterations, concurrency, cfg, load, shard)]
+
+
+async def iter_closed_loop(
+    servers: List[ServerSpec],
+    prompts: List[str],
+    iterations: int,
+    concurrency: int,
+    cfg: RequestConfig,
+    shard: Tuple[int, int] = (0, 1),
+) -> AsyncIterator[SingleResult]:
+    """Closed-loop run: `concurrency` workers share one lazy work iterator."""
+    work = iter_work(servers, prompts, iterations, shard)
+    out: asyncio.Queue = asyncio.Queue(maxsize=max(1, concurrency))
+
+    async with make_client(cfg) as client:
+
+        async def worker() -> None:
+            # The event loop is single-threaded, so next() on the shared
+            # generator between awaits hands each item to exactly one worker.
+            for srv, pidx, it, prompt in work:
+                await out.put(await run_single_chat(client, srv, pidx, it, prompt, cfg))
+
+        workers = asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        async for res in _stream_from(workers, out):
+            yield res
+
+
+async def iter_target_ci(
+    servers: List[ServerSpec],
+    prompts: List[str],
+    iterations: int,
+    concurrency: int,
+    cfg: RequestConfig,
+    load: LoadConfig,
+    shard: Tuple[int, int] = (0, 1),
+) -> AsyncIterator[SingleResult]:
+    """Closed-loop run with adaptive iterations per (server, prompt) cell.
+
+    Workers take the open cell with the fewest requests sent, so cells advance
+    round-robin. A cell closes once it has `iterations` results and the median
+    of load.target_metric has a relative CI half-width within load.target_ci,
+    or when it reaches load.max_iterations; after load.time_budget seconds no
+    new requests start. Stable cells stop early and the rest of the budget
+    goes to the noisy ones. Shards own whole cells. Each cell's latest result
+    is held back until the next one arrives, so its last result can carry the
+    cell's stop_reason.
+    """
+    cells = [
+        (srv, pidx, prompt)
+        for n, (srv, (pidx, prompt)) in enumerate(itertools.product(servers, enumerate(prompts)))
+        if in_shard(n, shard)
+    ]
+    sent = [0] * len(cells)
+    done = [0] * len(cells)
+    samples: List[List[float]] = [[] for _ in cells]
+    open_cells = set(range(len(cells)))
+    converged: Set[int] = set()
+    held: List[Optional[SingleResult]] = [None] * len(cells)
+    deadline = time.monotonic() + load.time_budget if load.time_budget else math.inf
+    out: asyncio.Queue = asyncio.Queue(maxsize=max(1, concurrency))
+
+    def take() -> Optional[int]:
+        live = [c for c in open_cells if sent[c] < load.max_iterations]
+        if not live or time.monotonic() >= deadline:
+            return None
+        c = min(live, key=lambda c: (sent[c], c))
+        sent[c] += 1
+        return c
+
+    async with make_client(cfg) as client:
+
+        async def worker() -> None:
+            while True:
+                c = take()
+                if c is None:
+                    return
+                srv, pidx, prompt = cells[c]
+                res = await run_single_chat(client, srv, pidx, sent[c], prompt, cfg)
+                done[c] += 1
+                samples[c].extend(request_metrics([res])[load.target_metric])
+                if (
+                    done[c] >= iterations
+                    and len(samples[c]) >= TARGET_CI_MIN_SAMPLES
+                    and relative_half_width(samples[c]) <= load.target_ci
+                ):
+                    open_cells.discard(c)
+                    converged.add(c)
+                res, held[c] = held[c], res
+                if res is not None:
+                    await out.put(res)
+
+        async def run() -> None:
+            await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+            for c, res in enumerate(held):
+                if res is not None:
+                    if c in converged:
+                        res.stop_reason = "converged"
+                    else:
+                        res.stop_reason = "max-iterations" if sent[c] >= load.max_iterations else "time-budget"
+                    await out.put(res)
+
+        async for res in _stream_from(run(), out):
+            yield res
+
+
+async def iter_conversations(
+    servers: List[ServerSpec],
+    prompts: List[str],
+    conversations: int,
+    concurrency: int,
+    cfg: RequestConfig,
+    load: LoadConfig,
+    shard: Tuple[int, int] = (0, 1),
+) -> AsyncIterator[SingleResult]:
+    """Multi-turn workload: `conversations` virtual users per server.
+
+    Every conversation follows the same script (turn k asks prompts[k % P])
+    so turns are comparable across users; the history grows with the real
+    assistant replies. With session_mode "both" the conversation is held
+    once with a session_id and once without, the second pass re-sending the
+    first pass's recorded history turn by turn so both prefill identical
+    prompts. Odd virtual users run the session pass first and even ones the
+    no-session pass, so cold connections and server warm-up don't all land on
+    one side; conversation_pass records the order. A failed turn ends its
+    pass, as the next turn would carry a history without its reply; the
+    second pass stops where the first pass's recording does. Closed-loop:
+    up to `concurrency` conversations run at once, each turn after the last.
+    iteration is the virtual user's 1-based index.
+    """
+    turns = load.conversation_turns
+    both = load.session_mode == "both"
+    work = (
+        (srv, vu)
+        for n, (srv, vu) in enumerate((srv, vu) for srv in servers for vu in range(1, conversations + 1))
+        if in_shard(n, shard)
+    )
+    out: asyncio.Queue = asyncio.Queue(maxsize=max(1, concurrency))
+
+    async with make_client(cfg) as client:
+
+        async def converse(srv: ServerSpec, vu: int) -> None:
+            history: List[Dict[str, Any]] = (
+                [{"role": "system", "content": cfg.system_prompt}] if cfg.system_prompt else []
+            )
+            recorded: List[List[Dict[str, Any]]] = []  # messages sent per turn, for replay
+            if both:
+                modes = ["session", "none"] if vu % 2 else ["none", "session"]
+            else:
+                modes = [load.session_mode]
+            for pass_no, mode in enumerate(modes, 1):
+                session_id = f"bench-{srv.name}-{vu}-{uuid.uuid4().hex[:12]}" if mode == "session" else None
+                for turn in range(1, turns + 1):
+                    pidx = (turn - 1) % len(prompts)
+                    if len(recorded) < turn:
+                        if pass_no > 1:
+                            break
+                        messages = history + [{"role": "user", "content": prompts[pidx]}]
+                        recorded.append(messages)
+                        reply: Optional[List[str]] = []
+                    else:
+                        messages = recorded[turn - 1]
+                        reply = None
+                    res = await run_single_chat(
+                        client, srv, pidx, vu, prompts[pidx], cfg,
+                        messages=messages, session_id=session_id, reply=reply,
+                    )
+                    res.turn = turn
+                    res.session_mode = mode
+                    res.conversation_pass = pass_no if both else None
+                    await out.put(res)
+                    if not res.success:
+                        break
+                    if reply is not None:
+                        history = messages + [{"role": "assistant", "content": "".join(reply)}]
+
+        async def worker() -> None:
+            for srv, vu in work:
+                await converse(srv, vu)
+
+        workers = asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        async for res in _stream_from(workers, out):
+            yield res
+
 
-    async with httpx.AsyncClient(http2=False) as client:
-        tasks: List[asyncio.Task[SingleResult]] = []
+async def iter_length_sweep(
+    servers: List[ServerSpec],
+    iterations: int,
+    concurrency: int,
+    cfg: RequestConfig,
+    load: LoadConfig,
+    shard: Tuple[int, int] = (0, 1),
+) -> AsyncIterator[SingleResult]:
+    """Prompt-length sweep: `iterations` synthetic prompts per length bucket.
 
-        async def bound_request(srv: ServerSpec, pidx: int, it: int, prompt: str) -> SingleResult:
-            async with semaphore:
-                return await run_single_chat(client, srv, pidx, it, prompt, cfg)
+    Every request gets different filler text (seeded by seed, bucket and
+    iteration) so a runtime's prefix cache can't shortcut the prefill, while
+    reruns with the same --seed send byte-identical prompts. prompt_id is the
+    bucket's index in the sweep.
+    """
+    base_seed = load.seed or 0
+    out: asyncio.Queue = asyncio.Queue(maxsize=max(1, concurrency))
 
+    def items() -> Iterator[Tuple[ServerSpec, int, int, int]]:
+        n = 0
         for srv in servers:
-            for pidx, prompt in enumerate(prompts):
+            for bidx, tokens in enumerate(load.length_sweep or []):
                 for it in range(1, iterations + 1):
-                    tasks.append(asyncio.create_task(bound_request(srv, pidx, it, prompt)))
+                    if in_shard(n, shard):
+                        yield srv, bidx, tokens, it
+                    n += 1
+
+    async with make_client(cfg) as client:
+        work = items()
+
+        async def worker() -> None:
+            for srv, bidx, tokens, it in work:
+                prompt = sweep_prompt(tokens, base_seed * 1_000_003 + tokens * 1009 + it)
+                res = await run_single_chat(client, srv, bidx, it, prompt, cfg)
+                res.length_bucket = tokens
+                res.prompt_tokens_est = tokens
+                await out.put(res)
+
+        workers = asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        async for res in _stream_from(workers, out):
+            yield res
+
+
+async def iter_prefix_cache(
+    servers: List[ServerSpec],
+    prompts: List[str],
+    iterations: int,
+    concurrency: int,
+    cfg: RequestConfig,
+    load: LoadConfig,
+    shard: Tuple[int, int] = (0, 1),
+) -> AsyncIterator[SingleResult]:
+    """Prefix-cache workload: identical vs cache-busted long system prompts.
+
+    The prefix is cfg.system_prompt, or `load.prefix_tokens` of seeded
+    synthetic text. Each iteration sends one "shared" request (prefix as-is)
+    and one "busted" request (a random nonce before the prefix, same length
+    otherwise); both get a unique user suffix, and their order alternates per
+    iteration so drift hits both variants equally. One untimed shared request
+    per server primes the cache first.
+    """
+    prefix = cfg.system_prompt or synthetic_text(load.prefix_tokens, load.seed or 0)
+    req_cfg = replace(cfg, system_prompt=None)
+    out: asyncio.Queue = asyncio.Queue(maxsize=max(1, concurrency))
+
+    def messages_for(variant: str, prompt: str) -> List[Dict[str, Any]]:
+        nonce = uuid.uuid4().hex
+        system = prefix if variant == "shared" else f"[{nonce}] {prefix}"
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": f"{prompt}\n\n(ref {nonce[:8]})"},
+        ]
+
+    def items() -> Iterator[Tuple[ServerSpec, int, int, str]]:
+        n = 0
+        for srv in servers:
+            for it in range(1, iterations + 1):
+                order = PREFIX_VARIANTS if it % 2 else tuple(reversed(PREFIX_VARIANTS))
+                for variant in order:
+                    if in_shard(n, shard):
+                        yield srv, (it - 1) % len(prompts), it, variant
+                    n += 1
+
+    async with make_client(cfg) as client:
+        primed: Set[str] = set()
+        work = items()
+
+        async def worker() -> None:
+            for srv, pidx, it, variant in work:
+                if srv.name not in primed:
+                    primed.add(srv.name)
+                    await run_single_chat(
+                        client, srv, pidx, 0, prompts[pidx], req_cfg, messages=messages_for("shared", prompts[pidx])
+                    )
+                res = await run_single_chat(
+                    client, srv, pidx, it, prompts[pidx], req_cfg, messages=messages_for(variant, prompts[pidx])
+                )
+                res.variant = variant
+                await out.put(res)
+
+        workers = asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        async for res in _stream_from(workers, out):
+            yield res
+
+
+async def iter_open_loop(
+    servers: List[ServerSpec],
+    prompts: List[str],
+    iterations: int,
+    cfg: RequestConfig,
+    load: LoadConfig,
+    shard: Tuple[int, int] = (0, 1),
+) -> AsyncIterator[SingleResult]:
+    """Open-loop run: each server gets its own arrival timeline at `load.rate`.
+
+    Servers are driven one after another (as the closed-loop mode does at low
+    concurrency) so co-located runtimes don't steal each other's GPU time.
+    Requests are fired at their scheduled instant with no in-flight cap; if a
+    server falls behind, the queueing shows up in TTFT/total latency.
+    """
+    shard_index, shard_count = shard
+    per_server = len(range(shard_index, iterations * len(prompts), shard_count))
+    out: asyncio.Queue = asyncio.Queue()
+
+    async with make_client(cfg) as client:
+
+        async def fire(srv: ServerSpec, pidx: int, it: int, prompt: str, scheduled_at: float) -> None:
+            await out.put(await run_single_chat(client, srv, pidx, it, prompt, cfg, scheduled_at))
+
+        async def dispatch() -> None:
+            in_flight: Set[asyncio.Task] = set()
+            for srv in servers:
+                work = (
+                    (pidx, it, prompt)
+                    for n, (it, (pidx, prompt)) in enumerate(
+                        itertools.product(range(1, iterations + 1), enumerate(prompts))
+                    )
+                    if in_shard(n, shard)
+                )
+                offsets = arrival_offsets(load.rate, load.arrival, per_server, load.burst_size, load.seed)
+                start = time.perf_counter()
+                for (pidx, it, prompt), offset in zip(work, offsets):
+                    scheduled_at = start + offset
+                    delay = scheduled_at - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    task = asyncio.ensure_future(fire(srv, pidx, it, prompt, scheduled_at))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                # Drain before the next server's timeline starts
+                if in_flight:
+                    await asyncio.gather(*in_flight)
+
+        async for res in _stream_from(dispatch(), out):
+            yield res
+
+
+async def iter_replay(
+    servers: List[ServerSpec],
+    cfg: RequestConfig,
+    load: LoadConfig,
+    shard: Tuple[int, int] = (0, 1),
+) -> AsyncIterator[SingleResult]:
+    """Replay `load.replay` against each server in turn on the trace's timeline.
+
+    Each record is sent at offset_s / replay_speedup after the server's start
+    with its own messages and settings; latency counts from that scheduled
+    instant. prompt_id is the record's index in the trace. A shard replays
+    every n-th record at the original offsets, so shards together reproduce
+    the full timeline.
+    """
+    records = load.replay or []
+    speedup = load.replay_speedup if load.replay_speedup > 0 else 1.0
+    out: asyncio.Queue = asyncio.Queue()
+
+    async with make_client(cfg) as client:
+
+        async def fire(srv: ServerSpec, idx: int, record: Dict[str, Any], scheduled_at: float) -> None:
+            rec_cfg = trace_request_config(cfg, record)
+            await out.put(
+                await run_single_chat(client, srv, idx, 1, "", rec_cfg, scheduled_at, messages=record["messages"])
+            )
+
+        async def dispatch() -> None:
+            in_flight: Set[asyncio.Task] = set()
+            for srv in servers:
+                start = time.perf_counter()
+                for idx, record in enumerate(records):
+                    if not in_shard(idx, shard):
+                        continue
+                    scheduled_at = start + float(record.get("offset_s", 0.0)) / speedup
+                    delay = scheduled_at - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    task = asyncio.ensure_future(fire(srv, idx, record, scheduled_at))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                if in_flight:
+                    await asyncio.gather(*in_flight)
+
+        async for res in _stream_from(dispatch(), out):
+            yield res
+
+
+async def iter_profile(
+    servers: List[ServerSpec],
+    prompts: List[str],
+    cfg: RequestConfig,
+    load: LoadConfig,
+    shard: Tuple[int, int] = (0, 1),
+) -> AsyncIterator[SingleResult]:
+    """Time-based run following `load.profile`, one server after another.
+
+    Prompts are cycled until the profile ends; requests still in flight at
+    the end are allowed to finish. Profile levels are totals, so a shard
+    (i, n) drives its even share of the concurrency, or rate/n req/s.
+    Each result carries the phase and level current when it was sent.
+    """
+    phases = parse_profile(load.profile)
+    shard_index, shard_count = shard
+    out: asyncio.Queue = asyncio.Queue()
+
+    def shard_level(level: float) -> float:
+        if load.open_loop:
+            return level / shard_count
+        return float(split_evenly(int(level), shard_count)[shard_index])
+
+    async with make_client(cfg) as client:
+
+        async def run_tagged(
+            srv: ServerSpec, pidx: int, it: int, prompt: str, phase: ProfilePhase, level: float,
+            scheduled_at: Optional[float] = None,
+        ) -> None:
+            res = await run_single_chat(client, srv, pidx, it, prompt, cfg, scheduled_at)
+            res.phase = phase.name
+            res.load_level = level
+            await out.put(res)
+
+        async def drive(srv: ServerSpec) -> None:
+            # Per-prompt iteration counters; items are (prompt_id, iteration, prompt)
+            counters = [0] * len(prompts)
+            order = itertools.cycle(range(len(prompts)))
+
+            def next_item() -> Tuple[int, int, str]:
+                pidx = next(order)
+                counters[pidx] += 1
+                return pidx, counters[pidx], prompts[pidx]
+
+            start = time.perf_counter()
+
+            if load.open_loop:
+                rng = random.Random(load.seed)
+                in_flight: Set[asyncio.Task] = set()
+                t = 0.0
+                index = 0
+                while True:
+                    current = profile_level_at(phases, t)
+                    if current is None:
+                        break
+                    phase, level = current
+                    rate = shard_level(level)
+                    if rate <= 0:
+                        t += PROFILE_TICK_SECONDS
+                        continue
+                    scheduled_at = start + t
+                    delay = scheduled_at - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    pidx, it, prompt = next_item()
+                    task = asyncio.ensure_future(run_tagged(srv, pidx, it, prompt, phase, level, scheduled_at))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                    index += 1
+                    t += arrival_gap(rng, load.arrival, rate, load.burst_size, index)
+                if in_flight:
+                    await asyncio.gather(*in_flight)
+            else:
+                peak = int(max(shard_level(max(p.start_level, p.end_level)) for p in phases))
+
+                async def worker(slot: int) -> None:
+                    while True:
+                        current = profile_level_at(phases, time.perf_counter() - start)
+                        if current is None:
+                            return
+                        phase, level = current
+                        if slot >= int(shard_level(level)):
+                            await asyncio.sleep(PROFILE_TICK_SECONDS)
+                            continue
+                        pidx, it, prompt = next_item()
+                        await run_tagged(srv, pidx, it, prompt, phase, level)
+
+                await asyncio.gather(*(worker(slot) for slot in range(peak)))
+
+        async def drive_all() -> None:
+            for srv in servers:
+                await drive(srv)
+
+        async for res in _stream_from(drive_all(), out):
+            yield res
+
+
+def split_evenly(total: int, parts: int) -> List[int]:
+    base, extra = divmod(total, parts)
+    return [base + (1 if i < extra else 0) for i in range(parts)]
+
+
+# Workers ship results to the parent in batches of up to this many, or after
+# this many seconds, whichever comes first.
+SHARD_BATCH_SIZE = 64
+SHARD_BATCH_SECONDS = 0.5
+
+
+def _run_shard(
+    servers: List[ServerSpec],
+    prompts: List[str],
+    iterations: int,
+    concurrency: int,
+    cfg: RequestConfig,
+    load: Optional[LoadConfig],
+    shard: Tuple[int, int],
+    start_at: float,
+    out: Any,
+    tag: int,
+    ship_results: bool = True,
+    aggregator: Optional[ResultAggregator] = None,
+) -> None:
+    # Worker process entry point: wait for the common start instant so shards
+    # don't ramp up one by one as they spawn, then run a private loop. With
+    # `ship_results` batches of results go back through `out`, a
+    # multiprocessing.Queue; its put() only appends to a buffer that the
+    # queue's feeder thread pickles and writes to the pipe, so the loop never
+    # waits on the parent. With an (empty) `aggregator` the shard folds its
+    # results into it and returns it at the end. Every shard ends with a
+    # (tag, "done", (count, aggregator)) or (tag, "error", text). Ctrl-C is
+    # the parent's to handle; it terminates the workers.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    delay = start_at - time.time()
+    if delay > 0:
+        time.sleep(delay)
+
+    async def pump() -> int:
+        count = 0
+        batch: List[SingleResult] = []
+        last = time.monotonic()
+        async for res in iter_benchmark(servers, prompts, iterations, concurrency, cfg, load, shard):
+            count += 1
+            if aggregator is not None:
+                aggregator.add(res)
+            if not ship_results:
+                continue
+            batch.append(res)
+            if len(batch) >= SHARD_BATCH_SIZE or time.monotonic() - last >= SHARD_BATCH_SECONDS:
+                out.put((tag, "results", batch))
+                batch = []
+                last = time.monotonic()
+        if batch:
+            out.put((tag, "results", batch))
+        return count
+
+    try:
+        count = asyncio.run(pump())
+    except Exception as exc:
+        out.put((tag, "error", f"{type(exc).__name__}: {exc}"))
+    else:
+        out.put((tag, "done", (count, aggregator)))
+
+
+def iter_benchmark_sharded(
+    servers: List[ServerSpec],
+    prompts: List[str],
+    iterations: int,
+    concurrency: int,
+    cfg: RequestConfig,
+    load: Optional[LoadConfig],
+    workers: int,
+    shard: Tuple[int, int] = (0, 1),
+    start_at: Optional[float] = None,
+    ship_results: bool = True,
+    aggregator: Optional[ResultAggregator] = None,
+) -> Iterator[SingleResult]:
+    """Run the benchmark across `workers` processes, yielding merged results.
+
+    Closed-loop concurrency is divided between workers (never below one
+    in-flight request each, so workers are capped at `concurrency`). In
+    open-loop mode each worker gets rate/workers and its own seed. `shard`
+    lets an agent sub-divide the slice it was given by a coordinator;
+    `start_at` is the wall-clock instant all workers begin (default: +1s).
+    Results arrive in batches while the workers are still running, unless
+    `ship_results` is off. With an `aggregator` each worker aggregates its
+    own results and the parent merges the workers' aggregates into it as
+    they finish, so the summary never needs the results to cross processes.
+    """
+    open_loop = load is not None and load.open_loop
+    if not open_loop and not (load is not None and load.replay):
+        peak = int(profile_peak(load.profile)) if load is not None and load.profile else concurrency
+        workers = max(1, min(workers, peak))
+    shares = split_evenly(concurrency, workers)
+    if start_at is None:
+        start_at = time.time() + 1.0
+    base_index, base_count = shard
+
+    out = multiprocessing.Queue()
+    procs = []
+    for i in range(workers):
+        shard_load = load
+        if open_loop:
+            shard_load = replace(
+                load,
+                rate=load.rate / workers,
+                seed=None if load.seed is None else load.seed + i * base_count,
+            )
+        procs.append(
+            multiprocessing.Process(
+                target=_run_shard,
+                args=(
+                    servers, prompts, iterations, max(1, shares[i]), cfg, shard_load,
+                    (base_index + base_count * i, base_count * workers), start_at, out, i,
+                    ship_results, ResultAggregator(aggregator.keep_values) if aggregator is not None else None,
+                ),
+                daemon=True,
+            )
+        )
+    for proc in procs:
+        proc.start()
+
+    running = set(range(workers))
+    try:
+        while running:
+            # A worker that had already exited before this get() has flushed
+            # everything it sent, so an empty queue means it died mid-run
+            exited = {i for i in running if not procs[i].is_alive()}
+            try:
+                tag, kind, payload = out.get(timeout=0.1)
+            except queue.Empty:
+                if exited:
+                    i = min(exited)
+                    raise RuntimeError(f"worker {i} exited with code {procs[i].exitcode} before finishing") from None
+                continue
+            if kind == "results":
+                yield from payload
+            elif kind == "done":
+                running.discard(tag)
+                if aggregator is not None:
+                    aggregator.merge(payload[1])
+            else:
+                raise RuntimeError(f"worker {tag} failed: {payload}")
+    finally:
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+            proc.join()
+
+
+def run_benchmark_sharded(
+    servers: List[ServerSpec],
+    prompts: List[str],
+    iterations: int,
+    concurrency: int,
+    cfg: RequestConfig,
+    load: Optional[LoadConfig],
+    workers: int,
+    shard: Tuple[int, int] = (0, 1),
+    start_at: Optional[float] = None,
+) -> List[SingleResult]:
+    return list(iter_benchmark_sharded(servers, prompts, iterations, concurrency, cfg, load, workers, shard, start_at))
+
+
+# ---------------------------------------------------------------------------
+# Distributed load: a coordinator pushes one scenario to several agents over a
+# newline-delimited JSON protocol on plain TCP, aligns their clocks, starts
+# them at the same instant and merges their aggregates (see ResultAggregator),
+# plus the per-request results when it needs them. Every session
+# opens with a challenge-response on a shared secret (--token or
+# $BENCH_AGENT_TOKEN); the agent accepts nothing else until it succeeds.
+#
+#   agent -> coordinator  {"type": "challenge", "nonce": <hex>}
+#   coordinator -> agent  {"type": "hello", "mac": HMAC-SHA256(token, nonce)}
+#   agent -> coordinator  {"type": "welcome"} | {"type": "error", "error": "..."} (then closes)
+#   coordinator -> agent  {"type": "ping", "t": ...}         (clock sync, xN)
+#   agent -> coordinator  {"type": "pong", "t": ..., "agent_time": ...}
+#   coordinator -> agent  {"type": "run", <scenario>, "shard": [i, n], "start_at": <agent clock>,
+#                          "results": <bool>, "keep_values": <bool>}
+#   agent -> coordinator  {"type": "result", "result": {...}}  (one per request, as completed, if "results")
+#   agent -> coordinator  {"type": "done", "count": n, "aggregate": {...}} | {"type": "error", "error": "..."}
+# ---------------------------------------------------------------------------
+
+AGENT_DEFAULT_PORT = 8765
+AGENT_STREAM_LIMIT = 64 * 1024 * 1024
+AGENT_TOKEN_ENV = "BENCH_AGENT_TOKEN"
+CLOCK_SYNC_ROUNDS = 8
+
+
+class AgentError(RuntimeError):
+    pass
+
+
+def parse_hostport(arg: str) -> Tuple[str, int]:
+    host, sep, port = arg.strip().rpartition(":")
+    if not sep or not host or not port.isdigit():
+        raise argparse.ArgumentTypeError(f"expected host:port, got {arg!r}")
+    return host, int(port)
+
+
+async def _send_msg(writer: asyncio.StreamWriter, msg: Dict[str, Any]) -> None:
+    writer.write(json.dumps(msg).encode("utf-8") + b"\n")
+    await writer.drain()
+
+
+async def _recv_msg(reader: asyncio.StreamReader) -> Dict[str, Any]:
+    line = await reader.readline()
+    if not line:
+        raise AgentError("connection closed by peer")
+    return json.loads(line)
+
+
+def agent_mac(token: str, nonce: str) -> str:
+    return hmac.new(token.encode("utf-8"), nonce.encode("ascii"), hashlib.sha256).hexdigest()
+
+
+async def authenticate(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, token: str) -> None:
+    """Coordinator side of the handshake: answer the agent's challenge."""
+    msg = await _recv_msg(reader)
+    if msg.get("type") != "challenge":
+        raise AgentError(f"expected an auth challenge, got {msg.get('type')!r}")
+    await _send_msg(writer, {"type": "hello", "mac": agent_mac(token, str(msg.get("nonce", "")))})
+    reply = await _recv_msg(reader)
+    if reply.get("type") != "welcome":
+        raise AgentError(reply.get("error") or "authentication failed")
+
+
+def scenario_to_msg(
+    servers: List[ServerSpec],
+    prompts: List[str],
+    iterations: int,
+    concurrency: int,
+    cfg: RequestConfig,
+    load: Optional[LoadConfig],
+) -> Dict[str, Any]:
+    return {
+        "servers": [asdict(s) for s in servers],
+        "prompts": prompts,
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "cfg": asdict(cfg),
+        "load": asdict(load) if load is not None else None,
+    }
+
+
+def scenario_from_msg(msg: Dict[str, Any]) -> Tuple[List[ServerSpec], List[str], int, int, RequestConfig, Optional[LoadConfig]]:
+    return (
+        [ServerSpec(**s) for s in msg["servers"]],
+        list(msg["prompts"]),
+        int(msg["iterations"]),
+        int(msg["concurrency"]),
+        RequestConfig(**msg["cfg"]),
+        LoadConfig(**msg["load"]) if msg.get("load") else None,
+    )
+
+
+async def _agent_run(
+    msg: Dict[str, Any], workers: int, aggregator: ResultAggregator, tokenizer: Optional[str] = None
+) -> AsyncIterator[SingleResult]:
+    # Runs a pushed scenario, folding every result into `aggregator` and
+    # yielding the results themselves only if the coordinator asked for them
+    servers, prompts, iterations, concurrency, cfg, load = scenario_from_msg(msg)
+    # Never trust a tokenizer from the wire; only the agent's own --tokenizer
+    cfg = replace(cfg, tokenizer=tokenizer)
+    shard = (int(msg["shard"][0]), int(msg["shard"][1]))
+    start_at = float(msg["start_at"])
+    ship = bool(msg.get("results", True))
+    if workers > 1:
+        # Bridge the blocking sharded iterator onto this loop via a thread
+        loop = asyncio.get_running_loop()
+        out: asyncio.Queue = asyncio.Queue()
+
+        def pump() -> None:
+            try:
+                for res in iter_benchmark_sharded(
+                    servers, prompts, iterations, concurrency, cfg, load, workers, shard, start_at, ship, aggregator
+                ):
+                    loop.call_soon_threadsafe(out.put_nowait, res)
+            finally:
+                loop.call_soon_threadsafe(out.put_nowait, _STREAM_END)
+
+        done = loop.run_in_executor(None, pump)
+        while True:
+            item = await out.get()
+            if item is _STREAM_END:
+                break
+            yield item
+        await done
+        return
+    delay = start_at - time.time()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    async for res in iter_benchmark(servers, prompts, iterations, concurrency, cfg, load, shard):
+        aggregator.add(res)
+        if ship:
+            yield res
+
+
+async def serve_agent(
+    host: str,
+    port: int,
+    token: str,
+    workers: int = 1,
+    once: bool = False,
+    tokenizer: Optional[str] = None,
+) -> None:
+    """Serve coordinator sessions; each session may sync clocks and run scenarios.
+
+    A session must first prove it knows `token` (see authenticate()); peers
+    that fail are dropped before any scenario is read. `tokenizer` is the
+    agent's own vocab file; any tokenizer in a pushed scenario is ignored.
+    """
+    if not token:
+        raise ValueError("the agent needs a shared token")
+    finished = asyncio.Event()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info("peername")
+        authenticated = False
+        try:
+            nonce = secrets.token_hex(16)
+            await _send_msg(writer, {"type": "challenge", "nonce": nonce})
+            try:
+                hello = await _recv_msg(reader)
+            except (AgentError, ValueError):
+                return
+            if hello.get("type") != "hello" or not hmac.compare_digest(
+                str(hello.get("mac", "")), agent_mac(token, nonce)
+            ):
+                print(f"[agent] rejected {peer}: authentication failed", file=sys.stderr)
+                await _send_msg(writer, {"type": "error", "error": "authentication failed"})
+                return
+            await _send_msg(writer, {"type": "welcome"})
+            authenticated = True
+            while True:
+                try:
+                    msg = await _recv_msg(reader)
+                except AgentError:
+                    break
+                kind = msg.get("type")
+                if kind == "ping":
+                    await _send_msg(writer, {"type": "pong", "t": msg.get("t"), "agent_time": time.time()})
+                elif kind == "run":
+                    print(f"[agent] running shard {msg['shard'][0]}/{msg['shard'][1]} for {peer}", file=sys.stderr)
+                    aggregator = ResultAggregator(keep_values=bool(msg.get("keep_values")))
+                    try:
+                        async for r in _agent_run(msg, workers, aggregator, tokenizer):
+                            await _send_msg(writer, {"type": "result", "result": asdict(r)})
+                    except (ConnectionError, asyncio.IncompleteReadError):
+                        raise
+                    except Exception as exc:
+                        await _send_msg(writer, {"type": "error", "error": f"{type(exc).__name__}: {exc}"})
+                        continue
+                    await _send_msg(writer, {"type": "done", "count": aggregator.count, "aggregate": aggregator.to_dict()})
+                else:
+                    await _send_msg(writer, {"type": "error", "error": f"unknown message type: {kind!r}"})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            # Only a real coordinator session ends a --once agent
+            if once and authenticated:
+                finished.set()
+
+    server = await asyncio.start_server(handle, host, port, limit=AGENT_STREAM_LIMIT)
+    bound = server.sockets[0].getsockname()[1]  # the real port when `port` is 0
+    print(f"[agent] listening on {host}:{bound}", file=sys.stderr, flush=True)
+    async with server:
+        if once:
+            await finished.wait()
+        else:
+            await server.serve_forever()
+
+
+async def sync_clock(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, rounds: int = CLOCK_SYNC_ROUNDS) -> float:
+    """Estimate agent_clock - local_clock (seconds) from the min-RTT ping."""
+    best_rtt = float("inf")
+    offset = 0.0
+    for _ in range(rounds):
+        t_send = time.time()
+        await _send_msg(writer, {"type": "ping", "t": t_send})
+        msg = await _recv_msg(reader)
+        t_recv = time.time()
+        if msg.get("type") != "pong":
+            raise AgentError(f"unexpected reply during clock sync: {msg.get('type')!r}")
+        rtt = t_recv - t_send
+        if rtt < best_rtt:
+            best_rtt = rtt
+            offset = float(msg["agent_time"]) - (t_send + t_recv) / 2.0
+    return offset
+
+
+async def coordinate(
+    agents: List[Tuple[str, int]],
+    servers: List[ServerSpec],
+    prompts: List[str],
+    iterations: int,
+    concurrency: int,
+    cfg: RequestConfig,
+    load: Optional[LoadConfig],
+    start_delay: float = 2.0,
+    warmup_iterations: int = 0,
+    on_result: Optional[Callable[[SingleResult], None]] = None,
+    token: str = "",
+    aggregator: Optional[ResultAggregator] = None,
+) -> List[SingleResult]:
+    """Run one scenario across `agents` and return the merged results.
+
+    `token` is the agents' shared secret, proven on connect.
+    The task matrix is sharded round-robin across agents; closed-loop
+    concurrency and open-loop rate are totals divided evenly between them.
+    An optional closed-loop warm-up round runs first on the same connections
+    and its results are discarded. With `on_result`, measured results are
+    handed to it as they arrive instead of being returned. With an
+    `aggregator`, each agent's aggregate is merged into it, with its clock
+    offset taken out; agents then send individual results only for
+    `on_result`, and nothing is returned.
+    """
+    n = len(agents)
+    if n == 0:
+        raise AgentError("no agents given")
+    open_loop = load is not None and load.open_loop
+    peak = int(profile_peak(load.profile)) if load is not None and load.profile else concurrency
+    if not open_loop and not (load is not None and load.replay) and peak < n:
+        raise AgentError(f"concurrency ({peak}) must be >= number of agents ({n})")
+    shares = split_evenly(concurrency, n)
+
+    async def run_round(
+        conns: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]],
+        round_iterations: int,
+        round_load: Optional[LoadConfig],
+        emit: Optional[Callable[[SingleResult], None]] = None,
+        merge_into: Optional[ResultAggregator] = None,
+    ) -> Tuple[List[float], List[int]]:
+        base = scenario_to_msg(servers, prompts, round_iterations, concurrency, cfg, round_load)
+        base["results"] = emit is not None
+        base["keep_values"] = merge_into is not None and merge_into.keep_values
+        offsets = [await sync_clock(reader, writer) for reader, writer in conns]
+        start_at = time.time() + start_delay
+
+        for i, (_, writer) in enumerate(conns):
+            msg = dict(base, type="run", shard=[i, n], start_at=start_at + offsets[i], concurrency=max(1, shares[i]))
+            if round_load is not None and round_load.open_loop:
+                msg["load"] = asdict(
+                    replace(
+                        round_load,
+                        rate=round_load.rate / n,
+                        seed=None if round_load.seed is None else round_load.seed + i,
+                    )
+                )
+            await _send_msg(writer, msg)
+
+        async def collect(idx: int, reader: asyncio.StreamReader) -> int:
+            host, port = agents[idx]
+            while True:
+                msg = await _recv_msg(reader)
+                kind = msg.get("type")
+                if kind == "result":
+                    if emit is not None:
+                        res = SingleResult(**msg["result"])
+                        if res.started_at is not None:
+                            res.started_at -= offsets[idx]  # agent clock -> coordinator clock
+                        emit(res)
+                elif kind == "done":
+                    if merge_into is not None:
+                        part = ResultAggregator.from_dict(msg["aggregate"])
+                        part.shift_clock(-offsets[idx])  # agent clock -> coordinator clock
+                        merge_into.merge(part)
+                    return int(msg["count"])
+                elif kind == "error":
+                    raise AgentError(f"agent {host}:{port} failed: {msg.get('error')}")
+
+        per_agent = await asyncio.gather(*(collect(i, r) for i, (r, _) in enumerate(conns)))
+        return offsets, list(per_agent)
+
+    results: List[SingleResult] = []
+
+    conns: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+    try:
+        for host, port in agents:
+            try:
+                reader, writer = await asyncio.open_connection(host, port, limit=AGENT_STREAM_LIMIT)
+            except OSError as exc:
+                raise AgentError(f"cannot reach agent {host}:{port}: {exc}") from exc
+            conns.append((reader, writer))
+            try:
+                await authenticate(reader, writer, token)
+            except AgentError as exc:
+                raise AgentError(f"agent {host}:{port}: {exc}") from exc
+
+        if warmup_iterations > 0:
+            await run_round(conns, warmup_iterations, None)
+        emit = on_result if on_result is not None or aggregator is not None else results.append
+        offsets, per_agent = await run_round(conns, iterations, load, emit, aggregator)
+    finally:
+        for _, writer in conns:
+            writer.close()
+
+    for (host, port), offset, count in zip(agents, offsets, per_agent):
+        print(f"  agent {host}:{port}: {count} result(s), clock offset {offset * 1000.0:+.1f}ms")
+    return results
+
+
+def run_load_level(
+    servers: List[ServerSpec],
+    prompts: List[str],
+    iterations: int,
+    concurrency: int,
+    cfg: RequestConfig,
+    load: Optional[LoadConfig],
+    workers: int = 1,
+) -> List[SingleResult]:
+    """Blocking entry point: in-process run, or sharded when workers > 1."""
+    results: List[SingleResult] = []
+    stream_load_level(servers, prompts, iterations, concurrency, cfg, load, results.append, workers)
+    return results
+
+
+def stream_load_level(
+    servers: List[ServerSpec],
+    prompts: List[str],
+    iterations: int,
+    concurrency: int,
+    cfg: RequestConfig,
+    load: Optional[LoadConfig],
+    on_result: Optional[Callable[[SingleResult], None]],
+    workers: int = 1,
+    aggregator: Optional[ResultAggregator] = None,
+) -> None:
+    """Like run_load_level, but hands each result to `on_result` as it
+    completes and/or folds it into `aggregator`. With workers > 1 the workers
+    aggregate their own results (see iter_benchmark_sharded()), and results
+    only cross the process boundary when there is an `on_result`."""
+    if workers > 1:
+        for res in iter_benchmark_sharded(
+            servers, prompts, iterations, concurrency, cfg, load, workers,
+            ship_results=on_result is not None, aggregator=aggregator,
+        ):
+            on_result(res)
+        return
+
+    async def consume() -> None:
+        async for res in iter_benchmark(servers, prompts, iterations, concurrency, cfg, load):
+            if aggregator is not None:
+                aggregator.add(res)
+            if on_result is not None:
+                on_result(res)
+
+    asyncio.run(consume())
+
+
+def find_capacity(
+    server: ServerSpec,
+    prompts: List[str],
+    iterations: int,
+    cfg: RequestConfig,
+    load: LoadConfig,
+    search: CapacitySearch,
+    workers: int = 1,
+) -> Dict[str, Any]:
+    """Search the largest load level for `server` that still meets the SLO.
+
+    binary: double from `start` until a level fails (or `max_level`), then
+            bisect between the last passing and first failing level.
+    step:   add `step` per level until a level fails or `max_level`.
+
+    Each level measures at least CAPACITY_MIN_SAMPLES requests after a
+    discarded warm-up (see CAPACITY_WARMUP_SECONDS). Every level tested is
+    kept in `curve`, sorted by load. `knee` is the
+    highest passing level (None if even `start` fails); `max_goodput` is the
+    level with the most SLO-meeting completions per second.
+    """
+    by_rate = search.by == "rate"
+    tested: Dict[float, Dict[str, Any]] = {}
+
+    def probe(level: float) -> bool:
+        if level in tested:
+            return tested[level]["passed"]
+        if by_rate:
+            wanted = level * CAPACITY_SECONDS_PER_RATE_LEVEL
+            warmup = math.ceil(level * CAPACITY_WARMUP_SECONDS)
+            level_load = replace(load, rate=level, profile=None)
+            concurrency = 1
+        else:
+            wanted = level * CAPACITY_REQUESTS_PER_SLOT
+            warmup = int(level)
+            level_load = None
+            concurrency = int(level)
+        wanted = max(wanted, CAPACITY_MIN_SAMPLES) + warmup
+        level_iterations = max(iterations, math.ceil(wanted / max(1, len(prompts))))
+
+        results = run_load_level([server], prompts, level_iterations, concurrency, cfg, level_load, workers)
+        # Drop the warm-up: the earliest-started requests, which paid for the
+        # level's cold connections
+        results.sort(key=lambda r: r.started_at if r.started_at is not None else math.inf)
+        results = results[warmup:]
+        # Rates over the requests' own span, not the call: with --workers the
+        # call also covers process spawn and the synchronized-start delay
+        wall_s = measured_window(results)
+
+        stats = aggregate(results).get((server.name, server.model))
+        passed = stats is not None and search.level_passes(stats)
+        good = sum(1 for r in results if search.request_meets_slo(r))
+        ok = sum(1 for r in results if r.success)
+        tested[level] = {
+            search.by: level,
+            "runs": len(results),
+            "success_rate": stats["success_rate"] if stats else 0.0,
+            "ttft_ms_p50": stats["ttft_ms_p50"] if stats else float("nan"),
+            "ttft_ms_p95": stats["ttft_ms_p95"] if stats else float("nan"),
+            "total_ms_p50": stats["total_ms_p50"] if stats else float("nan"),
+            "total_ms_p95": stats["total_ms_p95"] if stats else float("nan"),
+            "throughput_rps": ok / wall_s if wall_s > 0 else float("nan"),
+            "goodput_rps": good / wall_s if wall_s > 0 else float("nan"),
+            "wall_s": wall_s,
+            "passed": passed,
+        }
+        print(
+            f"  {search.by}={level:g}: {'PASS' if passed else 'FAIL'}  "
+            f"success={tested[level]['success_rate']*100:.1f}%  "
+            f"ttft_p95={tested[level]['ttft_ms_p95']:.1f}ms  total_p95={tested[level]['total_ms_p95']:.1f}ms  "
+            f"goodput={tested[level]['goodput_rps']:.2f} req/s"
+        )
+        return passed
+
+    def next_level(level: float, factor: float = 1.0, add: float = 0.0) -> float:
+        nxt = level * factor + add
+        return min(nxt if by_rate else float(int(nxt)), search.max_level)
+
+    last_pass: Optional[float] = None
+    first_fail: Optional[float] = None
+    level = search.start if by_rate else float(max(1, int(search.start)))
+    step = search.step if search.step else level
+    while True:
+        if probe(level):
+            last_pass = level
+        else:
+            first_fail = level
+            break
+        if level >= search.max_level:
+            break
+        level = next_level(level, factor=2.0) if search.search == "binary" else next_level(level, add=step)
+
+    if search.search == "binary" and last_pass is not None and first_fail is not None:
+        lo, hi = last_pass, first_fail
+
+        def converged() -> bool:
+            # Rates bisect to a relative tolerance, concurrency to adjacent integers
+            if by_rate:
+                return (hi - lo) / hi <= CAPACITY_RATE_TOLERANCE
+            return hi - lo <= 1
+
+        while not converged():
+            mid = (lo + hi) / 2.0 if by_rate else float((int(lo) + int(hi)) // 2)
+            if probe(mid):
+                lo = mid
+            else:
+                hi = mid
+        last_pass = lo
+
+    curve = [tested[k] for k in sorted(tested)]
+    best = max(curve, key=lambda c: c["goodput_rps"] if not math.isnan(c["goodput_rps"]) else -1.0)
+    return {
+        "server": server.name,
+        "model": server.model,
+        "by": search.by,
+        "slo": {
+            "ttft_ms_p95": search.slo_ttft_p95_ms,
+            "total_ms_p95": search.slo_total_p95_ms,
+            "min_success_rate": search.min_success_rate,
+        },
+        "knee": last_pass,
+        "knee_stats": tested[last_pass] if last_pass is not None else None,
+        "max_goodput_rps": best["goodput_rps"],
+        "max_goodput_at": best[search.by],
+        "curve": curve,
+    }
+
+
+def export_capacity(path_prefix: str, reports: List[Dict[str, Any]]) -> str:
+    capacity_path = f"{path_prefix}.capacity.json"
+    with open(capacity_path, "w", encoding="utf-8") as f:
+        json.dump(reports, f, ensure_ascii=False, indent=2)
+    return capacity_path
+
+
+# Results are folded into a ResultAggregator in batches of this many, so its
+# sketches are fed through QuantileSketch.extend() rather than value by value
+AGGREGATE_BATCH = 64
+
+
+class GroupStats:
+    """Running statistics for one group of results; summary() reports them.
+
+    Every figure is kept as a count, a sum or a QuantileSketch, so memory
+    stays flat however many results are added, and two GroupStats (from
+    worker processes, agents or separate files) merge exactly. With
+    `keep_values` the COMPARED_METRICS samples themselves are kept as well,
+    for the confidence intervals and comparisons that need them.
+    """
+
+    __slots__ = ("runs", "ok", "sums", "sketches", "start", "end", "token_sources", "values")
+
+    def __init__(self, keep_values: bool = False) -> None:
+        self.runs = 0
+        self.ok = 0
+        self.sums: Dict[str, float] = {}
+        self.sketches: Dict[str, QuantileSketch] = {}
+        # Measured window: first request's start to last request's end
+        self.start = math.inf
+        self.end = -math.inf
+        self.token_sources: Set[str] = set()
+        self.values: Optional[Dict[str, "array[float]"]] = (
+            {name: array("d") for name in COMPARED_METRICS} if keep_values else None
+        )
+
+    def _sketch(self, name: str) -> QuantileSketch:
+        sketch = self.sketches.get(name)
+        if sketch is None:
+            sketch = self.sketches[name] = QuantileSketch()
+        return sketch
+
+    def _feed(self, name: str, values: List[float]) -> None:
+        if values:
+            self._sketch(name).extend(values)
+
+    def _add(self, name: str, value: float) -> None:
+        self.sums[name] = self.sums.get(name, 0.0) + value
 
-        results: List[SingleResult] = []
-        for coro in asyncio.as_completed(tasks):
-            res = await coro
-            results.append(res)
+    def extend(self, items: List[SingleResult]) -> None:
+        ok = [i for i in items if i.success]
+        self.runs += len(items)
+        self.ok += len(ok)
+        values = request_metrics(items)
+        for name, samples in values.items():
+            self._feed(name, samples)
+        if self.values is not None:
+            for name in COMPARED_METRICS:
+                self.values[name].extend(values[name])
 
-        return results
+        # itl_ms pools every chunk gap when chunk_times_ms were recorded,
+        # otherwise each request's mean gap weighted by its gap count
+        streamed = [i for i in ok if i.content_chunks]
+        gaps: List[float] = []
+        for i in ok:
+            if i.chunk_times_ms:
+                times = i.chunk_times_ms
+                gaps.extend(map(operator.sub, times[1:], times))
+            elif i.itl_ms_mean is not None and (i.content_chunks or 0) > 1:
+                self._sketch("itl_ms").add(i.itl_ms_mean, i.content_chunks - 1)
+        self._feed("itl_ms", gaps)
+        weighted = [(i.itl_ms_mean, i.content_chunks - 1) for i in streamed if i.itl_ms_mean is not None and i.content_chunks > 1]
+        self._add("itl_gap_ms", math.fsum(m * n for m, n in weighted))
+        self._add("itl_gaps", sum(n for _, n in weighted))
+        self._add("streamed", len(streamed))
+        self._add("chunk_timed", sum(1 for i in streamed if i.chunk_times_ms))
+        for name in ("itl_ms_p50", "itl_ms_p95", "itl_ms_p99"):
+            self._feed(f"request_{name}", [getattr(i, name) for i in streamed if getattr(i, name) is not None])
+        self._feed("tpot_ms", [i.tpot_ms for i in streamed if i.tpot_ms is not None])
+        self._feed("decode_ms", [i.decode_ms for i in streamed if i.decode_ms is not None])
+        self._feed("stall_ms", [i.itl_ms_max for i in streamed if i.itl_ms_max is not None])
 
+        self._feed("output_chars", [i.output_chars for i in ok])
+        self._feed("output_bytes", [i.output_bytes for i in ok])
+        counted = [i for i in ok if i.completion_tokens is not None and i.total_ms]
+        self._feed("completion_tokens", [i.completion_tokens for i in counted])
+        self.token_sources.update(i.token_source for i in counted if i.token_source)
+        prefilled = [i for i in ok if i.prompt_tokens and i.ttft_ms]
+        self._feed("prompt_tokens", [i.prompt_tokens for i in prefilled])
+        self._add("prefill_ttft_ms", math.fsum(i.ttft_ms for i in prefilled))
+        self._feed("prompt_chars", [i.prompt_chars for i in items if i.prompt_chars is not None])
+        self._feed("send_lag_ms", [i.send_lag_ms for i in items if i.send_lag_ms is not None])
+        self._feed("pool_wait_ms", [i.pool_wait_ms for i in items if i.pool_wait_ms is not None])
+        # Length sweeps: prefill rate, from measured prompt tokens when known
+        self._feed(
+            "prefill_tokens_per_sec",
+            [
+                (i.prompt_tokens or i.prompt_tokens_est) / (i.ttft_ms / 1000.0)
+                for i in ok
+                if i.length_bucket is not None and i.ttft_ms and (i.prompt_tokens or i.prompt_tokens_est)
+            ],
+        )
+
+        timed = [i for i in ok if i.server_prefill_ms is not None]
+        self._feed("server_prefill_ms", [i.server_prefill_ms for i in timed])
+        decoded = [i for i in timed if i.server_decode_ms and i.completion_tokens]
+        self._add("server_decode_tokens", sum(i.completion_tokens for i in decoded))
+        self._add("server_decode_ms", math.fsum(i.server_decode_ms for i in decoded))
+        self._feed(
+            "ttft_overhead_ms",
+            [
+                i.ttft_ms - i.server_prefill_ms - (i.server_load_ms or 0.0)
+                for i in timed
+                if i.ttft_ms is not None and i.content_chunks
+            ],
+        )
+        for name in CONNECTION_PHASES:
+            self._feed(name, [getattr(i, name) for i in ok if getattr(i, name) is not None])
+        self._feed(
+            "first_token_after_event_ms",
+            [i.ttft_ms - i.first_event_ms for i in ok if i.ttft_ms is not None and i.first_event_ms is not None],
+        )
+
+        spans = [
+            (i.started_at, i.started_at + i.total_ms / 1000.0)
+            for i in items
+            if i.started_at is not None and i.total_ms is not None
+        ]
+        if spans:
+            self.start = min(self.start, min(start for start, _ in spans))
+            self.end = max(self.end, max(end for _, end in spans))
+
+    def merge(self, other: "GroupStats") -> "GroupStats":
+        self.runs += other.runs
+        self.ok += other.ok
+        for name, value in other.sums.items():
+            self._add(name, value)
+        for name, sketch in other.sketches.items():
+            self._sketch(name).merge(sketch)
+        self.start = min(self.start, other.start)
+        self.end = max(self.end, other.end)
+        self.token_sources |= other.token_sources
+        if self.values is not None:
+            if other.values is None:
+                # Part of the group came without samples: no honest CI for it
+                self.values = None
+            else:
+                for name in COMPARED_METRICS:
+                    self.values[name].extend(other.values[name])
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "ok": self.ok,
+            "sums": dict(self.sums),
+            "sketches": {name: sketch.to_dict() for name, sketch in self.sketches.items()},
+            "window": [self.start, self.end] if self.start <= self.end else None,
+            "token_sources": sorted(self.token_sources),
+            "values": {name: list(v) for name, v in self.values.items()} if self.values is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "GroupStats":
+        stats = cls(keep_values=data.get("values") is not None)
+        stats.runs = int(data["runs"])
+        stats.ok = int(data["ok"])
+        stats.sums = {name: float(value) for name, value in data["sums"].items()}
+        stats.sketches = {name: QuantileSketch.from_dict(sketch) for name, sketch in data["sketches"].items()}
+        if data.get("window"):
+            stats.start, stats.end = (float(v) for v in data["window"])
+        stats.token_sources = set(data.get("token_sources") or ())
+        if stats.values is not None:
+            for name in COMPARED_METRICS:
+                stats.values[name].extend(data["values"].get(name) or ())
+        return stats
+
+    def summary(self, percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, Any]:
+        """Summary statistics for the group.
+
+        Rates are reported three ways: per-request decode rate (prefill
+        excluded), per-request end-to-end rate, both averaged over requests,
+        and system throughput over the measured window. Averages are exact;
+        percentiles are read from the sketches, to within
+        SKETCH_RELATIVE_ACCURACY.
+        """
+        nan = float("nan")
+        empty = QuantileSketch()
+        sketch = lambda name: self.sketches.get(name, empty)  # noqa: E731
+        ttft, total = sketch("ttft_ms"), sketch("total_ms")
+        out_tps, decode_tps = sketch("output_tokens_per_sec"), sketch("decode_tokens_per_sec")
+        out_chars, completion, prompt_tokens = sketch("output_chars"), sketch("completion_tokens"), sketch("prompt_tokens")
+        pool_waits, tpots, decodes, stalls = sketch("pool_wait_ms"), sketch("tpot_ms"), sketch("decode_ms"), sketch("stall_ms")
+        window_s = self.end - self.start if self.start <= self.end else nan
+
+        return {
+            "runs": self.runs,
+            "success_rate": self.ok / max(1, self.runs),
+            "ttft_ms_avg": sketch_mean(ttft),
+            "ttft_ms_p50": ttft.quantile(0.5),
+            "ttft_ms_p95": ttft.quantile(0.95),
+            "total_ms_avg": sketch_mean(total),
+            "total_ms_p50": total.quantile(0.5),
+            "total_ms_p95": total.quantile(0.95),
+            "output_chars_avg": sketch_mean(out_chars),
+            "output_bytes_avg": sketch_mean(sketch("output_bytes")),
+            # Per-request end-to-end rates (output over total time), averaged
+            "chars_per_sec_avg": sketch_mean(sketch("chars_per_sec")),
+            "bytes_per_sec_avg": sketch_mean(sketch("bytes_per_sec")),
+            # Token throughput, from usage or the offline tokenizer. Output and
+            # decode rates are per request, then averaged: end-to-end is
+            # completion tokens over total time, decode is the tokens after the
+            # first over the time after TTFT. Prompt rate is prompt tokens over
+            # TTFT (prefill).
+            "completion_tokens_avg": sketch_mean(completion),
+            "prompt_tokens_avg": sketch_mean(prompt_tokens),
+            "prompt_chars_avg": sketch_mean(sketch("prompt_chars")),
+            "output_tokens_per_sec_avg": sketch_mean(out_tps),
+            "output_tokens_per_sec_p50": out_tps.quantile(0.5),
+            "decode_tokens_per_sec_avg": sketch_mean(decode_tps),
+            "decode_tokens_per_sec_p50": decode_tps.quantile(0.5),
+            "prompt_tokens_per_sec_avg": (
+                prompt_tokens.total / (self.sums["prefill_ttft_ms"] / 1000.0) if prompt_tokens.count else nan
+            ),
+            "token_source": "/".join(sorted(self.token_sources)) or None,
+            # System throughput: everything the server delivered over the wall-clock
+            # window from the first request's start to the last one's end, so
+            # concurrent streams add up. The capacity figure.
+            "window_s": window_s,
+            "system_output_tokens_per_sec": completion.total / window_s if completion.count and window_s > 0 else nan,
+            "system_chars_per_sec": out_chars.total / window_s if window_s > 0 else nan,
+            "system_requests_per_sec": self.ok / window_s if window_s > 0 else nan,
+            # Open-loop only: client lateness vs the arrival schedule
+            "send_lag_ms_p95": sketch("send_lag_ms").quantile(0.95),
+            # Client-side queueing for a pooled connection (part of TTFT/total)
+            "pool_wait_ms_p50": pool_waits.quantile(0.5),
+            "pool_wait_ms_p95": pool_waits.quantile(0.95),
+            "pool_wait_ms_max": pool_waits.max if pool_waits.count else nan,
+            # Streaming decode smoothness
+            **self._itl(),
+            "tpot_ms_avg": sketch_mean(tpots),
+            "tpot_ms_p50": tpots.quantile(0.5),
+            "tpot_ms_p95": tpots.quantile(0.95),
+            "decode_ms_avg": sketch_mean(decodes),
+            "decode_ms_p50": decodes.quantile(0.5),
+            "stall_ms_max": stalls.max if stalls.count else nan,
+            "stall_ms_p95": stalls.quantile(0.95),
+            **self._server_timings(),
+            **self._phases(),
+            "quantiles": sketch_quantiles(
+                {name: self.sketches[name] for name in SKETCH_METRICS if name in self.sketches}, percentiles
+            ),
+        }
+
+    def _itl(self) -> Dict[str, float]:
+        # Inter-token latency. The mean is exact (total gap time / gap count).
+        # Percentiles pool every gap when chunk_times_ms were recorded for all
+        # streamed requests; otherwise they fall back to the median of the
+        # per-request percentiles.
+        gaps = self.sums.get("itl_gaps", 0.0)
+        out = {"itl_ms_mean": self.sums["itl_gap_ms"] / gaps if gaps else float("nan")}
+        streamed = self.sums.get("streamed", 0.0)
+        pooled = streamed and self.sums.get("chunk_timed") == streamed
+        for name, p in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+            if pooled:
+                out[f"itl_ms_{name}"] = self.sketches["itl_ms"].quantile(p) if "itl_ms" in self.sketches else float("nan")
+            else:
+                per_request = self.sketches.get(f"request_itl_ms_{name}")
+                out[f"itl_ms_{name}"] = per_request.quantile(0.5) if per_request else float("nan")
+        return out
+
+    def _server_timings(self) -> Dict[str, float]:
+        # Server-reported prefill/decode (Ollama native) and what the client
+        # adds: ttft_overhead_ms_p50 is the median, over streamed requests, of
+        # TTFT minus the server's load and prefill time (queueing, HTTP,
+        # framing and parsing on our side).
+        prefill = self.sketches.get("server_prefill_ms")
+        if prefill is None:
+            return {}
+        decode_ms = self.sums.get("server_decode_ms", 0.0)
+        overhead = self.sketches.get("ttft_overhead_ms")
+        return {
+            "server_prefill_ms_p50": prefill.quantile(0.5),
+            "server_decode_tokens_per_sec_avg": (
+                self.sums["server_decode_tokens"] / (decode_ms / 1000.0) if decode_ms else float("nan")
+            ),
+            "ttft_overhead_ms_p50": overhead.quantile(0.5) if overhead else float("nan"),
+        }
+
+    def _phases(self) -> Dict[str, float]:
+        # Medians of the connection phases that make up TTFT. new_connections
+        # counts requests that opened a connection (connect_ms is only set for
+        # those). first_token_after_event_ms_p50 is TTFT minus the first stream
+        # event's arrival: on Osaurus, which writes the role chunk before
+        # generating, that is the model's share of TTFT.
+        connects = self.sketches.get("connect_ms")
+        out: Dict[str, float] = {"new_connections": connects.count if connects else 0}
+        for name in CONNECTION_PHASES + ("first_token_after_event_ms",):
+            sketch = self.sketches.get(name)
+            out[f"{name}_p50"] = sketch.quantile(0.5) if sketch else float("nan")
+        return out
+
+
+# Scenario dimensions that split one prompt's results into cells; a dimension
+# is part of a cell's label only when it is set on the result.
+CELL_DIMENSIONS = ("max_tokens", "phase", "variant", "session_mode", "turn", "length_bucket")
+# Above this many distinct prompt ids (e.g. a replayed trace, where every
+# record is its own prompt) a per-prompt breakdown is skipped.
+PROMPT_BREAKDOWN_MAX = 256
+
+
+def cell_key(r: SingleResult) -> Tuple[Any, ...]:
+    """`r`'s cell: its prompt id followed by its CELL_DIMENSIONS values."""
+    return (r.prompt_id,) + tuple(getattr(r, d) for d in CELL_DIMENSIONS)
+
+
+def cell_label(cell: Tuple[Any, ...]) -> str:
+    """e.g. "max_tokens=512,phase=1:hold" from the dimensions set in a cell_key()."""
+    return ",".join(f"{d}={v}" for d, v in zip(CELL_DIMENSIONS, cell[1:]) if v is not None)
 
-def aggregate(results: List[SingleResult]) -> Dict[Tuple[str, str], Dict[str, Any]]:
-    groups: Dict[Tuple[str, str], List[SingleResult]] = {}
+
+def merge_stats(parts: Iterable[GroupStats], keep_values: bool = False) -> GroupStats:
+    stats = GroupStats(keep_values)
+    for part in parts:
+        stats.merge(part)
+    return stats
+
+
+class ResultAggregator:
+    """Incremental, mergeable form of aggregate().
+
+    add() folds results in as they arrive, merge() combines the aggregators
+    of worker processes or agents (to_dict()/from_dict() carry them across),
+    and summary() reports what aggregate() does, without the results ever
+    being held together. Each result feeds one GroupStats, its cell_key();
+    the whole group and every breakdown (prompt, profile phase, conversation
+    turn, scenario variant, length bucket) are unions of cells, merged when
+    the summary is read. Once a group has more than PROMPT_BREAKDOWN_MAX
+    prompts its cells stop telling prompts apart. Only with `keep_values`
+    are the samples for confidence intervals and comparisons kept, and
+    memory then grows with the run.
+    """
+
+    def __init__(self, keep_values: bool = False) -> None:
+        self.keep_values = keep_values
+        self.count = 0
+        # (server, model) -> cell_key() -> stats, prompt id None once too many
+        self.groups: Dict[Tuple[str, str], Dict[Tuple[Any, ...], GroupStats]] = {}
+        # (server, model) -> session mode -> conversations that ran it first
+        self.first_pass: Dict[Tuple[str, str], Dict[str, int]] = {}
+        # (server, model) -> prompt id -> why --target-ci stopped sampling it
+        self.stop_reasons: Dict[Tuple[str, str], Dict[int, str]] = {}
+        self.many_prompts: Set[Tuple[str, str]] = set()
+        self._pending: List[SingleResult] = []
+
+    def add(self, result: SingleResult) -> None:
+        self._pending.append(result)
+        self.count += 1
+        if len(self._pending) >= AGGREGATE_BATCH:
+            self._flush()
+
+    def _flush(self) -> None:
+        batches: Dict[Tuple[str, str], Dict[Tuple[Any, ...], List[SingleResult]]] = {}
+        for r in self._pending:
+            key = (r.server, r.model)
+            cell = cell_key(r)
+            if key in self.many_prompts:
+                cell = (None,) + cell[1:]
+            batches.setdefault(key, {}).setdefault(cell, []).append(r)
+            if r.turn == 1 and r.conversation_pass == 1:
+                first = self.first_pass.setdefault(key, {})
+                first[r.session_mode] = first.get(r.session_mode, 0) + 1
+            if r.stop_reason is not None:
+                self.stop_reasons.setdefault(key, {})[r.prompt_id] = r.stop_reason
+        self._pending.clear()
+        for key, cells in batches.items():
+            group = self.groups.setdefault(key, {})
+            for cell, items in cells.items():
+                stats = group.get(cell)
+                if stats is None:
+                    stats = group[cell] = GroupStats(self.keep_values)
+                stats.extend(items)
+            self._cap_prompts(key)
+
+    def _cap_prompts(self, key: Tuple[str, str]) -> None:
+        group = self.groups[key]
+        prompts = {cell[0] for cell in group}
+        if key not in self.many_prompts and len(prompts) <= PROMPT_BREAKDOWN_MAX:
+            return
+        self.many_prompts.add(key)
+        if prompts != {None}:
+            cells: Dict[Tuple[Any, ...], GroupStats] = {}
+            for cell, stats in group.items():
+                merged = (None,) + cell[1:]
+                cells[merged] = cells[merged].merge(stats) if merged in cells else stats
+            self.groups[key] = cells
+
+    def merge(self, other: "ResultAggregator") -> "ResultAggregator":
+        self._flush()
+        other._flush()
+        self.count += other.count
+        for key, cells in other.groups.items():
+            group = self.groups.setdefault(key, {})
+            for cell, stats in cells.items():
+                if cell not in group:
+                    group[cell] = GroupStats(self.keep_values)
+                group[cell].merge(stats)
+            if key in other.many_prompts:
+                self.many_prompts.add(key)
+            self._cap_prompts(key)
+        for key, counts in other.first_pass.items():
+            first = self.first_pass.setdefault(key, {})
+            for mode, n in counts.items():
+                first[mode] = first.get(mode, 0) + n
+        for key, reasons in other.stop_reasons.items():
+            self.stop_reasons.setdefault(key, {}).update(reasons)
+        return self
+
+    def shift_clock(self, seconds: float) -> None:
+        """Move every measured window by `seconds`, e.g. an agent's clock offset."""
+        self._flush()
+        for cells in self.groups.values():
+            for stats in cells.values():
+                stats.start += seconds
+                stats.end += seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        self._flush()
+        return {
+            "keep_values": self.keep_values,
+            "count": self.count,
+            "groups": [
+                {
+                    "server": key[0],
+                    "model": key[1],
+                    "many_prompts": key in self.many_prompts,
+                    "first_pass": self.first_pass.get(key, {}),
+                    "stop_reasons": {str(pidx): reason for pidx, reason in self.stop_reasons.get(key, {}).items()},
+                    "cells": [[list(cell), stats.to_dict()] for cell, stats in cells.items()],
+                }
+                for key, cells in self.groups.items()
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ResultAggregator":
+        agg = cls(keep_values=bool(data.get("keep_values")))
+        agg.count = int(data.get("count", 0))
+        for group in data["groups"]:
+            key = (group["server"], group["model"])
+            agg.groups[key] = {tuple(cell): GroupStats.from_dict(stats) for cell, stats in group["cells"]}
+            if group.get("many_prompts"):
+                agg.many_prompts.add(key)
+            if group.get("first_pass"):
+                agg.first_pass[key] = {mode: int(n) for mode, n in group["first_pass"].items()}
+            if group.get("stop_reasons"):
+                agg.stop_reasons[key] = {int(pidx): reason for pidx, reason in group["stop_reasons"].items()}
+        return agg
+
+    def summary(
+        self,
+        percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+        resamples: int = BOOTSTRAP_RESAMPLES,
+        load: Optional[LoadConfig] = None,
+    ) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """Per-(server, model) summaries; see aggregate()."""
+        self._flush()
+        dims = {d: n for n, d in enumerate(CELL_DIMENSIONS, 1)}
+
+        def split(cells: Dict[Tuple[Any, ...], GroupStats], key: Callable[[Tuple[Any, ...]], Any]) -> Dict[Any, GroupStats]:
+            # Merge the cells by key(cell), leaving out cells it maps to None
+            parts: Dict[Any, List[GroupStats]] = {}
+            for cell, stats in cells.items():
+                k = key(cell)
+                if k is not None:
+                    parts.setdefault(k, []).append(stats)
+            return {k: merge_stats(group) for k, group in parts.items()}
+
+        summary: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        values: Dict[Tuple[str, str], Dict[str, "array[float]"]] = {}
+        for key, cells in self.groups.items():
+            total = merge_stats(cells.values(), self.keep_values)
+            stats = summary[key] = total.summary(percentiles)
+            stats["sketches"] = {name: total.sketches[name].to_dict() for name in SKETCH_METRICS if name in total.sketches}
+            if total.values is not None and resamples > 0:
+                values[key] = total.values
+                stats["ci"] = confidence_intervals(total.values, resamples)
+
+            prompts: Dict[int, GroupStats] = {}
+            if key not in self.many_prompts:
+                prompts = split(cells, lambda cell: cell[0])
+                by_prompt: Dict[int, Dict[str, GroupStats]] = {}
+                for cell, part in cells.items():
+                    by_prompt.setdefault(cell[0], {})[cell_label(cell)] = part
+                stats["prompts"] = summarize_prompts(prompts, by_prompt, percentiles)
+            # Time-based profiles: the same stats per phase, in profile order
+            phases = split(cells, lambda cell: cell[dims["phase"]])
+            if phases:
+                stats["phases"] = {
+                    name: phases[name].summary(percentiles) for name in sorted(phases, key=lambda n: int(n.split(":", 1)[0]))
+                }
+            turns = split(
+                cells,
+                lambda cell: (cell[dims["session_mode"]] or "session", cell[dims["turn"]]) if cell[dims["turn"]] is not None else None,
+            )
+            if turns:
+                stats["conversation"] = summarize_turns(turns, self.first_pass.get(key, {}), percentiles)
+            variants = split(cells, lambda cell: cell[dims["variant"]])
+            if any(v in PREFIX_VARIANTS for v in variants):
+                stats["prefix_cache"] = summarize_prefix_cache(variants, percentiles)
+            buckets = split(cells, lambda cell: cell[dims["length_bucket"]])
+            if buckets:
+                stats["length_sweep"] = summarize_length_sweep(buckets, percentiles)
+            if load is not None and load.target_ci and prompts:
+                stats["target_ci"] = summarize_target_ci(prompts, load, self.stop_reasons.get(key, {}))
+
+        if len(values) > 1:
+            for key, table in compare_groups(values, resamples).items():
+                summary[key]["comparisons"] = table
+        return summary
+
+
+def aggregate(
+    results: Iterable[SingleResult],
+    percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+    resamples: int = BOOTSTRAP_RESAMPLES,
+    load: Optional[LoadConfig] = None,
+) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """Per-(server, model) summaries.
+
+    Each group also carries its metric sketches (serialized) so summaries of
+    separate runs can be merged later (see merge_summaries()), confidence
+    intervals for its per-request metrics (`ci`) and, with several groups,
+    pairwise significance tests against the groups after it (`comparisons`).
+    `resamples` = 0 skips the intervals and tests. Per-prompt and per-cell
+    breakdowns are under `prompts` (see summarize_prompts()). Runs with a
+    `load` that sets target_ci also get per-prompt convergence (`target_ci`).
+    Runs that stream their results use a ResultAggregator directly.
+    """
+    aggregator = ResultAggregator(keep_values=resamples > 0)
     for r in results:
-        key = (r.server, r.model)
-        groups.setdefault(key, []).append(r)
-
-    summary: Dict[Tuple[str, str], Dict[str, Any]] = {}
-    for key, items in groups.items():
-        latencies = [i.total_ms for i in items if i.success and i.total_ms is not None]
-        ttfts = [i.ttft_ms for i in items if i.success and i.ttft_ms is not None]
-        out_chars = [i.output_chars for i in items if i.success]
-        out_bytes = [i.output_bytes for i in items if i.success]
-        success_rate = sum(1 for i in items if i.success) / max(1, len(items))
-
-        total_ms_avg = sum(latencies) / len(latencies) if latencies else float("nan")
-        ttft_ms_avg = sum(ttfts) / len(ttfts) if ttfts else float("nan")
-        chars_avg = sum(out_chars) / len(out_chars) if out_chars else float("nan")
-        bytes_avg = sum(out_bytes) / len(out_bytes) if out_bytes else float("nan")
-
-        summary[key] = {
-            "runs": len(items),
-            "success_rate": success_rate,
-            "ttft_ms_avg": ttft_ms_avg,
-            "ttft_ms_p50": percentile(ttfts, 0.5) if ttfts else float("nan"),
-            "ttft_ms_p95": percentile(ttfts, 0.95) if ttfts else float("nan"),
-            "total_ms_avg": total_ms_avg,
-            "total_ms_p50": percentile(latencies, 0.5) if latencies else float("nan"),
-            "total_ms_p95": percentile(latencies, 0.95) if latencies else float("nan"),
-            "output_chars_avg": chars_avg,
-            "output_bytes_avg": bytes_avg,
-            # Throughput estimates (average length divided by average latency)
-            "chars_per_sec_avg": (chars_avg / (total_ms_avg / 1000.0)) if latencies else float("nan"),
-            "bytes_per_sec_avg": (bytes_avg / (total_ms_avg / 1000.0)) if latencies else float("nan"),
+        aggregator.add(r)
+    return aggregator.summary(percentiles, resamples, load)
+
+
+def summarize_prompts(
+    prompts: Dict[int, GroupStats],
+    cells: Dict[int, Dict[str, GroupStats]],
+    percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+) -> Dict[str, Any]:
+    """Per-prompt summaries, each split into scenario cells (CELL_DIMENSIONS).
+
+    Every prompt's stats carry its input length (prompt_chars_avg, and
+    prompt_tokens_avg when tokens are counted). A prompt whose results span
+    more than one cell gets a `cells` table keyed by cell_label().
+    """
+    out: Dict[str, Any] = {}
+    for pidx in sorted(prompts):
+        stats = prompts[pidx].summary(percentiles)
+        split = cells.get(pidx, {})
+        if len(split) > 1:
+            stats["cells"] = {label: split[label].summary(percentiles) for label in sorted(split)}
+        out[str(pidx)] = stats
+    return out
+
+
+def sketch_mean(sketch: QuantileSketch) -> float:
+    """Exact mean of the values added to `sketch` (nan if none)."""
+    return sketch.total / sketch.count if sketch.count else float("nan")
+
+
+def measured_window(items: List[SingleResult]) -> float:
+    """Seconds from the first request's start to the last request's end."""
+    spans = [
+        (i.started_at, i.started_at + i.total_ms / 1000.0)
+        for i in items
+        if i.started_at is not None and i.total_ms is not None
+    ]
+    if not spans:
+        return float("nan")
+    return max(end for _, end in spans) - min(start for start, _ in spans)
+
+
+CONNECTION_PHASES = ("connect_ms", "tls_ms", "write_ms", "ttfb_ms", "first_byte_ms", "first_event_ms")
+
+
+class ResultSink:
+    """Append-only JSONL sink for SingleResult records (gzip if path ends in .gz).
+
+    Records are buffered and written out every `flush_every` results; the
+    file is fsync'ed at most every `fsync_interval_s` seconds and on close,
+    so a crash or Ctrl-C loses at most the last few seconds of results.
+    A non-empty existing file is refused unless `append` is set, so two runs
+    don't silently end up in one summary. Appending to an existing .gz adds a
+    new gzip member, which readers (including read_results) handle
+    transparently; `start_offset` is where this sink's records begin.
+    """
+
+    def __init__(
+        self, path: str, flush_every: int = 64, fsync_interval_s: float = 5.0, append: bool = False
+    ) -> None:
+        if not append and os.path.exists(path) and os.path.getsize(path) > 0:
+            raise FileExistsError(f"{path} already holds results; pass --append to add to it, or use a fresh path")
+        self.path = path
+        self.flush_every = max(1, flush_every)
+        self.fsync_interval_s = fsync_interval_s
+        self.count = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)) or ".", exist_ok=True)
+        self._raw = open(path, "ab")
+        self.start_offset = self._raw.tell()
+        self._gz = gzip.GzipFile(fileobj=self._raw, mode="ab") if path.endswith(".gz") else None
+        self._buf: List[bytes] = []
+        self._last_fsync = time.monotonic()
+
+    def write(self, result: SingleResult) -> None:
+        self._buf.append(json.dumps(asdict(result), ensure_ascii=False).encode("utf-8") + b"\n")
+        self.count += 1
+        if len(self._buf) >= self.flush_every:
+            self.flush()
+
+    def flush(self, fsync: bool = False) -> None:
+        if self._buf:
+            (self._gz or self._raw).write(b"".join(self._buf))
+            self._buf.clear()
+        if self._gz is not None:
+            self._gz.flush()
+        self._raw.flush()
+        now = time.monotonic()
+        if fsync or now - self._last_fsync >= self.fsync_interval_s:
+            os.fsync(self._raw.fileno())
+            self._last_fsync = now
+
+    def close(self) -> None:
+        if self._raw.closed:
+            return
+        self.flush(fsync=True)
+        if self._gz is not None:
+            self._gz.close()
+        self._raw.close()
+
+    def __enter__(self) -> "ResultSink":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def read_results(path: str, offset: int = 0) -> Iterator[SingleResult]:
+    """Read a ResultSink file back from byte `offset` (a sink's start_offset,
+    to skip what earlier runs appended); a torn final line (crash mid-write)
+    is skipped."""
+    known = {f.name for f in fields(SingleResult)}
+    raw = open(path, "rb")
+    raw.seek(offset)
+    stream = gzip.GzipFile(fileobj=raw, mode="rb") if path.endswith(".gz") else raw
+    with raw, io.TextIOWrapper(stream, encoding="utf-8") as f:
+        try:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    obj = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                yield SingleResult(**{k: v for k, v in obj.items() if k in known})
+        except EOFError:
+            # Truncated gzip stream: everything before the tear was yielded
+            return
+
+
+def summarize_turns(
+    turns: Dict[Tuple[str, int], GroupStats],
+    first_pass: Dict[str, int],
+    percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+) -> Dict[str, Any]:
+    """Per-turn stats for each session mode, plus the TTFT saved by sessions.
+
+    `ttft_saving_pct` per turn is 1 - p50(session) / p50(none) when both
+    modes ran; positive means the session_id made first tokens arrive sooner.
+    `first_pass` counts the conversations that ran each mode first.
+    """
+    by_mode: Dict[str, Dict[int, GroupStats]] = {}
+    for (mode, turn), stats in turns.items():
+        by_mode.setdefault(mode, {})[turn] = stats
+
+    out: Dict[str, Any] = {
+        mode: {str(turn): stats[turn].summary(percentiles) for turn in sorted(stats)} for mode, stats in by_mode.items()
+    }
+    if "session" in out and "none" in out:
+        saving: Dict[str, float] = {}
+        for turn, stats in out["session"].items():
+            base = out["none"].get(turn, {}).get("ttft_ms_p50", float("nan"))
+            saving[turn] = (1.0 - stats["ttft_ms_p50"] / base) * 100.0 if base and not math.isnan(base) else float("nan")
+        out["ttft_saving_pct"] = saving
+        out["first_pass"] = {mode: first_pass.get(mode, 0) for mode in ("session", "none")}
+    return out
+
+
+def summarize_prefix_cache(
+    variants: Dict[str, GroupStats], percentiles: Sequence[float] = DEFAULT_PERCENTILES
+) -> Dict[str, Any]:
+    """Shared vs busted prefix stats and the TTFT the shared prefix saves."""
+    out: Dict[str, Any] = {v: variants.get(v, GroupStats()).summary(percentiles) for v in PREFIX_VARIANTS}
+    shared, busted = out["shared"]["ttft_ms_p50"], out["busted"]["ttft_ms_p50"]
+    out["ttft_delta_ms_p50"] = busted - shared
+    out["ttft_saving_pct"] = (1.0 - shared / busted) * 100.0 if busted and not math.isnan(busted) else float("nan")
+    return out
+
+
+def summarize_length_sweep(
+    buckets: Dict[int, GroupStats], percentiles: Sequence[float] = DEFAULT_PERCENTILES
+) -> Dict[str, Any]:
+    """Per-length-bucket stats with prefill throughput (prompt tokens / TTFT).
+
+    Prefill rate is computed per request and then summarized, using the
+    measured prompt tokens when the server reported them (or --tokenizer
+    counted them) and the bucket's estimate otherwise. A bucket is flagged `cliff` when its
+    median prefill rate is under half of the best rate at a shorter length.
+    """
+    out: Dict[str, Any] = {}
+    best = 0.0
+    for tokens in sorted(buckets):
+        group = buckets[tokens]
+        stats = group.summary(percentiles)
+        rates = group.sketches.get("prefill_tokens_per_sec", QuantileSketch())
+        rate_p50 = rates.quantile(0.5)
+        stats["prefill_tokens_per_sec_p50"] = rate_p50
+        stats["prefill_tokens_per_sec_avg"] = sketch_mean(rates)
+        stats["cliff"] = bool(rates.count) and best > 0 and rate_p50 < 0.5 * best
+        if rates.count:
+            best = max(best, rate_p50)
+        out[str(tokens)] = stats
+    return out
+
+
+def summarize_target_ci(
+    prompts: Dict[int, GroupStats], load: LoadConfig, stop_reasons: Dict[int, str]
+) -> Dict[str, Any]:
+    """Per-prompt convergence of a --target-ci run.
+
+    Each cell reports its runs, the target metric's median and CI half-width
+    (as % of the median, from the metric's sketch) and why sampling stopped,
+    as iter_target_ci() recorded it in `stop_reasons`: "converged",
+    "max-iterations" or "time-budget", or "unfinished" if the run was cut
+    short before the cell closed.
+    """
+    out: Dict[str, Any] = {}
+    for pidx in sorted(prompts):
+        group = prompts[pidx]
+        samples = group.sketches.get(load.target_metric, QuantileSketch())
+        width = sketch_relative_half_width(samples)
+        out[str(pidx)] = {
+            "runs": group.runs,
+            "samples": samples.count,
+            "p50": samples.quantile(0.5),
+            "half_width_pct": width * 100.0,
+            "status": stop_reasons.get(pidx, "unfinished"),
         }
+    return {
+        "metric": load.target_metric,
+        "target_pct": load.target_ci * 100.0,
+        "converged": sum(1 for cell in out.values() if cell["status"] == "converged"),
+        "cells": out,
+    }
 
-    return summary
 
+class ResultExport:
+    """Writes the per-request exports (.results.json, .results.csv) record by
+    record as results arrive, so they never need the run in memory. The JSON
+    file is the same indented array json.dump() would write."""
+
+    def __init__(self, path_prefix: str, formats: Sequence[str]) -> None:
+        self._json = self._csv_file = None
+        self._csv: Optional[csv.DictWriter] = None
+        self._first = True
+        if formats:
+            os.makedirs(os.path.dirname(os.path.abspath(path_prefix)) or ".", exist_ok=True)
+        if "json" in formats:
+            self._json = open(f"{path_prefix}.results.json", "w", encoding="utf-8")
+            self._json.write("[")
+        if "csv" in formats:
+            self._csv_file = open(f"{path_prefix}.results.csv", "w", newline="", encoding="utf-8")
+            self._csv = csv.DictWriter(self._csv_file, fieldnames=[f.name for f in fields(SingleResult)])
+            self._csv.writeheader()
+
+    def write(self, result: SingleResult) -> None:
+        record = asdict(result)
+        if self._json is not None:
+            item = json.dumps(record, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+            self._json.write(("\n  " if self._first else ",\n  ") + item)
+            self._first = False
+        if self._csv is not None:
+            self._csv.writerow(record)
+
+    def close(self) -> None:
+        if self._json is not None and not self._json.closed:
+            self._json.write("]" if self._first else "\n]")
+            self._json.close()
+        if self._csv_file is not None:
+            self._csv_file.close()
+
+    def __enter__(self) -> "ResultExport":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
 
-def export_json(path_prefix: str, results: List[SingleResult], summary: Dict[Tuple[str, str], Dict[str, Any]]) -> str:
-    results_path = f"{path_prefix}.results.json"
-    summary_path = f"{path_prefix}.summary.json"
 
-    with open(results_path, "w", encoding="utf-8") as f:
-        json.dump([asdict(r) for r in results], f, ensure_ascii=False, indent=2)
+def export_summary(path_prefix: str, summary: Dict[Tuple[str, str], Dict[str, Any]]) -> str:
+    summary_path = f"{path_prefix}.summary.json"
     with open(summary_path, "w", encoding="utf-8") as f:
         # Convert tuple keys to strings
         friendly_summary = {f"{k[0]}|{k[1]}": v for k, v in summary.items()}
         json.dump(friendly_summary, f, ensure_ascii=False, indent=2)
-
     return summary_path
 
 
-def export_csv(path_prefix: str, results: List[SingleResult]) -> str:
-    csv_path = f"{path_prefix}.results.csv"
-    fieldnames = list(asdict(results[0]).keys()) if results else [
-        "server","model","prompt_id","iteration","success","status_code","ttft_ms","total_ms","output_chars","output_bytes","error"
+# Per-group columns of the .cells.csv pivot
+PIVOT_METRICS = (
+    "runs",
+    "success_rate",
+    "prompt_tokens_avg",
+    "ttft_ms_p50",
+    "ttft_ms_p95",
+    "total_ms_p50",
+    "total_ms_p95",
+    "output_tokens_per_sec_avg",
+    "decode_tokens_per_sec_avg",
+    "system_output_tokens_per_sec",
+)
+
+
+def export_pivot_csv(path_prefix: str, summary: Dict[Tuple[str, str], Dict[str, Any]]) -> Optional[str]:
+    """Write the per-prompt/per-cell breakdown as a pivot: one row per prompt
+    (cell empty) and per cell, one column per group x PIVOT_METRICS, so servers
+    can be compared prompt by prompt. Returns None when there is no breakdown."""
+    rows: Dict[Tuple[int, str], Dict[str, Any]] = {}
+    groups = [key for key, stats in summary.items() if stats.get("prompts")]
+    if not groups:
+        return None
+    for key in groups:
+        name = f"{key[0]}|{key[1]}"
+        for pidx, pstats in summary[key]["prompts"].items():
+            entries = [("", pstats)] + list((pstats.get("cells") or {}).items())
+            for label, stats in entries:
+                row = rows.setdefault((int(pidx), label), {"prompt_id": int(pidx), "cell": label})
+                if not math.isnan(stats["prompt_chars_avg"]):
+                    row.setdefault("prompt_chars_avg", round(stats["prompt_chars_avg"], 1))
+                for metric in PIVOT_METRICS:
+                    row[f"{name} {metric}"] = stats[metric]
+
+    pivot_path = f"{path_prefix}.cells.csv"
+    fieldnames = ["prompt_id", "cell", "prompt_chars_avg"] + [
+        f"{key[0]}|{key[1]} {metric}" for key in groups for metric in PIVOT_METRICS
     ]
-    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+    with open(pivot_path, "w", newline="", encoding="utf-8") as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
-        for r in results:
-            writer.writerow(asdict(r))
-    return csv_path
+        for _, row in sorted(rows.items()):
+            writer.writerow(row)
+    return pivot_path
 
 
-def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
-    parser = argparse.ArgumentParser(description="Benchmark OpenAI-compatible local LLM servers")
+def add_run_arguments(parser: argparse.ArgumentParser) -> None:
+    """Scenario/load options shared by the default run and `coordinate`."""
     parser.add_argument(
         "--server",
         action="append",
         type=parse_server_arg,
         required=True,
-        help="Server spec 'name|base_url|model'. Example: ollama|http://localhost:11434|llama3.1",
+        help="Server spec 'name|base_url|model[|proto=openai|completions|ollama|lmstudio]'. "
+        "Example: ollama|http://localhost:11434|llama3.1|proto=ollama. The default proto is openai "
+        "(/v1/chat/completions); ollama uses the native /api/chat NDJSON API (Ollama, and Osaurus's /api/chat)",
     )
     parser.add_argument(
         "--prompt",
@@ -361,11 +3991,185 @@ def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
         help="Path to a text file with one prompt per line.",
     )
     parser.add_argument("--iterations", type=int, default=3, help="Iterations per prompt per server")
-    parser.add_argument("--concurrency", type=int, default=2, help="Max concurrent requests")
+    parser.add_argument("--concurrency", type=int, default=2, help="Max concurrent requests (closed-loop mode)")
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=None,
+        help="Open-loop mode: arrival rate in requests/sec per server. Ignores --concurrency; "
+        "latency is measured from each request's scheduled send time.",
+    )
+    parser.add_argument(
+        "--arrival",
+        choices=list(ARRIVAL_PATTERNS),
+        default="poisson",
+        help="Inter-arrival schedule for --rate",
+    )
+    parser.add_argument("--burst-size", type=int, default=8, help="Requests per burst for --arrival bursty")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for arrival schedules")
+    parser.add_argument(
+        "--duration",
+        default=None,
+        help="Time-based run: cycle prompts for this long (e.g. 90s, 10m, 1h) at --concurrency or --rate; "
+        "ignores --iterations",
+    )
+    parser.add_argument(
+        "--profile",
+        default=None,
+        help="Time-based load profile, e.g. 'ramp:1->64/5m,hold:10m,step-down'. Phases: ramp:A->B/DUR, "
+        "hold:DUR, hold:L/DUR, step:L/DUR, step-down[:L][/DUR]. Levels are concurrency, or req/s with --rate.",
+    )
+    parser.add_argument(
+        "--replay",
+        default=None,
+        metavar="TRACE",
+        help="Replay a recorded JSONL(.gz) trace (timestamp + messages/max_tokens/stream/tools per line) "
+        "against each server on its original timeline; ignores prompts and --iterations",
+    )
+    parser.add_argument(
+        "--replay-speedup",
+        type=float,
+        default=1.0,
+        help="Compress the replayed timeline by this factor (2 = twice as fast)",
+    )
+    parser.add_argument(
+        "--conversation-turns",
+        type=int,
+        default=0,
+        help="Multi-turn mode: each of --iterations virtual users per server holds a conversation of this "
+        "many turns (prompts are the per-turn script), growing history with the real replies",
+    )
+    parser.add_argument(
+        "--session-mode",
+        choices=list(SESSION_MODES),
+        default="both",
+        help="Multi-turn mode: send a per-conversation session_id (Osaurus KV-cache reuse), don't, or run "
+        "each conversation both ways to measure the saving",
+    )
+    parser.add_argument(
+        "--prefix-cache-test",
+        action="store_true",
+        help="Compare TTFT for an identical long system prompt vs a cache-busted one (per iteration, "
+        "one of each); the prefix is --system-prompt or --prefix-tokens of synthetic text",
+    )
+    parser.add_argument(
+        "--prefix-tokens",
+        type=int,
+        default=2048,
+        help="Approximate token length of the synthetic shared prefix for --prefix-cache-test",
+    )
+    parser.add_argument(
+        "--prompt-length-sweep",
+        default=None,
+        metavar="LENGTHS",
+        help="Comma-separated prompt lengths in approx. tokens (e.g. 128,512,2k,8k,32k); runs --iterations "
+        "seeded synthetic prompts per length and reports TTFT and prefill tok/s per bucket. "
+        "Pair with a small --max-tokens.",
+    )
+    parser.add_argument(
+        "--target-ci",
+        default=None,
+        metavar="PCT",
+        help="Adaptive iterations: keep sampling each server/prompt cell (at least --iterations times) until "
+        f"the {CONFIDENCE:.0%}% CI half-width of --target-metric's median is within this fraction of it, "
+        "e.g. 2%%, 2 or 0.02; closed-loop only",
+    )
+    parser.add_argument(
+        "--target-metric",
+        choices=list(COMPARED_METRICS),
+        default="ttft_ms",
+        help="Per-request metric whose median --target-ci tracks",
+    )
+    parser.add_argument(
+        "--max-iterations",
+        type=int,
+        default=100,
+        help="--target-ci: stop sampling a cell after this many requests even if it hasn't converged",
+    )
+    parser.add_argument(
+        "--time-budget",
+        default=None,
+        help="--target-ci: start no new requests after this long (e.g. 30m); unconverged cells are reported",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Shard requests across N processes, each with its own event loop and HTTP client",
+    )
+    parser.add_argument(
+        "--find-capacity",
+        action="store_true",
+        help="Search per server for the max load meeting the SLO (--slo-ttft-p95/--slo-total-p95)",
+    )
+    parser.add_argument("--slo-ttft-p95", type=float, default=None, help="Capacity SLO: p95 TTFT limit in ms")
+    parser.add_argument("--slo-total-p95", type=float, default=None, help="Capacity SLO: p95 total latency limit in ms")
+    parser.add_argument(
+        "--min-success-rate",
+        type=float,
+        default=0.99,
+        help="Capacity SLO: minimum success rate (0-1) for a load level to pass",
+    )
+    parser.add_argument(
+        "--capacity-by",
+        choices=list(CAPACITY_DIMENSIONS),
+        default="concurrency",
+        help="Load dimension to search: closed-loop concurrency or open-loop --rate",
+    )
+    parser.add_argument(
+        "--capacity-search",
+        choices=list(CAPACITY_SEARCHES),
+        default="binary",
+        help="binary: double then bisect; step: fixed increments",
+    )
+    parser.add_argument("--capacity-start", type=float, default=1.0, help="First load level to test")
+    parser.add_argument("--capacity-max", type=float, default=256.0, help="Highest load level to test")
+    parser.add_argument(
+        "--capacity-step",
+        type=float,
+        default=None,
+        help="Increment for --capacity-search step (default: --capacity-start)",
+    )
     parser.add_argument("--temperature", type=float, default=0.2, help="Sampling temperature")
     parser.add_argument("--max-tokens", type=int, default=512, help="Max tokens for completion (server-enforced)")
     parser.add_argument("--timeout", type=float, default=60.0, help="Request timeout in seconds")
     parser.add_argument("--no-stream", action="store_true", help="Disable streaming; TTFT ~= total")
+    parser.add_argument(
+        "--no-usage",
+        action="store_true",
+        help="Don't send stream_options.include_usage (for servers that reject unknown fields)",
+    )
+    parser.add_argument(
+        "--tokenizer",
+        default=None,
+        help="Count tokens offline when the server reports no usage: a local vocab file (tokenizer.json, "
+        "vocab.json or one token per line). Agents ignore it and use their own --tokenizer",
+    )
+    parser.add_argument("--http2", action="store_true", help="Use HTTP/2 (requires the h2 package: pip install 'httpx[http2]')")
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=0,
+        help="Max connections per client (per worker process); 0 = unbounded (default). With a cap, "
+        "pool_wait_ms records how long each request queued for a connection (0 when one was free)",
+    )
+    parser.add_argument(
+        "--keepalive-expiry",
+        type=float,
+        default=5.0,
+        help="Close pooled connections idle for this many seconds (default: 5)",
+    )
+    parser.add_argument(
+        "--new-connection",
+        action="store_true",
+        help="Open a fresh connection for every request instead of reusing pooled ones (measures connect cost)",
+    )
+    parser.add_argument(
+        "--chunk-times",
+        action="store_true",
+        help="Keep every content chunk's arrival offset (chunk_times_ms) in the results; ITL percentiles "
+        "are then pooled over all gaps instead of taken from per-request percentiles",
+    )
     parser.add_argument(
         "--warmup-iterations",
         type=int,
@@ -375,7 +4179,8 @@ def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     parser.add_argument(
         "--output-prefix",
         default="./llm-bench",
-        help="Prefix path for outputs (without extension). Files: .results.json/.summary.json/.results.csv",
+        help="Prefix path for outputs (without extension). Files: .results.json/.summary.json/.results.csv "
+        "and .cells.csv (per-prompt/per-cell pivot)",
     )
     parser.add_argument(
         "--export",
@@ -384,11 +4189,66 @@ def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
         default=["json", "csv"],
         help="Export formats",
     )
+    parser.add_argument(
+        "--summary-only",
+        action="store_true",
+        help="Skip the per-request exports (.results.json/.results.csv) and write only the summary ones. "
+        "With --workers or agents, and no --stream-results, only aggregates then come back from them",
+    )
+    parser.add_argument(
+        "--percentiles",
+        type=parse_percentiles,
+        default=DEFAULT_PERCENTILES,
+        help="Percentiles for the quantile table, e.g. 50,90,99,99.9 (default: 50,90,95,99,99.9)",
+    )
+    parser.add_argument(
+        "--confidence-intervals",
+        action="store_true",
+        help=f"Report {CONFIDENCE:.0%}% confidence intervals and pairwise server comparisons (Mann-Whitney). "
+        "These need every request's TTFT/total/tok-s values, so memory then grows with the run; "
+        "without this flag the summary is built from fixed-size sketches",
+    )
+    parser.add_argument(
+        "--bootstrap-resamples",
+        type=int,
+        default=BOOTSTRAP_RESAMPLES,
+        help=f"Bootstrap resamples for --confidence-intervals (default: {BOOTSTRAP_RESAMPLES}). numpy, if "
+        "installed, vectorizes the resampling",
+    )
     parser.add_argument(
         "--extra-json",
         default=None,
         help="Extra JSON to include in requests (e.g., '{\"frequency_penalty\":0.0}')",
     )
+    parser.add_argument(
+        "--stream-results",
+        default=None,
+        metavar="PATH",
+        help="Write each result to this JSONL file (gzip if it ends in .gz) as soon as it completes, so "
+        "they survive a crash or Ctrl-C; re-summarize it later with 'summarize'. An existing non-empty "
+        "file is refused unless --append is given",
+    )
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="Add to an existing --stream-results file instead of refusing it",
+    )
+    parser.add_argument(
+        "--fsync-interval",
+        type=float,
+        default=5.0,
+        help="Seconds between fsyncs of --stream-results",
+    )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    commands = "\n".join(f"  {name:<14}{summary}" for name, (_, summary) in SUBCOMMANDS.items())
+    parser = argparse.ArgumentParser(
+        description="Benchmark OpenAI-compatible local LLM servers",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f"subcommands (see '<subcommand> --help'):\n{commands}",
+    )
+    add_run_arguments(parser)
     return parser.parse_args(argv)
 
 
@@ -411,19 +4271,15 @@ def load_prompts(args: argparse.Namespace) -> List[str]:
     return prompts
 
 
-def main(argv: Optional[List[str]] = None) -> int:
-    args = parse_args(argv)
-    servers: List[ServerSpec] = args.server
-    prompts = load_prompts(args)
-
+def build_configs(args: argparse.Namespace) -> Tuple[RequestConfig, LoadConfig]:
+    """Validate run options into request/load configs; raises ValueError."""
     if args.extra_json:
         try:
             extra_json = json.loads(args.extra_json)
-            if not isinstance(extra_json, dict):
-                raise ValueError("--extra-json must be a JSON object")
         except Exception as exc:
-            print(f"Failed to parse --extra-json: {exc}", file=sys.stderr)
-            return 2
+            raise ValueError(f"Failed to parse --extra-json: {exc}") from exc
+        if not isinstance(extra_json, dict):
+            raise ValueError("Failed to parse --extra-json: --extra-json must be a JSON object")
     else:
         extra_json = None
 
@@ -434,29 +4290,135 @@ def main(argv: Optional[List[str]] = None) -> int:
         timeout_seconds=args.timeout,
         extra_json=extra_json,
         system_prompt=getattr(args, "system_prompt", None),
+        record_chunk_times=args.chunk_times,
+        include_usage=not args.no_usage,
+        tokenizer=args.tokenizer,
+        http2=args.http2,
+        pool_size=args.pool_size,
+        keepalive_expiry=args.keepalive_expiry,
+        new_connection=args.new_connection,
     )
+    if cfg.http2 and importlib.util.find_spec("h2") is None:
+        raise ValueError("--http2 needs the h2 package (pip install 'httpx[http2]')")
+    if cfg.pool_size < 0 or cfg.keepalive_expiry < 0:
+        raise ValueError("--pool-size and --keepalive-expiry must be >= 0")
+    if cfg.tokenizer:
+        try:
+            load_tokenizer(cfg.tokenizer)
+        except (OSError, ValueError) as exc:
+            raise ValueError(f"Failed to load --tokenizer: {exc}") from exc
 
-    # Optional warm-up to avoid counting cold starts/connection setup
-    if getattr(args, "warmup_iterations", 0) > 0:
-        print(
-            f"Running warm-up: {len(servers)} server(s), {len(prompts)} prompt(s), "
-            f"{args.warmup_iterations} iteration(s) each, concurrency={args.concurrency} (excluded from results)..."
-        )
-        _ = asyncio.run(
-            run_benchmark(servers, prompts, args.warmup_iterations, args.concurrency, cfg)
-        )
+    if args.rate is not None and args.rate <= 0:
+        raise ValueError("--rate must be > 0")
+    if args.workers < 1:
+        raise ValueError("--workers must be >= 1")
+    if args.duration and args.profile:
+        raise ValueError("use either --duration or --profile, not both")
+    profile = args.profile
+    if args.duration:
+        level = args.rate if args.rate is not None else args.concurrency
+        profile = f"hold:{level:g}/{parse_duration(args.duration):g}"
+    if profile:
+        parse_profile(profile)  # validate early
 
-    sys_prompt_flag = "ON" if cfg.system_prompt else "OFF"
-    print(f"Running benchmark against {len(servers)} server(s), {len(prompts)} prompt(s), {args.iterations} iteration(s) each, concurrency={args.concurrency}, system_prompt={sys_prompt_flag}...")
+    replay = None
+    if args.replay:
+        if args.rate is not None or profile:
+            raise ValueError("--replay uses the trace's own timeline; drop --rate/--duration/--profile")
+        if args.replay_speedup <= 0:
+            raise ValueError("--replay-speedup must be > 0")
+        replay = load_trace(args.replay)
+
+    if args.conversation_turns < 0:
+        raise ValueError("--conversation-turns must be >= 0")
+    if args.conversation_turns and (args.rate is not None or profile or replay):
+        raise ValueError("--conversation-turns is closed-loop; drop --rate/--duration/--profile/--replay")
+    if args.prefix_cache_test and (args.rate is not None or profile or replay or args.conversation_turns):
+        raise ValueError("--prefix-cache-test is closed-loop; drop --rate/--duration/--profile/--replay/--conversation-turns")
+    if args.prefix_tokens < 1:
+        raise ValueError("--prefix-tokens must be >= 1")
 
-    results: List[SingleResult] = asyncio.run(
-        run_benchmark(servers, prompts, args.iterations, args.concurrency, cfg)
+    length_sweep = None
+    if args.prompt_length_sweep:
+        length_sweep = [parse_token_count(v) for v in args.prompt_length_sweep.split(",") if v.strip()]
+        if not length_sweep or min(length_sweep) < 1:
+            raise ValueError("--prompt-length-sweep needs positive lengths")
+        if args.rate is not None or profile or replay or args.conversation_turns or args.prefix_cache_test:
+            raise ValueError(
+                "--prompt-length-sweep is closed-loop; drop --rate/--duration/--profile/--replay/"
+                "--conversation-turns/--prefix-cache-test"
+            )
+
+    target_ci = parse_fraction(args.target_ci) if args.target_ci else None
+    if target_ci is not None:
+        if not 0 < target_ci < 1:
+            raise ValueError("--target-ci must be between 0 and 100%")
+        if args.rate is not None or profile or replay or args.conversation_turns or args.prefix_cache_test or length_sweep:
+            raise ValueError(
+                "--target-ci is closed-loop; drop --rate/--duration/--profile/--replay/--conversation-turns/"
+                "--prefix-cache-test/--prompt-length-sweep"
+            )
+        if args.max_iterations < args.iterations:
+            raise ValueError("--max-iterations must be >= --iterations")
+    time_budget = parse_duration(args.time_budget) if args.time_budget else None
+
+    load = LoadConfig(
+        rate=args.rate,
+        arrival=args.arrival,
+        burst_size=args.burst_size,
+        seed=args.seed,
+        profile=profile,
+        replay=replay,
+        replay_speedup=args.replay_speedup,
+        conversation_turns=args.conversation_turns,
+        session_mode=args.session_mode,
+        prefix_cache_test=args.prefix_cache_test,
+        prefix_tokens=args.prefix_tokens,
+        length_sweep=length_sweep,
+        target_ci=target_ci,
+        target_metric=args.target_metric,
+        max_iterations=args.max_iterations,
+        time_budget=time_budget,
     )
+    return cfg, load
 
-    # Aggregate
-    summary = aggregate(results)
 
-    # Console summary
+def describe_mode(args: argparse.Namespace, load: LoadConfig) -> str:
+    mode = f"rate={args.rate}/s ({args.arrival})" if load.open_loop else f"concurrency={args.concurrency}"
+    if load.profile:
+        unit = f"req/s ({args.arrival})" if load.open_loop else "concurrency"
+        mode = f"profile={load.profile} [{unit}]"
+    if load.conversation_turns:
+        mode += f", {load.conversation_turns}-turn conversations (session_mode={load.session_mode})"
+    if load.prefix_cache_test:
+        prefix = "--system-prompt" if args.system_prompt else f"~{load.prefix_tokens} synthetic tokens"
+        mode += f", prefix-cache test (shared prefix: {prefix})"
+    if load.length_sweep:
+        mode += f", prompt-length sweep {','.join(str(t) for t in load.length_sweep)} tokens"
+    if load.target_ci:
+        mode += f", target CI ±{load.target_ci:.1%} on {load.target_metric} p50"
+        if load.time_budget:
+            mode += f" within {load.time_budget:g}s"
+    if load.replay:
+        span = load.replay[-1]["offset_s"] / load.replay_speedup
+        mode = f"replay={args.replay} ({len(load.replay)} request(s) over {span:.1f}s, speedup={load.replay_speedup:g})"
+    if args.workers > 1:
+        mode += f", workers={args.workers}"
+    return mode
+
+
+# Pool waits below this are scheduling noise and not worth a summary line
+POOL_WAIT_REPORT_MS = 1.0
+
+
+def print_quantiles(quantiles: Dict[str, Dict[str, float]]) -> None:
+    for metric in SKETCH_METRICS:
+        if metric in quantiles:
+            values = "  ".join(f"{label}={value:.1f}" for label, value in quantiles[metric].items())
+            print(f"  {metric:<22}{values}")
+
+
+def print_summary(summary: Dict[Tuple[str, str], Dict[str, Any]], load: LoadConfig) -> None:
     print("\nSummary:")
     for (srv, model), stats in summary.items():
         print(f"- {srv} | {model}:")
@@ -466,19 +4428,592 @@ def main(argv: Optional[List[str]] = None) -> int:
             f"total_avg={stats['total_ms_avg']:.1f}ms  p50={stats['total_ms_p50']:.1f}ms  p95={stats['total_ms_p95']:.1f}ms  "
             f"chars/s={stats['chars_per_sec_avg']:.1f}  bytes/s={stats['bytes_per_sec_avg']:.1f}"
         )
+        print_quantiles(stats.get("quantiles", {}))
+        ci = stats.get("ci")
+        if ci and ci["method"]:
+            intervals = [
+                f"{key}=[{ci[key][0]:.1f}, {ci[key][1]:.1f}]"
+                for key in (f"{name}_{label}" for name in COMPARED_METRICS for label in ("mean", "p50"))
+                if key in ci
+            ]
+            print(f"  {ci['confidence']:.0%} CI ({ci['method']}): {'  '.join(intervals)}")
+        if stats["token_source"]:
+            decode = stats["decode_tokens_per_sec_avg"]
+            print(
+                f"  out_tok/s={stats['output_tokens_per_sec_avg']:.1f}"
+                + ("" if math.isnan(decode) else f"  decode_tok/s={decode:.1f}")
+                + f"  prompt_tok/s={stats['prompt_tokens_per_sec_avg']:.1f}  "
+                f"completion_tokens_avg={stats['completion_tokens_avg']:.1f}  prompt_tokens_avg={stats['prompt_tokens_avg']:.1f}  "
+                f"(per request; tokens from {stats['token_source']})"
+            )
+        if not math.isnan(stats["window_s"]):
+            tokens = stats["system_output_tokens_per_sec"]
+            print(
+                f"  system: "
+                + ("" if math.isnan(tokens) else f"out_tok/s={tokens:.1f}  ")
+                + f"chars/s={stats['system_chars_per_sec']:.1f}  req/s={stats['system_requests_per_sec']:.2f}  "
+                f"over {stats['window_s']:.1f}s"
+            )
+        if "server_prefill_ms_p50" in stats:
+            overhead = stats["ttft_overhead_ms_p50"]
+            print(
+                f"  server: prefill_p50={stats['server_prefill_ms_p50']:.1f}ms  "
+                f"decode={stats['server_decode_tokens_per_sec_avg']:.1f} tok/s"
+                + ("" if math.isnan(overhead) else f"  ttft_overhead_p50={overhead:.1f}ms")
+            )
+        if not math.isnan(stats["itl_ms_mean"]):
+            print(
+                f"  itl_mean={stats['itl_ms_mean']:.1f}ms  itl_p50={stats['itl_ms_p50']:.1f}ms  "
+                f"itl_p95={stats['itl_ms_p95']:.1f}ms  itl_p99={stats['itl_ms_p99']:.1f}ms  "
+                f"tpot_avg={stats['tpot_ms_avg']:.1f}ms  max_stall={stats['stall_ms_max']:.1f}ms  "
+                f"decode_avg={stats['decode_ms_avg']:.1f}ms"
+            )
+        if load.open_loop:
+            print(f"  send_lag_p95={stats['send_lag_ms_p95']:.1f}ms")
+        if not math.isnan(stats["ttfb_ms_p50"]):
+            phases = [
+                f"{label}={stats[key]:.1f}ms"
+                for label, key in (
+                    ("pool_wait", "pool_wait_ms_p50"),
+                    ("connect", "connect_ms_p50"),
+                    ("tls", "tls_ms_p50"),
+                    ("write", "write_ms_p50"),
+                    ("headers", "ttfb_ms_p50"),
+                    ("first_byte", "first_byte_ms_p50"),
+                    ("first_event", "first_event_ms_p50"),
+                    ("first_token", "ttft_ms_p50"),
+                )
+                if not math.isnan(stats[key])
+            ]
+            print(f"  phases_p50: {'  '.join(phases)}  (new_connections={stats['new_connections']})")
+        if stats["pool_wait_ms_max"] >= POOL_WAIT_REPORT_MS:
+            print(
+                f"  pool_wait_p50={stats['pool_wait_ms_p50']:.1f}ms  pool_wait_p95={stats['pool_wait_ms_p95']:.1f}ms  "
+                f"pool_wait_max={stats['pool_wait_ms_max']:.1f}ms  (queued for a --pool-size connection, included in TTFT)"
+            )
+        conversation = stats.get("conversation", {})
+        saving = conversation.get("ttft_saving_pct", {})
+        for mode in ("session", "none"):
+            for turn, tstats in conversation.get(mode, {}).items():
+                extra = f"  saving={saving[turn]:.1f}%" if mode == "session" and turn in saving else ""
+                print(
+                    f"  [turn {turn} {mode}] runs={tstats['runs']}  ttft_p50={tstats['ttft_ms_p50']:.1f}ms  "
+                    f"ttft_p95={tstats['ttft_ms_p95']:.1f}ms  total_p50={tstats['total_ms_p50']:.1f}ms{extra}"
+                )
+        if "first_pass" in conversation:
+            first = conversation["first_pass"]
+            print(f"  [pass order] session first: {first['session']}  none first: {first['none']} conversation(s)")
+        prefix_cache = stats.get("prefix_cache")
+        if prefix_cache:
+            print(
+                f"  [prefix cache] shared ttft_p50={prefix_cache['shared']['ttft_ms_p50']:.1f}ms  "
+                f"busted ttft_p50={prefix_cache['busted']['ttft_ms_p50']:.1f}ms  "
+                f"delta={prefix_cache['ttft_delta_ms_p50']:.1f}ms  saving={prefix_cache['ttft_saving_pct']:.1f}%"
+            )
+        for tokens, bstats in stats.get("length_sweep", {}).items():
+            print(
+                f"  [{tokens:>6} tok] runs={bstats['runs']}  ttft_p50={bstats['ttft_ms_p50']:.1f}ms  "
+                f"ttft_p95={bstats['ttft_ms_p95']:.1f}ms  prefill={bstats['prefill_tokens_per_sec_p50']:.0f} tok/s"
+                + ("  <- cliff" if bstats["cliff"] else "")
+            )
+        prompts = stats.get("prompts", {})
+        if len(prompts) > 1 or any("cells" in pstats for pstats in prompts.values()):
+            for pidx, pstats in prompts.items():
+                print(
+                    f"  [prompt {pidx}] chars={pstats['prompt_chars_avg']:.0f}  runs={pstats['runs']}  "
+                    f"ttft_p50={pstats['ttft_ms_p50']:.1f}ms  total_p50={pstats['total_ms_p50']:.1f}ms  "
+                    f"out_tok/s={pstats['output_tokens_per_sec_avg']:.1f}"
+                )
+                for label, cstats in pstats.get("cells", {}).items():
+                    print(
+                        f"    [{label or '-'}] runs={cstats['runs']}  ttft_p50={cstats['ttft_ms_p50']:.1f}ms  "
+                        f"total_p50={cstats['total_ms_p50']:.1f}ms  out_tok/s={cstats['output_tokens_per_sec_avg']:.1f}"
+                    )
+        target = stats.get("target_ci")
+        if target:
+            print(
+                f"  [target CI ±{target['target_pct']:g}% on {target['metric']} p50] "
+                f"{target['converged']}/{len(target['cells'])} prompt(s) converged"
+            )
+            for pidx, cell in target["cells"].items():
+                print(
+                    f"  [prompt {pidx}] runs={cell['runs']}  p50={cell['p50']:.1f}  "
+                    f"±{cell['half_width_pct']:.1f}%  {cell['status']}"
+                )
+        for phase, pstats in stats.get("phases", {}).items():
+            print(
+                f"  [{phase}] runs={pstats['runs']}  success_rate={pstats['success_rate']*100:.1f}%  "
+                f"ttft_p50={pstats['ttft_ms_p50']:.1f}ms  ttft_p95={pstats['ttft_ms_p95']:.1f}ms  "
+                f"total_p50={pstats['total_ms_p50']:.1f}ms  total_p95={pstats['total_ms_p95']:.1f}ms"
+            )
 
-    # Exports
+    ranked = sorted(
+        ((key, stats["prefix_cache"]) for key, stats in summary.items() if "prefix_cache" in stats),
+        key=lambda kv: -kv[1]["ttft_delta_ms_p50"] if not math.isnan(kv[1]["ttft_delta_ms_p50"]) else float("inf"),
+    )
+    if ranked:
+        print("\nPrefix-cache effectiveness (TTFT p50 saved by an identical prefix):")
+        for rank, ((srv, model), pc) in enumerate(ranked, 1):
+            print(f"  {rank}. {srv} | {model}: {pc['ttft_delta_ms_p50']:.1f}ms ({pc['ttft_saving_pct']:.1f}%)")
+
+    comparisons = [(key, other, table) for key, stats in summary.items() for other, table in stats.get("comparisons", {}).items()]
+    if comparisons:
+        print(
+            f"\nComparisons (median difference with {CONFIDENCE:.0%} CI; Mann-Whitney U, "
+            f"r = rank-biserial effect size, * = p < {SIGNIFICANCE_LEVEL:g}):"
+        )
+        for (srv, model), other, table in comparisons:
+            print(f"- {srv} | {model}  vs  {other.replace('|', ' | ', 1)}:")
+            for name, c in table.items():
+                low, high = c["median_diff_pct_ci"]
+                print(
+                    f"  {name:<22}{c['median_diff_pct']:+.1f}% [{low:+.1f}%, {high:+.1f}%]  "
+                    f"r={c['effect_size']:+.2f}  p={c['p_value']:.3g}{' *' if c['significant'] else ''}"
+                )
+
+
+def save_artifacts(args: argparse.Namespace, summary: Dict[Tuple[str, str], Dict[str, Any]]) -> None:
+    """Write the summary exports; the per-request ones were written by open_export()."""
     os.makedirs(os.path.dirname(os.path.abspath(args.output_prefix)) or ".", exist_ok=True)
     if "json" in args.export:
-        export_json(args.output_prefix, results, summary)
+        export_summary(args.output_prefix, summary)
     if "csv" in args.export:
-        export_csv(args.output_prefix, results)
+        export_pivot_csv(args.output_prefix, summary)
 
     print(f"\nSaved artifacts with prefix: {args.output_prefix}")
+
+
+def open_export(args: argparse.Namespace) -> ResultExport:
+    return ResultExport(args.output_prefix, args.export)
+
+
+def new_aggregator(args: argparse.Namespace) -> ResultAggregator:
+    return ResultAggregator(keep_values=args.confidence_intervals)
+
+
+def bootstrap_resamples(args: argparse.Namespace) -> int:
+    return args.bootstrap_resamples if args.confidence_intervals else 0
+
+
+def open_sink(args: argparse.Namespace) -> Optional[ResultSink]:
+    if not args.stream_results:
+        return None
+    sink = ResultSink(args.stream_results, fsync_interval_s=args.fsync_interval, append=args.append)
+    print(f"Streaming results to {sink.path}")
+    return sink
+
+
+def open_writers(args: argparse.Namespace, sink: Optional[ResultSink]) -> List[Any]:
+    """The per-request writers (exports, `sink`) of a run; empty when nothing
+    needs individual results."""
+    writers: List[Any] = [] if args.summary_only else [open_export(args)]
+    if sink is not None:
+        writers.append(sink)
+    return writers
+
+
+def agent_main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmark_models.py agent",
+        description="Run a load-generation agent that executes scenarios pushed by 'coordinate'",
+    )
+    parser.add_argument(
+        "--listen",
+        type=parse_hostport,
+        default=("127.0.0.1", AGENT_DEFAULT_PORT),
+        help=f"host:port to listen on (default 127.0.0.1:{AGENT_DEFAULT_PORT}; use 0.0.0.0 to accept remote coordinators)",
+    )
+    parser.add_argument(
+        "--token",
+        default=os.environ.get(AGENT_TOKEN_ENV),
+        help=f"Shared secret coordinators must prove before sending scenarios (default: ${AGENT_TOKEN_ENV}); required",
+    )
+    parser.add_argument("--workers", type=int, default=1, help="Local processes to shard this agent's share across")
+    parser.add_argument("--once", action="store_true", help="Exit after serving one coordinator session")
+    parser.add_argument(
+        "--tokenizer",
+        default=None,
+        help="Local vocab file for offline token counts (the coordinator's --tokenizer is not used)",
+    )
+    args = parser.parse_args(argv)
+    host, port = args.listen
+    if not args.token:
+        print(f"agent needs a shared secret: --token or ${AGENT_TOKEN_ENV}", file=sys.stderr)
+        return 2
+    if args.tokenizer:
+        try:
+            load_tokenizer(args.tokenizer)
+        except (OSError, ValueError) as exc:
+            print(f"Failed to load --tokenizer: {exc}", file=sys.stderr)
+            return 2
+    try:
+        asyncio.run(serve_agent(host, port, args.token, max(1, args.workers), once=args.once, tokenizer=args.tokenizer))
+    except KeyboardInterrupt:
+        pass
     return 0
 
 
-if __name__ == "__main__":
-    raise SystemExit(main())
+def coordinate_main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmark_models.py coordinate",
+        description="Push a scenario to several agents, start them together and merge their results",
+    )
+    parser.add_argument(
+        "--agents",
+        required=True,
+        type=lambda v: [parse_hostport(a) for a in v.split(",") if a.strip()],
+        help="Comma-separated agent addresses host:port,...",
+    )
+    parser.add_argument(
+        "--start-delay",
+        type=float,
+        default=2.0,
+        help="Seconds between the scenario push and the synchronized start",
+    )
+    parser.add_argument(
+        "--token",
+        default=os.environ.get(AGENT_TOKEN_ENV),
+        help=f"The agents' shared secret (default: ${AGENT_TOKEN_ENV}); required",
+    )
+    add_run_arguments(parser)
+    args = parser.parse_args(argv)
+    if not args.token:
+        print(f"coordinate needs the agents' shared secret: --token or ${AGENT_TOKEN_ENV}", file=sys.stderr)
+        return 2
+    servers: List[ServerSpec] = args.server
+    prompts = load_prompts(args)
+    try:
+        cfg, load = build_configs(args)
+    except (ValueError, OSError) as exc:
+        print(str(exc), file=sys.stderr)
+        return 2
+
+    warmup = f", warm-up {args.warmup_iterations} iteration(s)" if args.warmup_iterations > 0 else ""
+    print(
+        f"Coordinating {len(args.agents)} agent(s) against {len(servers)} server(s), {len(prompts)} prompt(s), "
+        f"{args.iterations} iteration(s) each, {describe_mode(args, load)}{warmup}..."
+    )
+    # Agents send back their aggregates; individual results only for the writers
+    aggregator = new_aggregator(args)
+    try:
+        writers = open_writers(args, open_sink(args))
+    except FileExistsError as exc:
+        print(str(exc), file=sys.stderr)
+        return 2
+
+    def on_result(res: SingleResult) -> None:
+        for writer in writers:
+            writer.write(res)
+
+    try:
+        asyncio.run(
+            coordinate(
+                args.agents, servers, prompts, args.iterations, args.concurrency, cfg, load,
+                args.start_delay, args.warmup_iterations, on_result if writers else None, args.token,
+                aggregator,
+            )
+        )
+    except (OSError, AgentError) as exc:
+        print(f"Coordination failed: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        for writer in writers:
+            writer.close()
+
+    summary = aggregator.summary(args.percentiles, bootstrap_resamples(args), load)
+    print_summary(summary, load)
+    save_artifacts(args, summary)
+    return 0
+
+
+def capacity_main(
+    args: argparse.Namespace,
+    servers: List[ServerSpec],
+    prompts: List[str],
+    cfg: RequestConfig,
+    load: LoadConfig,
+) -> int:
+    search = CapacitySearch(
+        by=args.capacity_by,
+        search=args.capacity_search,
+        start=args.capacity_start,
+        max_level=args.capacity_max,
+        step=args.capacity_step,
+        slo_ttft_p95_ms=args.slo_ttft_p95,
+        slo_total_p95_ms=args.slo_total_p95,
+        min_success_rate=args.min_success_rate,
+    )
+    reports: List[Dict[str, Any]] = []
+    for srv in servers:
+        print(f"\nCapacity search for {srv.name} | {srv.model} ({search.search} over {search.by})...")
+        reports.append(find_capacity(srv, prompts, args.iterations, cfg, load, search, args.workers))
+
+    print("\nCapacity:")
+    for rep in reports:
+        knee = "none (first level already fails)" if rep["knee"] is None else f"{rep['by']}={rep['knee']:g}"
+        print(
+            f"- {rep['server']} | {rep['model']}: knee {knee}  "
+            f"max_goodput={rep['max_goodput_rps']:.2f} req/s at {rep['by']}={rep['max_goodput_at']:g}"
+        )
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output_prefix)) or ".", exist_ok=True)
+    export_capacity(args.output_prefix, reports)
+    print(f"\nSaved capacity report: {args.output_prefix}.capacity.json")
+    return 0
+
+
+def merge_summaries(
+    summaries: List[Dict[str, Any]], percentiles: Sequence[float] = DEFAULT_PERCENTILES
+) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """Combine saved summaries (.summary.json contents) of separate runs.
+
+    Only what merges exactly is reported: run counts and, per metric, the
+    quantile table of the merged sketches plus their count, mean, min and max.
+    """
+    runs: Dict[Tuple[str, str], int] = {}
+    merged: Dict[Tuple[str, str], Dict[str, QuantileSketch]] = {}
+    for summary in summaries:
+        for name, stats in summary.items():
+            srv, _, model = name.partition("|")
+            key = (srv, model)
+            runs[key] = runs.get(key, 0) + int(stats.get("runs", 0))
+            group = merged.setdefault(key, {})
+            for metric, data in (stats.get("sketches") or {}).items():
+                sketch = QuantileSketch.from_dict(data)
+                if metric in group:
+                    group[metric].merge(sketch)
+                else:
+                    group[metric] = sketch
+    return {
+        key: {
+            "runs": runs[key],
+            "quantiles": sketch_quantiles(sketches, percentiles),
+            "metrics": {
+                metric: {"count": s.count, "mean": s.total / s.count, "min": s.min, "max": s.max}
+                for metric, s in sketches.items()
+                if s.count
+            },
+            "sketches": {metric: s.to_dict() for metric, s in sketches.items()},
+        }
+        for key, sketches in merged.items()
+    }
+
+
+def summarize_main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmark_models.py summarize",
+        description="Recompute the summary (and exports) from --stream-results JSONL files, or merge the "
+        "quantile sketches of saved .summary.json files from separate runs",
+    )
+    parser.add_argument(
+        "results",
+        nargs="+",
+        help="Paths to .jsonl or .jsonl.gz files written by --stream-results (read as one run), or to "
+        ".summary.json files to merge",
+    )
+    parser.add_argument(
+        "--output-prefix",
+        default=None,
+        help="Prefix for outputs (default: the first path without .jsonl/.jsonl.gz, or with .merged for summaries)",
+    )
+    parser.add_argument("--export", nargs="+", choices=["json", "csv"], default=["json"], help="Export formats")
+    parser.add_argument(
+        "--percentiles",
+        type=parse_percentiles,
+        default=DEFAULT_PERCENTILES,
+        help="Percentiles for the quantile table (default: 50,90,95,99,99.9)",
+    )
+    parser.add_argument(
+        "--confidence-intervals",
+        action="store_true",
+        help="Report confidence intervals and server comparisons (keeps every request's values in memory)",
+    )
+    parser.add_argument(
+        "--bootstrap-resamples",
+        type=int,
+        default=BOOTSTRAP_RESAMPLES,
+        help=f"Bootstrap resamples for --confidence-intervals (default: {BOOTSTRAP_RESAMPLES})",
+    )
+    args = parser.parse_args(argv)
+
+    merging = [path.endswith(".summary.json") for path in args.results]
+    if any(merging):
+        if not all(merging):
+            print("Pass either result files or .summary.json files, not both", file=sys.stderr)
+            return 2
+        summaries = []
+        for path in args.results:
+            with open(path, "r", encoding="utf-8") as f:
+                summaries.append(json.load(f))
+        merged = merge_summaries(summaries, args.percentiles)
+        if args.output_prefix is None:
+            args.output_prefix = re.sub(r"\.summary\.json$", ".merged", args.results[0])
+        print(f"Merged {len(summaries)} summaries:")
+        for (srv, model), stats in merged.items():
+            print(f"- {srv} | {model}: runs={stats['runs']}")
+            print_quantiles(stats["quantiles"])
+        summary_path = f"{args.output_prefix}.summary.json"
+        os.makedirs(os.path.dirname(os.path.abspath(summary_path)) or ".", exist_ok=True)
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump({f"{k[0]}|{k[1]}": v for k, v in merged.items()}, f, ensure_ascii=False, indent=2)
+        print(f"\nSaved merged summary: {summary_path}")
+        return 0
+
+    if args.output_prefix is None:
+        args.output_prefix = re.sub(r"(\.results)?\.jsonl(\.gz)?$", "", args.results[0])
+    # Stream the files through the aggregator (and the per-request exports)
+    # so re-summarizing a long run needs no more memory than the run did
+    aggregator = new_aggregator(args)
+    with open_export(args) as export:
+        for path in args.results:
+            for r in read_results(path):
+                aggregator.add(r)
+                export.write(r)
+    if not aggregator.count:
+        print(f"No results found in {', '.join(args.results)}", file=sys.stderr)
+        return 1
+    summary = aggregator.summary(args.percentiles, bootstrap_resamples(args))
+    print(f"Read {aggregator.count} result(s) from {', '.join(args.results)}")
+    open_loop = any(not math.isnan(stats["send_lag_ms_p95"]) for stats in summary.values())
+    print_summary(summary, LoadConfig(rate=1.0 if open_loop else None))
+    save_artifacts(args, summary)
+    return 0
+
+
+def _sibling_command(module: str, name: str) -> Callable[[List[str]], int]:
+    """A subcommand that lives in a module next to this script (the
+    calibration tools), imported on first use."""
+
+    def run(argv: List[str]) -> int:
+        # The sibling imports this module by name; when it runs as a script,
+        # alias it so that import doesn't load (and re-register) a second copy
+        sys.modules.setdefault("benchmark_models", sys.modules[__name__])
+        return getattr(importlib.import_module(module), name)(argv)
+
+    return run
+
+
+# name -> (entry point, one-line summary for the top-level --help)
+SUBCOMMANDS: Dict[str, Tuple[Callable[[List[str]], int], str]] = {
+    "agent": (agent_main, "run a load-generation agent that 'coordinate' pushes scenarios to"),
+    "coordinate": (coordinate_main, "run one scenario across several agents and merge their aggregates"),
+    "summarize": (summarize_main, "re-summarize --stream-results files or merge .summary.json files"),
+    "parser-bench": (
+        _sibling_command("bench_parser", "parser_bench_main"),
+        "microbenchmark the stream parsers and protocol adapters",
+    ),
+    "mock-server": (
+        _sibling_command("bench_mock_server", "mock_server_main"),
+        "serve a fake Osaurus with configurable timing, for calibration",
+    ),
+    "self-bench": (
+        _sibling_command("bench_self", "self_bench_main"),
+        "benchmark the harness itself against mock servers, vs a baseline",
+    ),
+}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] in SUBCOMMANDS:
+        return SUBCOMMANDS[argv[0]][0](argv[1:])
+
+    args = parse_args(argv)
+    servers: List[ServerSpec] = args.server
+    prompts = load_prompts(args)
+
+    try:
+        cfg, load = build_configs(args)
+    except (ValueError, OSError) as exc:
+        print(str(exc), file=sys.stderr)
+        return 2
 
+    if args.find_capacity and args.slo_ttft_p95 is None and args.slo_total_p95 is None:
+        print("--find-capacity needs --slo-ttft-p95 and/or --slo-total-p95", file=sys.stderr)
+        return 2
+    if args.find_capacity and (
+        load.profile or load.replay or load.conversation_turns or load.prefix_cache_test or load.length_sweep
+        or load.target_ci
+    ):
+        print(
+            "--find-capacity cannot be combined with --duration/--profile/--replay/--conversation-turns/"
+            "--prefix-cache-test/--prompt-length-sweep/--target-ci",
+            file=sys.stderr,
+        )
+        return 2
+
+    # Optional warm-up to avoid counting cold starts/connection setup
+    if getattr(args, "warmup_iterations", 0) > 0:
+        print(
+            f"Running warm-up: {len(servers)} server(s), {len(prompts)} prompt(s), "
+            f"{args.warmup_iterations} iteration(s) each, concurrency={args.concurrency} (excluded from results)..."
+        )
+        # Warm-up is always closed-loop; it only needs to load models and open connections
+        _ = asyncio.run(
+            run_benchmark(servers, prompts, args.warmup_iterations, args.concurrency, cfg)
+        )
+
+    if args.find_capacity:
+        return capacity_main(args, servers, prompts, cfg, load)
+
+    sys_prompt_flag = "ON" if cfg.system_prompt else "OFF"
+    iterations = "time-based" if load.profile else f"{args.iterations} iteration(s) each"
+    if load.target_ci:
+        iterations = f"{args.iterations}-{load.max_iterations} adaptive iteration(s) each"
+    workload = "recorded trace" if load.replay else f"{len(prompts)} prompt(s), {iterations}"
+    if load.length_sweep:
+        workload = f"{len(load.length_sweep)} synthetic length bucket(s), {iterations}"
+    print(f"Running benchmark against {len(servers)} server(s), {workload}, {describe_mode(args, load)}, system_prompt={sys_prompt_flag}...")
+
+    # Results are aggregated and exported as they arrive; none are kept
+    aggregator = new_aggregator(args)
+    try:
+        sink = open_sink(args)
+    except FileExistsError as exc:
+        print(str(exc), file=sys.stderr)
+        return 2
+    writers = open_writers(args, sink)
+
+    def on_result(res: SingleResult) -> None:
+        for writer in writers:
+            writer.write(res)
+
+    interrupted = False
+    try:
+        stream_load_level(
+            servers, prompts, args.iterations, args.concurrency, cfg, load,
+            on_result if writers else None, args.workers, aggregator,
+        )
+    except KeyboardInterrupt:
+        interrupted = True
+    finally:
+        for writer in writers:
+            writer.close()
+
+    if interrupted and args.workers > 1:
+        # Worker aggregates only come back when a worker finishes, so the
+        # partial run can only be summarized from what reached the sink
+        if sink is None:
+            print("\nInterrupted; the worker processes' aggregates are lost (use --stream-results)", file=sys.stderr)
+            return 130
+        aggregator = new_aggregator(args)
+        for res in read_results(sink.path, sink.start_offset):
+            aggregator.add(res)
+        print(f"\nInterrupted; summarizing the {aggregator.count} result(s) streamed to {sink.path}", file=sys.stderr)
+    elif interrupted:
+        print(f"\nInterrupted; summarizing the {aggregator.count} result(s) received so far", file=sys.stderr)
+
+    # Aggregate
+    summary = aggregator.summary(args.percentiles, bootstrap_resamples(args), load)
 
+    # Console summary
+    print_summary(summary, load)
+
+    # Exports
+    save_artifacts(args, summary)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -16,6 +16,14 @@ set -euo pipefail
 #   PROMPTS_FILE (optional) or PROMPTS (comma-separated)
 #   NOSTREAM (set to 1 to disable streaming)
 #   WARMUP (default 1) warm-up iterations per prompt per server
+#   RATE (optional) open-loop arrival rate in requests/sec per server (ignores CONC)
+#   ARRIVAL (default poisson) inter-arrival schedule for RATE: poisson|uniform|bursty
+#   WORKERS (default 1) load-generator processes to shard requests across
+#   DURATION (optional, e.g. 10m) time-based run at CONC/RATE instead of ITER iterations
+#   PROFILE (optional) time-based load profile, e.g. "ramp:1->64/5m,hold:10m,step-down"
+#   STREAM_RESULTS (optional) JSONL(.gz) path each result is appended to as it completes
+#   SLO_TTFT_P95 / SLO_TOTAL_P95 (optional, ms) run a capacity search instead of a
+#     fixed-CONC run: finds the max concurrency per server that meets the SLO
 
 SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
 ROOT_DIR="$(cd "$SCRIPT_DIR/.." && pwd)"
@@ -38,6 +46,14 @@ PROMPTS=${PROMPTS:-"Write a one-sentence summary of the theory of evolution.,Lis
 SYSTEM_PROMPT=${SYSTEM_PROMPT:-"You are a helpful assistant."}
 NOSTREAM=${NOSTREAM:-0}
 WARMUP=${WARMUP:-1}
+RATE=${RATE:-""}
+ARRIVAL=${ARRIVAL:-"poisson"}
+WORKERS=${WORKERS:-1}
+DURATION=${DURATION:-""}
+PROFILE=${PROFILE:-""}
+STREAM_RESULTS=${STREAM_RESULTS:-""}
+SLO_TTFT_P95=${SLO_TTFT_P95:-""}
+SLO_TOTAL_P95=${SLO_TOTAL_P95:-""}
 
 ARGS=(
   --server "osaurus|${OSA_BASE}|${OSA_MODEL}"
@@ -47,6 +63,7 @@ ARGS=(
   --concurrency "${CONC}"
   --max-tokens "${MAXTOK}"
   --warmup-iterations "${WARMUP}"
+  --workers "${WORKERS}"
   --output-prefix "${OUT_PREFIX}"
   --system-prompt "${SYSTEM_PROMPT}"
   --export json csv
@@ -56,6 +73,32 @@ if [[ "${NOSTREAM}" == "1" ]]; then
   ARGS+=(--no-stream)
 fi
 
+if [[ -n "${RATE}" ]]; then
+  ARGS+=(--rate "${RATE}" --arrival "${ARRIVAL}")
+fi
+
+if [[ -n "${DURATION}" ]]; then
+  ARGS+=(--duration "${DURATION}")
+fi
+
+if [[ -n "${PROFILE}" ]]; then
+  ARGS+=(--profile "${PROFILE}")
+fi
+
+if [[ -n "${STREAM_RESULTS}" ]]; then
+  ARGS+=(--stream-results "${STREAM_RESULTS}")
+fi
+
+if [[ -n "${SLO_TTFT_P95}" || -n "${SLO_TOTAL_P95}" ]]; then
+  ARGS+=(--find-capacity)
+  if [[ -n "${SLO_TTFT_P95}" ]]; then
+    ARGS+=(--slo-ttft-p95 "${SLO_TTFT_P95}")
+  fi
+  if [[ -n "${SLO_TOTAL_P95}" ]]; then
+    ARGS+=(--slo-total-p95 "${SLO_TOTAL_P95}")
+  fi
+fi
+
 if [[ -n "${PROMPTS_FILE}" ]]; then
   ARGS+=(--prompts-file "${PROMPTS_FILE}")
 else
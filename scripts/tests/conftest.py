@@ -0,0 +1,107 @@
+"""
+Shared fixtures for the benchmark_models.py tests: scripts/ on sys.path and
+an in-process mock server that records every request it answers, so each
+test drives the real client code against a real socket.
+
+Run: python -m pytest scripts/tests  (needs pytest and httpx)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark_models as bm  # noqa: E402
+from bench_mock_server import MockConfig, MockServer  # noqa: E402
+
+
+class RecordingMockServer(MockServer):
+    """MockServer that keeps (arrival time, path, request JSON) of every POST
+    and the most POSTs it was answering at once."""
+
+    def __init__(self, cfg: MockConfig) -> None:
+        super().__init__(cfg)
+        self.received: List[Tuple[float, str, Dict[str, Any]]] = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def route(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter) -> bool:
+        if method != "POST":
+            return await super().route(method, path, body, writer)
+        self.received.append((time.perf_counter(), path, json.loads(body)))
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return await super().route(method, path, body, writer)
+        finally:
+            self.in_flight -= 1
+
+
+class MockHandle:
+    def __init__(self, mock: RecordingMockServer, port: int) -> None:
+        self.mock = mock
+        self.url = f"http://127.0.0.1:{port}"
+
+    @property
+    def requests(self) -> List[Dict[str, Any]]:
+        return [request for _, _, request in self.mock.received]
+
+    @property
+    def arrivals(self) -> List[float]:
+        return [at for at, _, _ in self.mock.received]
+
+    @property
+    def peak_in_flight(self) -> int:
+        return self.mock.peak_in_flight
+
+    def spec(self, name: str = "mock", protocol: str = "openai") -> bm.ServerSpec:
+        return bm.ServerSpec(name=name, base_url=self.url, model=self.mock.cfg.models[0], protocol=protocol)
+
+
+@pytest.fixture
+def mock_server() -> Callable[..., MockHandle]:
+    """Factory: mock_server(**MockConfig overrides) starts a mock on a free
+    port in a background thread. Defaults answer instantly and unpaced."""
+    running: List[Tuple[asyncio.AbstractEventLoop, asyncio.Task, threading.Thread]] = []
+
+    def start(**overrides: Any) -> MockHandle:
+        cfg = MockConfig(**{"models": ["mock"], "tokens_per_sec": 0.0, "ttft": "0", "seed": 1, **overrides})
+        mock = RecordingMockServer(cfg)
+        loop = asyncio.new_event_loop()
+        bound: List[int] = []
+        ready = threading.Event()
+
+        async def serve() -> None:
+            server = await asyncio.start_server(mock.handle, "127.0.0.1", 0)
+            bound.append(server.sockets[0].getsockname()[1])
+            ready.set()
+            async with server:
+                await server.serve_forever()
+
+        task = loop.create_task(serve())
+
+        def run() -> None:
+            with contextlib.suppress(asyncio.CancelledError):
+                loop.run_until_complete(task)
+            loop.close()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        assert ready.wait(5), "mock server did not start"
+        running.append((loop, task, thread))
+        return MockHandle(mock, bound[0])
+
+    yield start
+    for loop, task, thread in running:
+        loop.call_soon_threadsafe(task.cancel)
+        thread.join(5)
@@ -0,0 +1,105 @@
+"""Distributed runs: two local agents driven by coordinate() against a mock."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import benchmark_models as bm
+
+TOKEN = "test-secret"
+SKEW_S = 3600.0
+
+# An agent whose wall clock runs an hour ahead, so the coordinator has a real
+# offset to measure and take out again
+SKEWED_AGENT = (
+    "import sys, time; sys.path.insert(0, sys.argv[1]); _real = time.time; "
+    f"time.time = lambda: _real() + {SKEW_S}; "
+    "import benchmark_models; sys.exit(benchmark_models.main(sys.argv[2:]))"
+)
+
+
+def start_agent(skewed: bool = False):
+    scripts = os.path.dirname(os.path.abspath(bm.__file__))
+    argv = ["agent", "--once", "--token", TOKEN, "--listen", "127.0.0.1:0"]
+    if skewed:
+        cmd = [sys.executable, "-c", SKEWED_AGENT, scripts, *argv]
+    else:
+        cmd = [sys.executable, os.path.join(scripts, "benchmark_models.py"), *argv]
+    proc = subprocess.Popen(cmd, stderr=subprocess.PIPE, text=True)
+    line = proc.stderr.readline()
+    assert "listening on" in line, line
+    return proc, bm.parse_hostport(line.rsplit(" ", 1)[1])
+
+
+@pytest.fixture
+def agents():
+    procs = []
+
+    def start(skews):
+        addrs = []
+        for skewed in skews:
+            proc, addr = start_agent(skewed)
+            procs.append(proc)
+            addrs.append(addr)
+        return addrs
+
+    yield start
+    for proc in procs:
+        proc.kill()
+        proc.wait(5)
+        proc.stderr.close()
+
+
+def run_coordinate(addrs, server, aggregator=None, token=TOKEN, on_result=None):
+    cfg = bm.RequestConfig(max_tokens=4)
+    return asyncio.run(
+        bm.coordinate(
+            addrs, [server.spec()], ["one", "two", "three"], 4, 4, cfg, None,
+            start_delay=0.3, on_result=on_result, token=token, aggregator=aggregator,
+        )
+    )
+
+
+def test_coordinate_merges_both_agents_on_the_coordinator_clock(agents, mock_server):
+    server = mock_server()
+    addrs = agents([False, True])
+    before = time.time()
+    results = run_coordinate(addrs, server)
+    after = time.time()
+
+    assert len(results) == 3 * 4 and all(r.success for r in results)
+    assert len(server.requests) == 3 * 4
+    # The skewed agent's start times come back on the coordinator's clock
+    assert all(before <= r.started_at <= after for r in results)
+
+
+def test_agent_aggregates_merge_with_their_offsets_taken_out(agents, mock_server):
+    server = mock_server()
+    addrs = agents([True, False])
+    aggregator = bm.ResultAggregator()
+    streamed = []
+    before = time.time()
+    assert run_coordinate(addrs, server, aggregator, on_result=streamed.append) == []
+    after = time.time()
+
+    assert aggregator.count == len(streamed) == 3 * 4
+    windows = [stats for cells in aggregator.groups.values() for stats in cells.values()]
+    assert windows and all(before <= s.start <= s.end <= after for s in windows)
+    stats = aggregator.summary()[("mock", "mock")]
+    assert stats["runs"] == 12 and stats["success_rate"] == 1.0
+
+
+def test_agent_rejects_a_coordinator_with_the_wrong_token(agents, mock_server):
+    server = mock_server()
+    addrs = agents([False])
+    with pytest.raises(bm.AgentError, match="authentication failed"):
+        run_coordinate(addrs, server, token="wrong")
+    assert server.requests == []
+    # A failed handshake doesn't end a --once agent; the real coordinator still runs
+    assert len(run_coordinate(addrs, server)) == 12
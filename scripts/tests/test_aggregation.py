@@ -0,0 +1,148 @@
+"""Mergeable aggregation: quantile sketches and ResultAggregator, whether the
+parts come from one process, worker processes or a JSON round trip."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import random
+import time
+from typing import List
+
+import pytest
+
+import benchmark_models as bm
+
+
+def lognormal(n: int, seed: int) -> List[float]:
+    rng = random.Random(seed)
+    return [rng.lognormvariate(math.log(200.0), 0.8) for _ in range(n)]
+
+
+def test_sketch_quantiles_within_relative_accuracy():
+    values = lognormal(20000, seed=1)
+    sketch = bm.QuantileSketch()
+    sketch.extend(values)
+    ordered = sorted(values)
+    for q in (0.0, 0.01, 0.25, 0.5, 0.9, 0.95, 0.99, 0.999, 1.0):
+        exact = bm.percentile(ordered, q)
+        assert abs(sketch.quantile(q) - exact) <= bm.SKETCH_RELATIVE_ACCURACY * exact * (1 + 1e-9)
+    assert sketch.count == len(values)
+    assert sketch.min == min(values) and sketch.max == max(values)
+    assert bm.sketch_mean(sketch) == pytest.approx(sum(values) / len(values))
+
+
+def test_sketch_add_and_extend_agree():
+    values = lognormal(500, seed=2) + [0.0, 0.0]
+    a, b = bm.QuantileSketch(), bm.QuantileSketch()
+    for v in values:
+        a.add(v)
+    b.extend(values)
+    assert (a.bins, a.zeros, a.count, a.min, a.max) == (b.bins, b.zeros, b.count, b.min, b.max)
+    assert a.total == pytest.approx(b.total)
+
+
+def test_sketch_merge_equals_single_sketch():
+    values = lognormal(5000, seed=4)
+    whole = bm.QuantileSketch()
+    whole.extend(values)
+    left, right = bm.QuantileSketch(), bm.QuantileSketch()
+    left.extend(values[:1234])
+    right.extend(values[1234:])
+    left.merge(right)
+    assert left.count == whole.count
+    assert left.bins == whole.bins
+    for q in (0.5, 0.95, 0.99):
+        assert left.quantile(q) == whole.quantile(q)
+
+
+def test_sketch_serialization_round_trip():
+    sketch = bm.QuantileSketch()
+    sketch.extend(lognormal(1000, seed=5))
+    restored = bm.QuantileSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+    assert restored.bins == sketch.bins
+    assert restored.quantile(0.99) == sketch.quantile(0.99)
+
+
+def test_empty_sketch_is_nan():
+    assert math.isnan(bm.QuantileSketch().quantile(0.5))
+
+
+def mock_results(server, iterations=6):
+    servers = [server.spec("a"), server.spec("b")]
+    cfg = bm.RequestConfig(max_tokens=5)
+    return asyncio.run(bm.run_benchmark(servers, ["one", "two", "three"], iterations, 4, cfg))
+
+
+def merged_over_the_wire(parts, keep_values=False):
+    total = bm.ResultAggregator(keep_values)
+    for part in parts:
+        agg = bm.ResultAggregator(keep_values)
+        for r in part:
+            agg.add(r)
+        total.merge(bm.ResultAggregator.from_dict(json.loads(json.dumps(agg.to_dict()))))
+    return total
+
+
+def assert_same_summary(merged, whole):
+    assert merged.keys() == whole.keys()
+    for key in whole:
+        a, b = merged[key], whole[key]
+        assert a["runs"] == b["runs"] and a["success_rate"] == b["success_rate"]
+        for name in ("ttft_ms_p50", "ttft_ms_p95", "total_ms_avg", "output_tokens_per_sec_avg", "system_output_tokens_per_sec"):
+            assert a[name] == pytest.approx(b[name]), name
+        assert a["prompts"].keys() == b["prompts"].keys()
+        for pidx in b["prompts"]:
+            assert a["prompts"][pidx]["runs"] == b["prompts"][pidx]["runs"]
+
+
+def test_merged_aggregates_summarize_like_one_aggregate(mock_server):
+    results = mock_results(mock_server(ttft="5"))
+    random.Random(1).shuffle(results)
+    merged = merged_over_the_wire([results[:5], results[5:17], results[17:]])
+
+    assert merged.count == len(results) == 36
+    assert_same_summary(merged.summary(), bm.aggregate(results))
+
+
+def test_kept_values_survive_the_round_trip(mock_server):
+    results = mock_results(mock_server(ttft="5"))
+    merged = merged_over_the_wire([results[::2], results[1::2]], keep_values=True)
+    summary = merged.summary(resamples=200)
+    assert all("ci" in stats for stats in summary.values())
+    assert "comparisons" in summary[("a", "mock")]
+
+
+def test_shift_clock_moves_the_measured_window(mock_server):
+    results = mock_results(mock_server(), iterations=2)
+    agg = bm.ResultAggregator()
+    for r in results:
+        agg.add(r)
+    before = agg.summary()
+    agg.shift_clock(-3600.0)
+    after = agg.summary()
+    stats = [s for cells in agg.groups.values() for s in cells.values()]
+    assert all(s.end < min(r.started_at for r in results) for s in stats)
+    assert after[("a", "mock")]["system_output_tokens_per_sec"] == pytest.approx(
+        before[("a", "mock")]["system_output_tokens_per_sec"]
+    )
+
+
+@pytest.mark.parametrize("ship_results", [True, False])
+def test_worker_processes_send_back_their_aggregates(mock_server, ship_results):
+    server = mock_server(ttft="5")
+    aggregator = bm.ResultAggregator()
+    shipped = list(
+        bm.iter_benchmark_sharded(
+            [server.spec()], ["one", "two"], 6, 4, bm.RequestConfig(max_tokens=5), None, 2,
+            start_at=time.time(), ship_results=ship_results, aggregator=aggregator,
+        )
+    )
+
+    assert len(server.requests) == aggregator.count == 12
+    assert len(shipped) == (12 if ship_results else 0)
+    stats = aggregator.summary()[("mock", "mock")]
+    assert stats["runs"] == 12 and stats["success_rate"] == 1.0
+    if ship_results:
+        assert_same_summary(aggregator.summary(), bm.aggregate(shipped))
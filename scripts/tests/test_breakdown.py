@@ -0,0 +1,71 @@
+"""Per-prompt and per-cell breakdown of the summary, and the .cells.csv pivot."""
+
+from __future__ import annotations
+
+import asyncio
+import csv
+
+import benchmark_models as bm
+
+LONG = "word " * 400
+
+
+def run(servers, prompts, iterations=3, **cfg):
+    cfg = bm.RequestConfig(**{"max_tokens": 4, **cfg})
+    return asyncio.run(bm.run_benchmark([s.spec(name) for name, s in servers.items()], prompts, iterations, 1, cfg))
+
+
+def test_each_prompt_gets_its_own_stats(mock_server):
+    servers = {"fast": mock_server(ttft="0"), "slow": mock_server(ttft="80")}
+    summary = bm.aggregate(run(servers, ["hi", LONG]))
+
+    for name in servers:
+        prompts = summary[(name, "mock")]["prompts"]
+        assert list(prompts) == ["0", "1"]
+        assert [prompts[p]["runs"] for p in prompts] == [3, 3]
+        assert [prompts[p]["prompt_chars_avg"] for p in prompts] == [2, len(LONG)]
+        # The mock counts a token per four characters, and at least one
+        assert [prompts[p]["prompt_tokens_avg"] for p in prompts] == [1, len(LONG) // 4]
+        # One scenario per prompt: no cell table
+        assert not any("cells" in stats for stats in prompts.values())
+    for p in ("0", "1"):
+        assert summary[("slow", "mock")]["prompts"][p]["ttft_ms_p50"] >= 80
+
+
+def test_prompts_run_in_several_scenarios_split_into_cells(mock_server):
+    # Two runs with different --max-tokens, summarized together
+    servers = {"mock": mock_server()}
+    results = run(servers, ["hi", "bye"], iterations=2) + run(servers, ["hi", "bye"], iterations=3, max_tokens=16)
+    prompt = bm.aggregate(results)[("mock", "mock")]["prompts"]["0"]
+
+    assert prompt["runs"] == 5
+    cells = prompt["cells"]
+    assert list(cells) == ["max_tokens=16", "max_tokens=4"]
+    assert [cells[c]["runs"] for c in cells] == [3, 2]
+    assert [cells[c]["completion_tokens_avg"] for c in cells] == [16, 4]
+
+
+def test_the_pivot_has_a_row_per_prompt_and_cell_and_a_column_per_server(mock_server, tmp_path):
+    servers = {"a": mock_server(), "b": mock_server()}
+    results = run(servers, ["hi", "bye"], iterations=2) + run(servers, ["hi"], iterations=1, max_tokens=16)
+    path = bm.export_pivot_csv(str(tmp_path / "run"), bm.aggregate(results))
+
+    assert path == str(tmp_path / "run.cells.csv")
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert [(r["prompt_id"], r["cell"]) for r in rows] == [
+        ("0", ""), ("0", "max_tokens=16"), ("0", "max_tokens=4"), ("1", ""),
+    ]
+    assert [r["prompt_chars_avg"] for r in rows] == ["2.0", "2.0", "2.0", "3.0"]
+    for name in servers:
+        assert [r[f"{name}|mock runs"] for r in rows] == ["3", "1", "2", "2"]
+        assert all(f"{name}|mock {metric}" in rows[0] for metric in bm.PIVOT_METRICS)
+
+
+def test_runs_with_too_many_prompts_skip_the_breakdown(mock_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(bm, "PROMPT_BREAKDOWN_MAX", 2)
+    servers = {"mock": mock_server()}
+    stats = bm.aggregate(run(servers, ["a", "b", "c"], iterations=1))[("mock", "mock")]
+
+    assert stats["runs"] == 3 and "prompts" not in stats
+    assert bm.export_pivot_csv(str(tmp_path / "run"), {("mock", "mock"): stats}) is None
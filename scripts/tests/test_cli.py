@@ -0,0 +1,54 @@
+"""The command line: help for every subcommand and a full run against a mock."""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+import benchmark_models as bm
+
+
+@pytest.mark.parametrize("command", [None] + sorted(bm.SUBCOMMANDS))
+def test_help_renders(command, capsys):
+    # argparse %-formats help text: an unescaped % in any help string raises here
+    argv = ["--help"] if command is None else [command, "--help"]
+    with pytest.raises(SystemExit) as exc:
+        bm.main(argv)
+    assert exc.value.code == 0
+    assert "usage:" in capsys.readouterr().out
+
+
+def test_top_level_help_lists_every_subcommand(capsys):
+    with pytest.raises(SystemExit):
+        bm.main(["--help"])
+    epilog = capsys.readouterr().out.split("subcommands (see '<subcommand> --help'):", 1)[1]
+    listed = [line.split()[0] for line in epilog.splitlines() if line.strip()]
+    assert listed == list(bm.SUBCOMMANDS)
+    for name, (_, summary) in bm.SUBCOMMANDS.items():
+        assert summary in epilog
+
+
+def test_a_run_writes_its_summary_and_results(mock_server, tmp_path, capsys):
+    server = mock_server()
+    prefix = tmp_path / "run"
+    argv = [
+        "--server", f"mock|{server.url}|mock", "--prompt", "hi", "--prompt", "bye",
+        "--iterations", "3", "--concurrency", "2", "--max-tokens", "5", "--output-prefix", str(prefix),
+    ]
+    assert bm.main(argv) == 0
+    assert len(server.requests) == 6
+
+    summary = json.loads((tmp_path / "run.summary.json").read_text())
+    results = json.loads((tmp_path / "run.results.json").read_text())
+    assert len(results) == 6 and all(r["success"] for r in results)
+    assert (tmp_path / "run.results.csv").exists() and (tmp_path / "run.cells.csv").exists()
+    assert "mock" in json.dumps(summary) and "mock" in capsys.readouterr().out
+
+
+def test_summary_only_skips_the_per_request_exports(mock_server, tmp_path):
+    server = mock_server()
+    prefix = tmp_path / "run"
+    argv = ["--server", f"mock|{server.url}|mock", "--iterations", "2", "--summary-only", "--output-prefix", str(prefix)]
+    assert bm.main(argv) == 0
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["run.cells.csv", "run.summary.json"]
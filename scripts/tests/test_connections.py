@@ -0,0 +1,49 @@
+"""Connection handling: pool waits (--pool-size) and connection reuse."""
+
+from __future__ import annotations
+
+import asyncio
+import math
+
+import pytest
+
+import benchmark_models as bm
+
+
+def run(server, iterations, concurrency, **cfg):
+    cfg = bm.RequestConfig(**{"max_tokens": 4, **cfg})
+    return asyncio.run(bm.run_benchmark([server.spec()], ["hi"], iterations, concurrency, cfg))
+
+
+def test_an_unbounded_pool_records_no_pool_wait(mock_server):
+    results = run(mock_server(ttft="20"), 8, 4)
+    assert all(r.success and r.pool_wait_ms is None for r in results)
+    assert math.isnan(bm.aggregate(results)[("mock", "mock")]["pool_wait_ms_max"])
+
+
+def test_a_pool_with_room_records_zero_waits(mock_server):
+    results = run(mock_server(ttft="20"), 8, 2, pool_size=4)
+    assert all(r.success and r.pool_wait_ms == 0 for r in results)
+
+
+def test_a_capped_pool_records_the_time_spent_queued(mock_server):
+    # Four streams share two connections: the first two go straight out, the
+    # other two queue for at least one whole 100ms reply
+    server = mock_server(ttft="100")
+    results = run(server, 8, 4, pool_size=2)
+
+    assert all(r.success for r in results) and server.peak_in_flight == 2
+    waits = sorted(r.pool_wait_ms for r in results)
+    assert waits[:2] == [0, 0] and waits[-2] >= 95
+    # The wait is client-side queueing, included in TTFT
+    for r in results:
+        assert r.ttft_ms >= r.pool_wait_ms + 95
+    stats = bm.aggregate(results)[("mock", "mock")]
+    assert stats["pool_wait_ms_max"] == pytest.approx(waits[-1], rel=0.02)
+
+
+def test_new_connection_mode_connects_for_every_request(mock_server):
+    results = run(mock_server(), 4, 1, new_connection=True)
+    assert all(r.connect_ms is not None for r in results)
+    reused = run(mock_server(), 4, 1)
+    assert sum(r.connect_ms is not None for r in reused) == 1
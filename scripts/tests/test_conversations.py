@@ -0,0 +1,70 @@
+"""Multi-turn conversations (--conversation-turns/--session-mode)."""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import json
+
+import benchmark_models as bm
+
+PROMPTS = ["first question", "second question"]
+
+
+def converse(server, turns, conversations, mode):
+    load = bm.LoadConfig(conversation_turns=turns, session_mode=mode)
+    return asyncio.run(
+        bm.run_benchmark([server.spec()], PROMPTS, conversations, 1, bm.RequestConfig(max_tokens=4), load)
+    )
+
+
+def test_each_conversation_reuses_its_session_and_grows_its_history(mock_server):
+    server = mock_server()
+    results = converse(server, 3, 2, "session")
+
+    assert [(r.iteration, r.turn) for r in results] == [(1, 1), (1, 2), (1, 3), (2, 1), (2, 2), (2, 3)]
+    bodies = server.requests
+    sessions = [b["session_id"] for b in bodies]
+    assert sessions[0] == sessions[1] == sessions[2] != sessions[3] == sessions[4] == sessions[5]
+    for prev, body in zip(bodies[:2], bodies[1:3]):
+        assert body["messages"][: len(prev["messages"])] == prev["messages"]
+        assistant = body["messages"][len(prev["messages"])]
+        assert assistant["role"] == "assistant" and assistant["content"]
+    assert [b["messages"][-1]["content"] for b in bodies[:3]] == ["first question", "second question", "first question"]
+
+
+def test_both_modes_replay_the_recorded_conversation_without_a_session(mock_server):
+    server = mock_server()
+    results = converse(server, 3, 2, "both")
+
+    bodies = server.requests
+    assert len(results) == len(bodies) == 2 * 2 * 3
+    for vu, first_mode in ((1, "session"), (2, "none")):
+        mine = [(r, b) for r, b in zip(results, bodies) if r.iteration == vu]
+        first, second = mine[:3], mine[3:]
+        assert [r.conversation_pass for r, _ in mine] == [1, 1, 1, 2, 2, 2]
+        assert {r.session_mode for r, _ in first} == {first_mode}
+        # The second pass prefills exactly what the first pass sent
+        assert [b["messages"] for _, b in second] == [b["messages"] for _, b in first]
+        for r, b in mine:
+            assert ("session_id" in b) == (r.session_mode == "session")
+
+
+def test_a_failed_turn_ends_the_pass(mock_server):
+    server = mock_server()
+    mock = server.mock
+    original = mock.route
+
+    async def fail_second_turn(method, path, body, writer):
+        if method == "POST" and len(json.loads(body)["messages"]) >= 3:
+            return await mock.respond(writer, "500 Internal Server Error", "application/json", mock.error_body("down"))
+        return await original(method, path, body, writer)
+
+    mock.route = fail_second_turn
+    results = converse(server, 4, 2, "both")
+
+    # Turn 2 fails in the first pass; the replay pass stops at the same turn
+    assert all(r.turn <= 2 for r in results)
+    assert collections.Counter((r.iteration, r.conversation_pass, r.turn, r.success) for r in results) == {
+        (vu, p, t, t == 1): 1 for vu in (1, 2) for p in (1, 2) for t in (1, 2)
+    }
@@ -0,0 +1,70 @@
+"""Decode smoothness: ITL, TPOT and stalls from content-chunk arrival times."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+import benchmark_models as bm
+
+
+def run(server, iterations=2, **cfg):
+    cfg = bm.RequestConfig(**{"max_tokens": 11, **cfg})
+    return asyncio.run(bm.run_benchmark([server.spec()], ["go"], iterations, 1, cfg))
+
+
+# The mock's sleeps can overrun on a loaded machine but never run early, so
+# timings are checked against each other and bounded loosely.
+
+
+def test_itl_and_tpot_follow_the_decode_rate(mock_server):
+    # 100 tok/s, one token per chunk: 10ms between chunks, 100ms of decode
+    server = mock_server(tokens_per_sec=100, ttft="50")
+    for r in run(server):
+        assert r.success and r.content_chunks == 11
+        assert r.ttft_ms >= 50
+        assert r.decode_ms == pytest.approx(r.total_ms - r.ttft_ms)
+        assert r.tpot_ms == pytest.approx(r.decode_ms / 10)
+        # The gaps span first to last chunk, inside the decode time
+        assert r.itl_ms_mean * 10 <= r.decode_ms
+        assert r.itl_ms_p50 <= r.itl_ms_p95 <= r.itl_ms_p99 <= r.itl_ms_max
+
+
+def test_tpot_counts_tokens_not_chunks_when_usage_is_known(mock_server):
+    # Two tokens per chunk: the gap doubles, the per-token time does not
+    server = mock_server(tokens_per_sec=100, chunk_tokens=2)
+    for r in run(server):
+        assert r.content_chunks == 6 and r.completion_tokens == 11
+        assert r.tpot_ms == pytest.approx(r.decode_ms / 10)
+        assert r.itl_ms_mean * 5 <= r.decode_ms
+        assert r.itl_ms_mean > 1.5 * r.tpot_ms
+
+
+def test_stalls_show_up_as_the_longest_gap(mock_server):
+    server = mock_server(tokens_per_sec=200, stall_rate=0.3, stall_ms=80, seed=4)
+    results = run(server, iterations=4)
+    assert max(r.itl_ms_max for r in results) >= 80
+    assert all(r.itl_ms_p50 < r.itl_ms_max for r in results)
+    stats = bm.aggregate(results)[("mock", "mock")]
+    assert stats["stall_ms_max"] == pytest.approx(max(r.itl_ms_max for r in results), rel=0.02)
+
+
+def test_recorded_chunk_times_pool_every_gap_in_the_summary(mock_server):
+    server = mock_server(tokens_per_sec=100)
+    results = run(server, record_chunk_times=True)
+    gaps = []
+    for r in results:
+        times = r.chunk_times_ms
+        assert len(times) == r.content_chunks and times == sorted(times)
+        assert times[0] == pytest.approx(r.ttft_ms, abs=1)
+        gaps += [b - a for a, b in zip(times, times[1:])]
+    stats = bm.aggregate(results)[("mock", "mock")]
+    assert stats["itl_ms_p50"] == pytest.approx(bm.percentile(sorted(gaps), 0.5), rel=0.05)
+    assert stats["itl_ms_mean"] == pytest.approx(sum(gaps) / len(gaps), rel=0.01)
+
+
+def test_non_streaming_requests_have_no_decode_timing(mock_server):
+    server = mock_server(tokens_per_sec=100)
+    for r in run(server, stream=False):
+        assert r.success and r.content_chunks is None and r.itl_ms_mean is None and r.tpot_ms is None
@@ -0,0 +1,69 @@
+"""Prompt-length sweep (--prompt-length-sweep): buckets, prompt sizes, prefill rate."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+
+import pytest
+
+import benchmark_models as bm
+
+SWEEP = [256, 1024, 4096]
+
+
+def sweep(server, iterations=2, seed=3):
+    load = bm.LoadConfig(length_sweep=SWEEP, seed=seed)
+    return asyncio.run(bm.run_benchmark([server.spec()], [], iterations, 1, bm.RequestConfig(max_tokens=2), load))
+
+
+def test_parse_token_count():
+    assert [bm.parse_token_count(t) for t in ("512", "2k", "32K", " 1m ", "1.5k")] == [512, 2048, 32768, 1048576, 1536]
+    with pytest.raises(ValueError):
+        bm.parse_token_count("2kb")
+
+
+def test_sweep_prompts_have_the_bucket_size_and_never_repeat(mock_server):
+    server = mock_server()
+    results = sweep(server)
+
+    assert [(r.length_bucket, r.prompt_id, r.iteration) for r in results] == [
+        (tokens, b, it) for b, tokens in enumerate(SWEEP) for it in (1, 2)
+    ]
+    prompts = [b["messages"][-1]["content"] for b in server.requests]
+    assert len(set(prompts)) == len(prompts)
+    assert all(p.endswith(bm.SWEEP_INSTRUCTION) for p in prompts)
+    words = [len(p.split()) for p in prompts]
+    for tokens, count in zip([t for t in SWEEP for _ in (1, 2)], words):
+        assert count == pytest.approx(tokens, rel=0.02)
+
+    # The same --seed sends byte-identical prompts again
+    again = mock_server()
+    sweep(again)
+    assert [b["messages"][-1]["content"] for b in again.requests] == prompts
+
+
+def test_summary_reports_prefill_rate_per_bucket(mock_server):
+    server = mock_server(prefill_tokens_per_sec=20000)
+    stats = bm.aggregate(sweep(server))[("mock", "mock")]["length_sweep"]
+
+    assert list(stats) == [str(t) for t in SWEEP]
+    # Measured prompt tokens (from usage) over TTFT: at most the mock's prefill rate
+    assert 10000 < stats["4096"]["prefill_tokens_per_sec_p50"] <= 20000 * 1.02
+    assert not any(bucket["cliff"] for bucket in stats.values())
+
+
+def test_summary_flags_a_prefill_cliff(mock_server):
+    # Past ~2k tokens this mock's prefill slows to a crawl
+    server = mock_server(prefill_tokens_per_sec=20000)
+    mock = server.mock
+    original = mock.route
+
+    async def cliff(method, path, body, writer):
+        if method == "POST" and len(json.loads(body)["messages"][-1]["content"]) > 8000:
+            await asyncio.sleep(0.5)
+        return await original(method, path, body, writer)
+
+    mock.route = cliff
+    stats = bm.aggregate(sweep(server))[("mock", "mock")]["length_sweep"]
+    assert [stats[str(t)]["cliff"] for t in SWEEP] == [False, False, True]
@@ -0,0 +1,57 @@
+"""The native Ollama protocol (proto=ollama): /api/chat, NDJSON and server timings."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+import benchmark_models as bm
+
+
+def run(server, iterations=2, **cfg):
+    cfg = bm.RequestConfig(**{"max_tokens": 10, "temperature": 0.5, **cfg})
+    return asyncio.run(bm.run_benchmark([server.spec(protocol="ollama")], ["hi"], iterations, 1, cfg))
+
+
+def test_ollama_requests_go_to_api_chat_with_options(mock_server):
+    server = mock_server()
+    assert server.spec(protocol="ollama").endpoint() == f"{server.url}/api/chat"
+    run(server)
+    for _, path, body in server.mock.received:
+        assert path == "/chat"
+        assert body["options"] == {"temperature": 0.5, "num_predict": 10}
+        assert "stream_options" not in body
+
+
+def test_ndjson_stream_counts_tokens_and_chunks_from_the_done_record(mock_server):
+    server = mock_server(tokens_per_sec=200, chunk_tokens=2)
+    for r in run(server):
+        assert r.success and r.content_chunks == 5
+        assert (r.prompt_tokens, r.completion_tokens, r.token_source) == (1, 10, "usage")
+        assert r.output_chars == r.output_bytes > 0
+
+
+def test_server_timings_sit_next_to_the_client_side_numbers(mock_server):
+    # 80ms to first token, then nine 5ms gaps (200 tok/s) of decode
+    server = mock_server(ttft="80", tokens_per_sec=200)
+    results = run(server, iterations=3)
+    for r in results:
+        assert r.server_load_ms == 0
+        assert 80 <= r.server_prefill_ms <= r.ttft_ms
+        # The client's clock starts before the server's and stops after it
+        assert 0 < r.server_decode_ms <= r.total_ms - r.server_prefill_ms
+
+    stats = bm.aggregate(results)[("mock", "mock")]
+    decode_s = sum(r.server_decode_ms for r in results) / 1000.0
+    assert stats["server_prefill_ms_p50"] == pytest.approx(sorted(r.server_prefill_ms for r in results)[1], rel=0.02)
+    assert stats["server_decode_tokens_per_sec_avg"] == pytest.approx(30 / decode_s)
+    assert stats["ttft_overhead_ms_p50"] >= 0
+
+
+def test_non_streamed_ollama_reply(mock_server):
+    server = mock_server()
+    for r in run(server, stream=False):
+        assert r.success and r.completion_tokens == 10 and r.server_prefill_ms is not None
+        assert r.error is None and r.output_chars > 0
+    assert all(body["stream"] is False for body in server.requests)
@@ -0,0 +1,60 @@
+"""Open-loop arrival schedules (--rate/--arrival) and latency from the schedule."""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import statistics
+
+import pytest
+
+import benchmark_models as bm
+
+
+def gaps(offsets):
+    return [b - a for a, b in zip(offsets, offsets[1:])]
+
+
+def test_uniform_arrivals_are_evenly_spaced():
+    offsets = list(bm.arrival_offsets(4.0, "uniform", 9))
+    assert offsets == pytest.approx([i / 4.0 for i in range(9)])
+
+
+def test_poisson_arrivals_are_seeded_with_the_requested_mean_rate():
+    offsets = list(bm.arrival_offsets(20.0, "poisson", 4000, seed=7))
+    assert offsets == list(bm.arrival_offsets(20.0, "poisson", 4000, seed=7))
+    assert offsets != list(bm.arrival_offsets(20.0, "poisson", 4000, seed=8))
+    assert offsets[0] == 0.0
+    assert statistics.mean(gaps(offsets)) == pytest.approx(1 / 20.0, rel=0.1)
+
+
+def test_bursty_arrivals_release_whole_bursts_at_the_mean_rate():
+    offsets = list(bm.arrival_offsets(10.0, "bursty", 4000, burst_size=4, seed=3))
+    bursts = [list(group) for _, group in itertools.groupby(offsets)]
+    assert all(len(burst) == 4 for burst in bursts)
+    assert len(offsets) / offsets[-1] == pytest.approx(10.0, rel=0.15)
+
+
+def test_arrival_offsets_reject_bad_input():
+    with pytest.raises(ValueError):
+        list(bm.arrival_offsets(0.0, "poisson", 3))
+    with pytest.raises(ValueError):
+        list(bm.arrival_offsets(1.0, "steady", 3))
+
+
+def test_open_loop_sends_on_schedule_without_waiting_for_replies(mock_server):
+    # Each reply takes 300ms, far longer than the 25ms spacing: a closed loop
+    # at concurrency 1 would need 3s, the open loop keeps sending regardless
+    server = mock_server(ttft="300")
+    load = bm.LoadConfig(rate=40.0, arrival="uniform")
+    cfg = bm.RequestConfig(max_tokens=4)
+    results = asyncio.run(bm.run_benchmark([server.spec()], ["hi"], 10, 1, cfg, load))
+
+    assert len(results) == 10 and all(r.success for r in results)
+    sent = server.arrivals
+    assert sent[-1] - sent[0] == pytest.approx(9 / 40.0, abs=0.05)
+    assert sent[-1] - sent[0] < 0.3  # all sent before the first reply was due
+    # Latency counts from the scheduled send, so it includes any send lag
+    for r in results:
+        assert r.send_lag_ms is not None and r.send_lag_ms >= 0
+        assert r.ttft_ms >= 300 - 5
@@ -0,0 +1,42 @@
+"""TTFT broken into connection, header, first-byte and first-event phases."""
+
+from __future__ import annotations
+
+import asyncio
+
+import benchmark_models as bm
+
+
+def run(server, iterations=3, **cfg):
+    cfg = bm.RequestConfig(**{"max_tokens": 4, **cfg})
+    return asyncio.run(bm.run_benchmark([server.spec()], ["hi"], iterations, 1, cfg))
+
+
+def test_phases_are_ordered_within_ttft(mock_server):
+    # The mock sends headers and the role-only chunk at once, then the first
+    # token after 80ms, like Osaurus does while it prefills
+    results = run(mock_server(ttft="80"))
+    first, *rest = results
+    assert first.connect_ms is not None and all(r.connect_ms is None for r in rest)
+    for r in results:
+        assert r.tls_ms is None and r.write_ms >= 0
+        assert (r.connect_ms or 0) <= r.ttfb_ms <= r.first_byte_ms <= r.first_event_ms <= r.ttft_ms <= r.total_ms
+        # Bounded loosely: the mock's sleep can overrun, and a busy client reads the role chunk late
+        assert r.ttft_ms >= 80 and r.ttft_ms - r.first_event_ms > 50
+
+    stats = bm.aggregate(results)[("mock", "mock")]
+    assert stats["new_connections"] == 1
+    assert stats["first_token_after_event_ms_p50"] > 50
+    for name in ("write_ms", "ttfb_ms", "first_byte_ms", "first_event_ms"):
+        assert stats[f"{name}_p50"] <= stats["ttft_ms_p50"]
+
+
+def test_non_streamed_requests_have_no_stream_phases(mock_server):
+    for r in run(mock_server(ttft="30"), stream=False):
+        assert r.ttfb_ms is not None and r.first_byte_ms is None and r.first_event_ms is None
+
+
+def test_failed_requests_keep_the_phases_they_reached(mock_server):
+    for r in run(mock_server(error_rate=1.0)):
+        assert not r.success and r.status_code == 500
+        assert r.ttfb_ms is not None and r.ttfb_ms <= r.total_ms
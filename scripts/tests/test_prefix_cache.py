@@ -0,0 +1,67 @@
+"""Prefix-cache test (--prefix-cache-test): shared vs cache-busted prefixes."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+
+import benchmark_models as bm
+
+
+def run_prefix_test(server, iterations=4, **cfg):
+    load = bm.LoadConfig(prefix_cache_test=True, prefix_tokens=300, seed=5)
+    return asyncio.run(
+        bm.run_benchmark([server.spec()], ["tell me"], iterations, 1, bm.RequestConfig(max_tokens=4, **cfg), load)
+    )
+
+
+def test_shared_requests_repeat_the_prefix_and_busted_ones_change_it(mock_server):
+    server = mock_server()
+    results = run_prefix_test(server)
+
+    prefix = bm.synthetic_text(300, 5)
+    primer, *bodies = server.requests
+    assert primer["messages"][0]["content"] == prefix
+    # Variants alternate order per iteration so drift hits both equally
+    assert [r.variant for r in results] == ["shared", "busted", "busted", "shared"] * 2
+    systems = [b["messages"][0]["content"] for b in bodies]
+    for r, system in zip(results, systems):
+        if r.variant == "shared":
+            assert system == prefix
+        else:
+            assert system != prefix and system.endswith(f"] {prefix}")
+    busted = [s for r, s in zip(results, systems) if r.variant == "busted"]
+    assert len(set(busted)) == len(busted)
+    suffixes = [b["messages"][1]["content"] for b in server.requests]
+    assert len(set(suffixes)) == len(suffixes)
+
+
+def test_a_custom_system_prompt_is_the_shared_prefix(mock_server):
+    server = mock_server()
+    run_prefix_test(server, iterations=1, system_prompt="You are terse.")
+    assert [len(b["messages"]) for b in server.requests] == [2, 2, 2]
+    assert [b["messages"][0]["content"] for b in server.requests][:2] == ["You are terse.", "You are terse."]
+
+
+def test_summary_reports_the_ttft_a_cached_prefix_saves(mock_server):
+    # A mock with a prefix cache: an unseen system prompt costs 60ms of prefill
+    server = mock_server()
+    mock = server.mock
+    original = mock.route
+    seen = set()
+
+    async def cached(method, path, body, writer):
+        if method == "POST":
+            system = json.loads(body)["messages"][0]["content"]
+            if system not in seen:
+                seen.add(system)
+                await asyncio.sleep(0.06)
+        return await original(method, path, body, writer)
+
+    mock.route = cached
+    results = run_prefix_test(server)
+    stats = bm.aggregate(results)[("mock", "mock")]["prefix_cache"]
+
+    assert stats["shared"]["runs"] == stats["busted"]["runs"] == 4
+    assert stats["ttft_delta_ms_p50"] > 40
+    assert stats["ttft_saving_pct"] > 50
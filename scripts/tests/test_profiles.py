@@ -0,0 +1,65 @@
+"""Time-based load profiles (--profile/--duration)."""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+
+import pytest
+
+import benchmark_models as bm
+
+
+def test_parse_duration_units():
+    assert bm.parse_duration("90") == 90.0
+    assert bm.parse_duration("1h30m") == 5400.0
+    assert bm.parse_duration("250ms") == pytest.approx(0.25)
+    with pytest.raises(ValueError):
+        bm.parse_duration("5 minutes")
+
+
+def test_parse_profile_phases_carry_levels_forward():
+    phases = bm.parse_profile("ramp:1->64/5m,hold:10m,step:8/30s,step-down")
+    assert [p.name for p in phases] == ["0:ramp", "1:hold", "2:step", "3:step-down"]
+    assert [(p.start_level, p.end_level) for p in phases] == [(1, 64), (64, 64), (8, 8), (1, 1)]
+    assert [p.duration_s for p in phases] == [300, 600, 30, bm.PROFILE_STEP_DOWN_SECONDS]
+
+
+@pytest.mark.parametrize("spec", ["", "hold:10m", "ramp:1/5m", "surge:4/1m", "step:-1/5s", "step-down"])
+def test_parse_profile_rejects_bad_specs(spec):
+    with pytest.raises(ValueError):
+        bm.parse_profile(spec)
+
+
+def test_profile_level_at_interpolates_ramps_and_ends():
+    phases = bm.parse_profile("ramp:0->10/10s,hold:5s")
+    phase, level = bm.profile_level_at(phases, 2.5)
+    assert phase.name == "0:ramp" and level == pytest.approx(2.5)
+    phase, level = bm.profile_level_at(phases, 12.0)
+    assert phase.name == "1:hold" and level == 10
+    assert bm.profile_level_at(phases, 15.0) is None
+
+
+def test_profile_run_follows_the_levels_and_tags_each_result(mock_server):
+    # 100ms replies: one stream for 0.5s, then three streams for 0.5s
+    server = mock_server(ttft="100")
+    load = bm.LoadConfig(profile="step:1/0.5s,step:3/0.5s")
+    results = asyncio.run(bm.run_benchmark([server.spec()], ["a", "b"], 1, 1, bm.RequestConfig(max_tokens=4), load))
+
+    assert results and all(r.success for r in results)
+    by_phase = collections.Counter(r.phase for r in results)
+    assert set(by_phase) == {"0:step", "1:step"}
+    assert {r.load_level for r in results if r.phase == "1:step"} == {3.0}
+    # One stream at a time in the first phase, up to three in the second
+    first = sorted((r.started_at, r.started_at + r.total_ms / 1000.0) for r in results if r.phase == "0:step")
+    assert all(end <= next_start + 0.005 for (_, end), (next_start, _) in zip(first, first[1:]))
+    assert server.peak_in_flight == 3
+    assert by_phase["1:step"] > by_phase["0:step"] >= 2
+    # Prompts are cycled, each with its own iteration counter
+    assert sorted(r.iteration for r in results if r.prompt_id == 0) == list(
+        range(1, 1 + sum(r.prompt_id == 0 for r in results))
+    )
+
+    summary = bm.aggregate(results)[("mock", "mock")]
+    assert list(summary["phases"]) == ["0:step", "1:step"]
+    assert summary["phases"]["1:step"]["runs"] == by_phase["1:step"]
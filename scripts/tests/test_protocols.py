@@ -0,0 +1,72 @@
+"""Protocol adapters: the registry, --server proto= and a custom adapter end to end."""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+
+import pytest
+
+import benchmark_models as bm
+
+
+class TaggedAdapter(bm.ProtocolAdapter):
+    """OpenAI chat that tags each request, upper-cases the reply and reports a decode time."""
+
+    name = "tagged"
+
+    def build_payload(self, model, messages, cfg, session_id):
+        payload = super().build_payload(model, messages, cfg, session_id)
+        payload["bench_tag"] = "t1"
+        return payload
+
+    @staticmethod
+    def parse_event(data):
+        text, usage = bm.parse_stream_event(data)
+        return text.upper(), usage
+
+    def server_timings(self, final):
+        return {"server_decode_ms": 1.5} if final else {}
+
+
+@pytest.fixture
+def tagged():
+    adapter = bm.register_protocol(TaggedAdapter())
+    yield adapter
+    del bm.PROTOCOL_ADAPTERS[adapter.name]
+
+
+def test_server_specs_pick_a_registered_protocol():
+    spec = bm.parse_server_arg("local|http://h:1/v1|org/model|x|proto=ollama")
+    assert (spec.name, spec.model, spec.protocol) == ("local", "org/model|x", "ollama")
+    assert spec.endpoint() == "http://h:1/api/chat"
+    assert bm.parse_server_arg("a|http://h:1|m").endpoint() == "http://h:1/v1/chat/completions"
+    with pytest.raises(argparse.ArgumentTypeError, match="unknown protocol"):
+        bm.parse_server_arg("a|http://h|m|proto=grpc")
+    with pytest.raises(argparse.ArgumentTypeError, match="unknown --server option"):
+        bm.parse_server_arg("a|http://h|m|speed=9")
+
+
+@pytest.mark.parametrize("name", ["openai", "completions", "ollama", "lmstudio"])
+def test_builtin_adapters_read_their_own_stream_events(name):
+    adapter = bm.PROTOCOL_ADAPTERS[name]
+    for text in ("hi", ' "quoted" ', "ünïcode"):
+        assert adapter.parse_event(adapter.sample_event(text))[0] == text
+
+
+def test_a_registered_adapter_drives_the_request_and_the_parsing(mock_server, tagged):
+    assert bm.PROTOCOL_ADAPTERS["tagged"] is tagged
+    server = mock_server()
+    spec = bm.parse_server_arg(f"mock|{server.url}|mock|proto=tagged")
+    cfg = bm.RequestConfig(max_tokens=6)
+
+    async def chat():
+        reply = []
+        async with bm.make_client(cfg) as client:
+            res = await bm.run_single_chat(client, spec, 0, 1, "hi", cfg, reply=reply)
+        return res, "".join(reply)
+
+    res, text = asyncio.run(chat())
+    assert server.requests[0]["bench_tag"] == "t1"
+    assert res.success and text == text.upper() and len(text.split()) == 6
+    assert res.completion_tokens == 6 and res.server_decode_ms == 1.5
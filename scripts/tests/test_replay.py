@@ -0,0 +1,84 @@
+"""Trace replay (--replay/--replay-speedup)."""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+
+import pytest
+
+import benchmark_models as bm
+
+
+def write_trace(path, lines):
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "wt", encoding="utf-8") as f:
+        for line in lines:
+            f.write((line if isinstance(line, str) else json.dumps(line)) + "\n")
+    return str(path)
+
+
+def test_load_trace_normalizes_and_sorts_records(tmp_path):
+    path = write_trace(
+        tmp_path / "trace.jsonl.gz",
+        [
+            {"ts": "2026-01-01T00:00:01.5Z", "prompt": "second"},
+            {"timestamp": 1767225600000, "request": {"messages": [{"role": "user", "content": "first"}],
+                                                    "max_completion_tokens": 7, "stream": False}},
+            "",
+            {"time": 1767225603, "body": {"messages": [{"role": "user", "content": "third"}], "tools": [{"x": 1}]}},
+        ],
+    )
+    records = bm.load_trace(path)
+
+    assert [r["messages"][0]["content"] for r in records] == ["first", "second", "third"]
+    assert [r["offset_s"] for r in records] == pytest.approx([0.0, 1.5, 3.0])
+    assert records[0]["max_tokens"] == 7 and records[0]["stream"] is False
+    cfg = bm.trace_request_config(bm.RequestConfig(max_tokens=64), records[2])
+    assert cfg.max_tokens == 64 and cfg.extra_json == {"tools": [{"x": 1}]}
+
+
+@pytest.mark.parametrize(
+    "line, error",
+    [("{not json", "invalid JSON"), ({"prompt": "x"}, "missing timestamp"), ({"ts": 1}, "missing messages")],
+)
+def test_load_trace_reports_the_bad_line(tmp_path, line, error):
+    path = write_trace(tmp_path / "trace.jsonl", [{"ts": 0, "prompt": "ok"}, line])
+    with pytest.raises(ValueError, match=f":2: {error}"):
+        bm.load_trace(path)
+
+
+def test_replay_reissues_the_trace_on_its_timeline_sped_up(mock_server, tmp_path):
+    server = mock_server()
+    trace = [
+        {"ts": 10.0, "prompt": "a", "max_tokens": 3},
+        {"ts": 10.4, "prompt": "b"},
+        {"ts": 10.6, "prompt": "c", "stream": False},
+        {"ts": 11.2, "prompt": "d"},
+    ]
+    load = bm.LoadConfig(replay=bm.load_trace(write_trace(tmp_path / "t.jsonl", trace)), replay_speedup=2.0)
+    results = asyncio.run(bm.run_benchmark([server.spec()], [], 1, 1, bm.RequestConfig(max_tokens=16), load))
+
+    assert sorted(r.prompt_id for r in results) == [0, 1, 2, 3] and all(r.success for r in results)
+    # At half the trace's 1.2s span (measured from the first arrival, which may itself be late)
+    sent = [at - server.arrivals[0] for at in server.arrivals]
+    for at, due in zip(sent, [0.0, 0.2, 0.3, 0.6]):
+        assert due - 0.1 < at < due + 0.15
+    # Each request carries the record's own messages and settings
+    bodies = server.requests
+    assert [b["messages"][-1]["content"] for b in bodies] == ["a", "b", "c", "d"]
+    assert [b["max_tokens"] for b in bodies] == [3, 16, 16, 16]
+    assert [b["stream"] for b in bodies] == [True, True, False, True]
+
+
+def test_replay_shards_keep_the_original_offsets(mock_server, tmp_path):
+    server = mock_server()
+    trace = [{"ts": i * 0.1, "prompt": str(i)} for i in range(6)]
+    load = bm.LoadConfig(replay=bm.load_trace(write_trace(tmp_path / "t.jsonl", trace)))
+    results = asyncio.run(bm.run_benchmark([server.spec()], [], 1, 1, bm.RequestConfig(), load, shard=(1, 2)))
+
+    assert sorted(r.prompt_id for r in results) == [1, 3, 5]
+    sent = [at - server.arrivals[0] for at in server.arrivals]
+    for at, due in zip(sent, [0.0, 0.2, 0.4]):
+        assert due - 0.1 < at < due + 0.15
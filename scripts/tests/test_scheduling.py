@@ -0,0 +1,59 @@
+"""Lazy work scheduling: shards, bounded concurrency and streamed results."""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+
+import pytest
+
+import benchmark_models as bm
+
+
+def specs(*names):
+    return [bm.ServerSpec(name=n, base_url=f"http://{n}", model="m") for n in names]
+
+
+@pytest.mark.parametrize("count", [1, 3, 4])
+def test_shards_partition_the_work_matrix(count):
+    servers, prompts = specs("a", "b"), ["p0", "p1", "p2"]
+    key = lambda item: (item[0].name, item[1], item[2])  # noqa: E731
+    everything = [key(item) for item in bm.iter_work(servers, prompts, 5)]
+    shards = [[key(item) for item in bm.iter_work(servers, prompts, 5, (i, count))] for i in range(count)]
+
+    assert len(everything) == 2 * 3 * 5
+    assert sorted(itertools.chain(*shards)) == sorted(everything)
+    assert max(map(len, shards)) - min(map(len, shards)) <= 1
+
+
+def test_work_items_are_generated_lazily():
+    work = bm.iter_work(specs("a"), ["p"], 10**12)
+    assert [it for _, _, it, _ in itertools.islice(work, 3)] == [1, 2, 3]
+
+
+def test_closed_loop_keeps_at_most_concurrency_requests_in_flight(mock_server):
+    server = mock_server(ttft="20")
+    results = asyncio.run(bm.run_benchmark([server.spec()], ["a", "b"], 12, 4, bm.RequestConfig(max_tokens=4)))
+
+    assert len(results) == 24 and all(r.success for r in results)
+    assert server.peak_in_flight == 4
+    assert sorted((r.prompt_id, r.iteration) for r in results) == [(p, i) for p in (0, 1) for i in range(1, 13)]
+
+
+def test_results_stream_as_they_complete_and_stopping_early_sends_no_more(mock_server):
+    server = mock_server(ttft="20")
+
+    async def first_results():
+        got = []
+        stream = bm.iter_benchmark([server.spec()], ["a"], 1000, 2, bm.RequestConfig(max_tokens=4))
+        async for res in stream:
+            got.append(res)
+            if len(got) == 3:
+                break
+        await stream.aclose()
+        await asyncio.sleep(0.1)
+        return got
+
+    assert len(asyncio.run(first_results())) == 3
+    # Abandoning the iterator cancels the workers instead of draining the matrix
+    assert len(server.requests) <= 3 + 2
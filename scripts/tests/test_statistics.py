@@ -0,0 +1,64 @@
+"""Confidence intervals and pairwise comparisons (--confidence-intervals)."""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import random
+from typing import List
+
+import pytest
+
+import benchmark_models as bm
+
+
+def lognormal(n: int, seed: int) -> List[float]:
+    rng = random.Random(seed)
+    return [rng.lognormvariate(math.log(200.0), 0.8) for _ in range(n)]
+
+
+def test_mann_whitney_separated_samples():
+    # U = 0; z = (12.5 - 0.5) / sqrt(25 * 11 / 12), two-sided p = 0.01219
+    effect, p = bm.mann_whitney([1, 2, 3, 4, 5], [6, 7, 8, 9, 10])
+    assert effect == -1.0
+    assert p == pytest.approx(0.01219, abs=5e-5)
+    effect, p2 = bm.mann_whitney([6, 7, 8, 9, 10], [1, 2, 3, 4, 5])
+    assert effect == 1.0 and p2 == pytest.approx(p)
+
+
+def test_mann_whitney_ties_and_overlap():
+    # Brute-force U with ties counted as 1/2
+    a, b = [1, 2, 2, 3, 5, 5], [2, 3, 3, 4, 5, 6, 7]
+    u = sum(1.0 if x > y else 0.5 if x == y else 0.0 for x in a for y in b)
+    effect, p = bm.mann_whitney(a, b)
+    assert effect == pytest.approx(2 * u / (len(a) * len(b)) - 1)
+    assert 0.0 < p < 1.0
+    assert bm.mann_whitney([3, 3, 3], [3, 3, 3]) == (0.0, 1.0)
+
+
+def test_confidence_interval_covers_mean():
+    values = lognormal(400, seed=6)
+    low, high, method = bm.confidence_interval(values, "mean", resamples=500)
+    assert method == "bootstrap"
+    assert low < sum(values) / len(values) < high
+    low, high, method = bm.confidence_interval(values, "median", resamples=10**6)
+    assert method == "order"
+    assert low < bm.percentile(values, 0.5) < high
+
+
+def test_a_slower_server_compares_as_significantly_slower(mock_server):
+    fast, slow = mock_server(ttft="20"), mock_server(ttft="200")
+    servers = [fast.spec("fast"), slow.spec("slow")]
+    results = asyncio.run(bm.run_benchmark(servers, ["hi"], 12, 4, bm.RequestConfig(max_tokens=4)))
+    summary = bm.aggregate(results, resamples=300)
+
+    for key in (("fast", "mock"), ("slow", "mock")):
+        stats = summary[key]
+        low, high = stats["ci"]["ttft_ms_p50"]
+        # The summary's p50 comes from the sketch, the interval from the exact values
+        slack = 1 + bm.SKETCH_RELATIVE_ACCURACY
+        assert low / slack <= stats["ttft_ms_p50"] <= high * slack
+    ttft = summary[("fast", "mock")]["comparisons"]["slow|mock"]["ttft_ms"]
+    assert ttft["significant"] and ttft["effect_size"] < -0.9
+    low, high = ttft["median_diff_pct_ci"]
+    assert low <= ttft["median_diff_pct"] <= high < 0
@@ -0,0 +1,117 @@
+"""SSE/NDJSON stream parsing: split reads, framing and lazy event decoding."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+from typing import List
+
+import pytest
+
+import benchmark_models as bm
+import bench_parser
+
+
+def old_line_events(body: bytes) -> List[bytes]:
+    """Event payloads as the text-line parser (before StreamParser) saw them."""
+    events = []
+    for line in body.decode("utf-8").splitlines():
+        if not line:
+            continue
+        data = line[6:].strip() if line.startswith("data: ") else line.strip()
+        events.append(data.encode("utf-8"))
+    return events
+
+
+def parse_in_reads(body: bytes, cuts: List[int]) -> List[bytes]:
+    parser = bm.StreamParser()
+    events: List[bytes] = []
+    start = 0
+    for cut in sorted(cuts) + [len(body)]:
+        events.extend(parser.feed(body[start:cut]))
+        start = cut
+    events.extend(parser.close())
+    assert parser.bytes_seen == len(body)
+    return events
+
+
+def sse_body(events: int, seed: int = 0) -> bytes:
+    # synthetic_sse_body() adds keep-alive comments, which the old parser
+    # counted as events; drop them for the like-for-like comparison
+    return b"".join(e for e in bench_parser.synthetic_sse_body(events, seed) if not e.startswith(b":"))
+
+
+def test_stream_parser_matches_line_parser_for_every_read_size():
+    body = sse_body(40)
+    expected = old_line_events(body)
+    for size in (1, 2, 3, 7, 64, 4096):
+        assert parse_in_reads(body, list(range(size, len(body), size))) == expected
+
+
+def test_stream_parser_random_split_reads():
+    body = sse_body(200, seed=3)
+    expected = old_line_events(body)
+    rng = random.Random(7)
+    for _ in range(50):
+        cuts = rng.sample(range(1, len(body)), 20)
+        assert parse_in_reads(body, cuts) == expected
+
+
+def test_stream_parser_crlf_split_between_cr_and_lf():
+    body = sse_body(20).replace(b"\n", b"\r\n")
+    expected = old_line_events(body)
+    crs = [i + 1 for i, c in enumerate(body) if c == ord("\r")]
+    assert parse_in_reads(body, crs) == expected
+    assert parse_in_reads(body, list(range(1, len(body)))) == expected
+
+
+def test_stream_parser_skips_comments_and_fields():
+    body = b': keep-alive\n\nevent: message\nid: 7\nretry: 100\ndata: {"a":1}\n\n: ping\n\ndata: [DONE]\n\n'
+    assert parse_in_reads(body, []) == [b'{"a":1}', b"[DONE]"]
+    assert parse_in_reads(body, list(range(1, len(body)))) == [b'{"a":1}', b"[DONE]"]
+
+
+def test_stream_parser_joins_multiline_data():
+    body = b"data: first\ndata:second\n\ndata: x\n\n"
+    assert parse_in_reads(body, [3, 12, 15]) == [b"first\nsecond", b"x"]
+
+
+def test_stream_parser_ndjson_and_unterminated_tail():
+    body = b'{"message":{"content":"a"}}\n{"message":{"content":"b"}}\n{"done":true}'
+    assert parse_in_reads(body, [5, 30]) == [
+        b'{"message":{"content":"a"}}',
+        b'{"message":{"content":"b"}}',
+        b'{"done":true}',
+    ]
+
+
+@pytest.mark.parametrize("text", [" hello", "café ☃", 'quote " and \\ slash', "line\nbreak", ""])
+def test_lazy_event_parse_matches_full_decode(text):
+    chunk = {"id": "x", "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}]}
+    for separators in ((",", ":"), (", ", ": ")):
+        data = json.dumps(chunk, ensure_ascii=False, separators=separators).encode("utf-8")
+        assert bm.parse_stream_event(data, lazy=True) == bm.parse_stream_event(data, lazy=False) == (text, None)
+
+
+def test_event_parse_usage_and_plain_text():
+    data = b'{"choices":[],"usage":{"prompt_tokens":3,"completion_tokens":5}}'
+    assert bm.parse_stream_event(data, lazy=True) == ("", {"prompt_tokens": 3, "completion_tokens": 5})
+    assert bm.parse_stream_event(b"not json", lazy=True) == ("not json", None)
+
+
+@pytest.mark.parametrize("chunk_tokens", [1, 5])
+def test_streamed_reply_text_survives_any_chunking(mock_server, chunk_tokens):
+    server = mock_server(chunk_tokens=chunk_tokens, close_after_stream=True)
+    cfg = bm.RequestConfig(max_tokens=23)
+
+    async def chat():
+        reply = []
+        async with bm.make_client(cfg) as client:
+            res = await bm.run_single_chat(client, server.spec(), 0, 1, "hi", cfg, reply=reply)
+        return res, "".join(reply)
+
+    res, text = asyncio.run(chat())
+    assert res.success and res.content_chunks == -(-23 // chunk_tokens)
+    assert len(text.split()) == 23 and all(w in bm._SYNTHETIC_WORDS for w in text.split())
+    assert res.output_chars == len(text) and res.output_bytes == len(text.encode("utf-8"))
@@ -0,0 +1,97 @@
+"""Adaptive iterations (--target-ci/--max-iterations/--time-budget)."""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+
+import pytest
+
+import benchmark_models as bm
+
+
+def test_parse_fraction_reads_bare_numbers_of_one_or_more_as_percentages():
+    assert [bm.parse_fraction(t) for t in ("2%", "2", " 5 ", "0.02", "1")] == pytest.approx([0.02, 0.02, 0.05, 0.02, 0.01])
+    with pytest.raises(ValueError, match="invalid fraction"):
+        bm.parse_fraction("two")
+
+
+def noisy_server(mock_server, ttft="100"):
+    """A mock whose "noisy" prompt waits an extra 250ms on every other request,
+    so its median's interval always spans both modes."""
+    server = mock_server(ttft=ttft)
+    original = server.mock.route
+    extra = itertools.cycle([0.0, 0.25])
+
+    async def jittery(method, path, body, writer):
+        if method == "POST" and json.loads(body)["messages"][-1]["content"] == "noisy":
+            await asyncio.sleep(next(extra))
+        return await original(method, path, body, writer)
+
+    server.mock.route = jittery
+    return server
+
+
+def run(server, load, iterations=3, concurrency=1):
+    cfg = bm.RequestConfig(max_tokens=2)
+    return asyncio.run(bm.run_benchmark([server.spec()], ["steady", "noisy"], iterations, concurrency, cfg, load))
+
+
+def stop_reasons(results):
+    return {r.prompt_id: r.stop_reason for r in results if r.stop_reason}
+
+
+def test_stable_cells_stop_early_and_noisy_ones_run_to_the_cap(mock_server):
+    server = noisy_server(mock_server)
+    # Generous for the steady cell: a loaded machine's timer overruns stay well inside it
+    load = bm.LoadConfig(target_ci=0.3, max_iterations=12)
+    results = run(server, load)
+
+    assert all(r.success for r in results)
+    runs = {pidx: sum(r.prompt_id == pidx for r in results) for pidx in (0, 1)}
+    # The steady cell converges as soon as it has enough samples for the interval
+    assert runs == {0: bm.TARGET_CI_MIN_SAMPLES, 1: 12}
+    assert stop_reasons(results) == {0: "converged", 1: "max-iterations"}
+    # Each cell's stop_reason rides on its last result only
+    for pidx in (0, 1):
+        cell = [r for r in results if r.prompt_id == pidx]
+        assert cell[-1].stop_reason and not any(r.stop_reason for r in cell[:-1])
+
+    stats = bm.aggregate(results, load=load)[("mock", "mock")]["target_ci"]
+    assert stats["metric"] == "ttft_ms" and stats["target_pct"] == pytest.approx(30.0)
+    assert stats["converged"] == 1
+    assert {p: cell["status"] for p, cell in stats["cells"].items()} == {"0": "converged", "1": "max-iterations"}
+    assert stats["cells"]["0"]["runs"] == bm.TARGET_CI_MIN_SAMPLES
+    assert stats["cells"]["1"]["half_width_pct"] > 30.0
+
+
+def test_the_minimum_iterations_hold_even_when_the_interval_is_already_tight(mock_server):
+    server = mock_server(ttft="100")
+    results = run(server, bm.LoadConfig(target_ci=0.5, max_iterations=20), iterations=9)
+    assert [sum(r.prompt_id == p for r in results) for p in (0, 1)] == [9, 9]
+    assert stop_reasons(results) == {0: "converged", 1: "converged"}
+
+
+def test_no_requests_start_after_the_time_budget(mock_server):
+    server = noisy_server(mock_server, ttft="50")
+    load = bm.LoadConfig(target_ci=0.001, max_iterations=1000, time_budget=0.5)
+    results = run(server, load, concurrency=2)
+
+    assert 2 < len(results) < 100
+    assert stop_reasons(results) == {0: "time-budget", 1: "time-budget"}
+    # The last requests started before the budget ran out
+    first = min(r.started_at for r in results)
+    assert max(r.started_at for r in results) - first < 0.5
+
+
+def test_cells_cut_short_are_unfinished_in_the_summary(mock_server):
+    server = mock_server(ttft="30")
+    load = bm.LoadConfig(target_ci=0.5, max_iterations=6)
+    results = [r for r in run(server, load) if not r.stop_reason]
+
+    stats = bm.aggregate(results, load=load)[("mock", "mock")]["target_ci"]
+    assert stats["converged"] == 0
+    assert {cell["status"] for cell in stats["cells"].values()} == {"unfinished"}
+    # Without a target there is no convergence section
+    assert "target_ci" not in bm.aggregate(results)[("mock", "mock")]
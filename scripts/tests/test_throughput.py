@@ -0,0 +1,60 @@
+"""Decode, end-to-end and system throughput, reported separately."""
+
+from __future__ import annotations
+
+import asyncio
+import math
+
+import pytest
+
+import benchmark_models as bm
+
+
+def run(server, iterations=2, concurrency=1, **cfg):
+    cfg = bm.RequestConfig(**{"max_tokens": 11, **cfg})
+    return asyncio.run(bm.run_benchmark([server.spec()], ["go"], iterations, concurrency, cfg))
+
+
+def test_decode_rate_leaves_prefill_out_of_the_end_to_end_rate(mock_server):
+    # 100ms of prefill, then 11 tokens at 100 tok/s
+    results = run(mock_server(tokens_per_sec=100, ttft="100"))
+    metrics = bm.request_metrics(results)
+
+    assert all(r.completion_tokens == 11 for r in results)
+    assert metrics["output_tokens_per_sec"] == pytest.approx([11 * 1000.0 / r.total_ms for r in results])
+    assert metrics["decode_tokens_per_sec"] == pytest.approx([10 * 1000.0 / r.decode_ms for r in results])
+    # TTFT counts against the end-to-end rate only
+    for out, decode in zip(metrics["output_tokens_per_sec"], metrics["decode_tokens_per_sec"]):
+        assert out < decode
+
+    stats = bm.aggregate(results)[("mock", "mock")]
+    assert stats["output_tokens_per_sec_avg"] < stats["decode_tokens_per_sec_avg"]
+    assert stats["output_tokens_per_sec_p50"] < stats["decode_tokens_per_sec_p50"]
+
+
+def test_system_throughput_adds_up_concurrent_streams(mock_server):
+    results = run(mock_server(tokens_per_sec=100, ttft="50"), iterations=8, concurrency=4)
+    stats = bm.aggregate(results)[("mock", "mock")]
+
+    assert stats["window_s"] == pytest.approx(bm.measured_window(results))
+    assert stats["system_output_tokens_per_sec"] == pytest.approx(8 * 11 / stats["window_s"])
+    assert stats["system_requests_per_sec"] == pytest.approx(8 / stats["window_s"])
+    assert stats["system_chars_per_sec"] == pytest.approx(sum(r.output_chars for r in results) / stats["window_s"])
+    # Four streams at a time deliver well over one stream's rate
+    assert stats["system_output_tokens_per_sec"] > 2 * stats["output_tokens_per_sec_avg"]
+
+
+def test_non_streamed_requests_have_no_decode_rate(mock_server):
+    results = run(mock_server(tokens_per_sec=100), stream=False)
+    stats = bm.aggregate(results)[("mock", "mock")]
+
+    assert bm.request_metrics(results)["decode_tokens_per_sec"] == []
+    assert math.isnan(stats["decode_tokens_per_sec_avg"])
+    assert stats["output_tokens_per_sec_avg"] > 0 and stats["system_output_tokens_per_sec"] > 0
+
+
+def test_failed_requests_add_nothing_to_system_throughput(mock_server):
+    stats = bm.aggregate(run(mock_server(error_rate=1.0), iterations=3))[("mock", "mock")]
+    assert stats["success_rate"] == 0
+    assert stats["system_requests_per_sec"] == 0
+    assert math.isnan(stats["system_output_tokens_per_sec"])
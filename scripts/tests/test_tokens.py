@@ -0,0 +1,80 @@
+"""Token counts: the server's usage block, or --tokenizer when there is none."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+
+import pytest
+
+import benchmark_models as bm
+
+
+@pytest.fixture
+def vocab(tmp_path):
+    # Byte-level vocab ("Ġ" marks a leading space) where every mock word is one token
+    path = tmp_path / "vocab.json"
+    tokens = [p + w for w in bm._SYNTHETIC_WORDS for p in ("", "Ġ")] + list("abcdefghijklmnopqrstuvwxyz")
+    path.write_text(json.dumps({t: i for i, t in enumerate(tokens)}), encoding="utf-8")
+    return str(path)
+
+
+def run(server, **cfg):
+    cfg = bm.RequestConfig(**{"max_tokens": 9, **cfg})
+    return asyncio.run(bm.run_benchmark([server.spec()], ["the day of the year"], 2, 1, cfg))
+
+
+def test_streams_ask_for_usage_and_report_its_counts(mock_server):
+    server = mock_server()
+    results = run(server)
+
+    assert all(b["stream_options"] == {"include_usage": True} for b in server.requests)
+    for r in results:
+        assert (r.completion_tokens, r.token_source) == (9, "usage")
+        assert r.prompt_tokens == len("the day of the year") // 4
+    assert bm.aggregate(results)[("mock", "mock")]["token_source"] == "usage"
+
+
+def test_without_usage_the_tokenizer_counts_prompt_and_reply(mock_server, vocab):
+    server = mock_server()
+    results = run(server, include_usage=False, tokenizer=vocab)
+
+    assert all("stream_options" not in b for b in server.requests)
+    for r in results:
+        assert (r.completion_tokens, r.token_source) == (9, "tokenizer")
+        assert r.prompt_tokens == 5
+    assert bm.aggregate(results)[("mock", "mock")]["token_source"] == "tokenizer"
+
+
+def test_reported_usage_wins_over_the_tokenizer(mock_server, vocab):
+    server = mock_server(output_tokens=4)
+    for r in run(server, tokenizer=vocab):
+        assert (r.completion_tokens, r.token_source) == (4, "usage")
+
+
+def test_without_usage_or_tokenizer_tokens_are_unknown(mock_server):
+    for r in run(mock_server(), include_usage=False):
+        assert r.success and r.completion_tokens is None and r.token_source is None
+
+
+def test_usage_tokens_reads_any_key_names():
+    assert bm.usage_tokens({"prompt_tokens": 3, "completion_tokens": 7.0}) == (3, 7)
+    assert bm.usage_tokens({"prompt_eval_count": 5, "eval_count": 2}, "prompt_eval_count", "eval_count") == (5, 2)
+    assert bm.usage_tokens(None) == (None, None)
+    assert bm.usage_tokens({"completion_tokens": "7"}) == (None, None)
+
+
+def test_vocab_tokenizer_formats(tmp_path):
+    lines = tmp_path / "tokens.txt"
+    lines.write_text("hel\nlo\nh\ne\nl\no\n", encoding="utf-8")
+    assert bm.VocabTokenizer.from_file(str(lines)).count("hello") == 2
+    sentencepiece = bm.VocabTokenizer(["▁hello", "▁wor", "ld"])
+    assert sentencepiece.count("hello world") == 3
+    # Characters outside the vocab count their UTF-8 bytes, like byte fallback
+    # ("▁" is 3 bytes, "é" 2)
+    assert sentencepiece.count("hello é") == 1 + 3 + 2
+
+
+def test_tokenizer_rejects_module_function():
+    with pytest.raises(OSError):
+        bm.load_tokenizer("os:system")